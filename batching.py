@@ -0,0 +1,123 @@
+"""
+Dynamic micro-batching for LLM generation
+Collects prompts from concurrent callers within a short time window and
+runs them through the model as a single batched generate call
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+from metrics import registry
+
+
+class _Pending:
+    """A submitted item waiting for its batch to run"""
+    __slots__ = ("item", "enqueued", "done", "result", "error")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Groups concurrent submit() calls into batches for ``batch_fn``.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or when the
+    oldest item has waited ``max_wait_ms``, whichever comes first.
+    ``batch_fn`` receives a list of items and must return one result per item,
+    in the same order. If it raises, every caller in that batch gets the error.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        name: str = "micro-batcher"
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batch_size_hist = registry.histogram(
+            f"{name}_batch_size",
+            buckets=[1, 2, 4, 8, 16, 32, 64],
+            description="Items per executed batch"
+        )
+        self.queue_wait_hist = registry.histogram(
+            f"{name}_queue_wait_ms",
+            buckets=[1, 2, 5, 10, 25, 50, 100, 250, 1000],
+            description="Time an item waited before its batch started (ms)"
+        )
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item: Any) -> Any:
+        """Queue an item and block until its batch has been processed"""
+        self._ensure_started()
+        pending = _Pending(item)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self) -> List[_Pending]:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            self.batch_size_hist.observe(len(batch))
+            for pending in batch:
+                self.queue_wait_hist.observe((started - pending.enqueued) * 1000.0)
+
+            try:
+                results = self.batch_fn([pending.item for pending in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size and queue-wait histograms"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_wait_ms": self.queue_wait_hist.snapshot()
+        }
@@ -0,0 +1,125 @@
+"""
+Encoder backend benchmark: sentences/s across batch sizes and thread counts
+Encodes synthetic catalog chunks with every EMBEDDING_BACKEND (embedding_service)
+and checks each backend's vectors against the PyTorch reference, the encoder
+that built existing collections.
+
+Each (backend, threads) pair runs in its own subprocess with
+EMBEDDING_THREADS set, since ONNX Runtime fixes its thread count at load.
+A backend passes when the minimum cosine similarity to the reference over
+--check-texts chunks is at least EMBEDDING_MIN_COSINE; the script exits
+non-zero if any backend fails.
+
+Usage: python benchmarks/bench_encoder.py --rows 4000 --batch-sizes 16 32 64 128 --threads 1 4 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from create_example_excel import build_catalog
+from embedding_service import EMBEDDING_BACKENDS, cosine_agreement, load_encoder
+from ingest import dataframe_to_chunks
+import config
+
+
+def chunk_texts(n_rows):
+    return [chunk["text"] for chunk in dataframe_to_chunks(build_catalog(n_rows), "uploads/benchmark_catalog.csv")]
+
+
+def run_backend(args):
+    """Measure one backend at one thread count and save its check vectors"""
+    texts = chunk_texts(args.rows)
+    start = time.perf_counter()
+    encoder = load_encoder(config.HF_EMBEDDING_MODEL, args.worker)
+    load_s = time.perf_counter() - start
+
+    check = np.asarray(encoder.encode(texts[:args.check_texts], batch_size=32), dtype=np.float32)
+    np.save(args.vectors, check)
+
+    throughput = {}
+    for batch_size in args.batch_sizes:
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=batch_size)
+        throughput[str(batch_size)] = round(len(texts) / (time.perf_counter() - start), 1)
+    print(json.dumps({"load_s": round(load_s, 3), "sentences_per_second": throughput}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding encoder backends")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--rows", type=int, default=4_000, help="Chunks encoded per measurement")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[16, 32, 64, 128])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument("--check-texts", type=int, default=512, help="Chunks compared against the reference")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--worker", choices=EMBEDDING_BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args)
+        return
+
+    # The reference runs first: the other backends are checked against it
+    backends = ["torch"] + [name for name in args.backends if name != "torch"]
+    report = {
+        "model": config.HF_EMBEDDING_MODEL,
+        "rows": args.rows,
+        "min_cosine_required": config.EMBEDDING_MIN_COSINE,
+        "backends": {}
+    }
+    failed = []
+    with tempfile.TemporaryDirectory() as workdir:
+        reference = None
+        for name in backends:
+            result = {"threads": {}}
+            for threads in args.threads:
+                vectors = os.path.join(workdir, f"{name}-{threads}.npy")
+                command = [
+                    sys.executable, __file__, "--worker", name, "--vectors", vectors,
+                    "--rows", str(args.rows), "--check-texts", str(args.check_texts),
+                    "--batch-sizes", *[str(size) for size in args.batch_sizes]
+                ]
+                print(f"Benchmarking {name} with {threads} thread(s)...", file=sys.stderr)
+                completed = subprocess.run(
+                    command, capture_output=True, text=True,
+                    env={**os.environ, "EMBEDDING_THREADS": str(threads)}
+                )
+                lines = completed.stdout.strip().splitlines()
+                if completed.returncode != 0 or not lines:
+                    result["threads"][str(threads)] = {
+                        "error": (completed.stderr.strip().splitlines() or ["no output"])[-1]
+                    }
+                    continue
+                result["threads"][str(threads)] = json.loads(lines[-1])
+                if "cosine_to_reference" not in result:
+                    check = np.load(vectors)
+                    if name == "torch":
+                        reference = check
+                    if reference is not None:
+                        result["cosine_to_reference"] = cosine_agreement(reference, check)
+                        result["compatible"] = result["cosine_to_reference"]["min"] >= config.EMBEDDING_MIN_COSINE
+                        if not result["compatible"]:
+                            failed.append(name)
+            report["backends"][name] = result
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if failed:
+        print(f"Below EMBEDDING_MIN_COSINE: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
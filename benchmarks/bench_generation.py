@@ -0,0 +1,132 @@
+"""
+Generator backend benchmark: load time, tokens/s and peak RSS per backend
+Each backend (generators.py) runs in its own subprocess so peak RSS is that
+backend's alone. Prompts are real RAG prompts: synthetic catalog rows fitted
+into the context window by prompt_builder.PromptBuilder.
+
+tokens/s counts generated tokens only, over batches of --batch-size prompts
+(after one warm-up batch). Peak RSS is the process high-water mark including
+load, so it covers weights and generation buffers.
+
+The default --model is GPT-2 so every backend can run on a laptop; pass
+--model meta-llama/Llama-2-7b-chat-hf to measure the production model
+(the distilled backend always uses GENERATOR_DISTILLED_MODEL).
+
+Usage: python benchmarks/bench_generation.py --backends llama int8 onnx distilled --prompts 16
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from create_example_excel import build_catalog
+from generators import BACKENDS, create_backend
+from ingest import dataframe_to_chunks
+from prompt_builder import PromptBuilder
+import config
+
+
+def peak_rss_mb():
+    """High-water resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def build_prompts(builder, n_prompts, rows_per_prompt):
+    df = build_catalog(n_prompts * rows_per_prompt)
+    chunks = dataframe_to_chunks(df, "uploads/benchmark_catalog.csv")
+    prompts = []
+    for i in range(n_prompts):
+        group = chunks[i * rows_per_prompt:(i + 1) * rows_per_prompt]
+        part = group[0]["metadata"].get("Part_Number", "the first component")
+        prompt, _ = builder.build(
+            f"What is the voltage rating of {part}?",
+            [chunk["text"] for chunk in group],
+            [chunk["metadata"] for chunk in group]
+        )
+        prompts.append(prompt)
+    return prompts
+
+
+def run_backend(args):
+    """Benchmark one backend in this process and print its JSON result"""
+    model_name = None if args.worker == "distilled" else args.model
+    backend = create_backend(args.worker, model_name)
+
+    start = time.perf_counter()
+    backend.load()
+    load_s = time.perf_counter() - start
+    rss_after_load = peak_rss_mb()
+
+    builder = PromptBuilder.for_tokenizer(backend.tokenizer, config.CONTEXT_WINDOW_TOKENS, args.max_new_tokens)
+    prompts = build_prompts(builder, args.prompts, args.rows_per_prompt)
+    batches = [prompts[i:i + args.batch_size] for i in range(0, len(prompts), args.batch_size)]
+
+    backend.generate(batches[0], args.max_new_tokens, builder.prompt_budget)  # warm-up
+
+    generated_tokens = 0
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        answers = backend.generate(batch, args.max_new_tokens, builder.prompt_budget)
+        latencies.append(time.perf_counter() - start)
+        generated_tokens += sum(len(backend.tokenizer.encode(a, add_special_tokens=False)) for a in answers)
+
+    total_s = sum(latencies)
+    print(json.dumps({
+        **backend.describe(),
+        "load_s": round(load_s, 3),
+        "prompts": len(prompts),
+        "batch_size": args.batch_size,
+        "generated_tokens": generated_tokens,
+        "tokens_per_second": round(generated_tokens / total_s, 2) if total_s else None,
+        "seconds_per_batch": round(total_s / len(batches), 3),
+        "peak_rss_mb_after_load": rss_after_load,
+        "peak_rss_mb": peak_rss_mb()
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generator backends")
+    parser.add_argument("--backends", nargs="+", default=["llama", "int8", "onnx", "distilled"], choices=BACKENDS)
+    parser.add_argument("--model", default="gpt2", help="Model for the llama/int8/onnx backends")
+    parser.add_argument("--prompts", type=int, default=16, help="Prompts per backend")
+    parser.add_argument("--batch-size", type=int, default=4, help="Prompts per generate call")
+    parser.add_argument("--rows-per-prompt", type=int, default=5, help="Retrieved rows per prompt")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args)
+        return
+
+    report = {"model": args.model, "prompts": args.prompts, "max_new_tokens": args.max_new_tokens, "backends": {}}
+    for name in args.backends:
+        command = [
+            sys.executable, __file__, "--worker", name, "--model", args.model,
+            "--prompts", str(args.prompts), "--batch-size", str(args.batch_size),
+            "--rows-per-prompt", str(args.rows_per_prompt), "--max-new-tokens", str(args.max_new_tokens)
+        ]
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        completed = subprocess.run(command, capture_output=True, text=True)
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+            report["backends"][name] = {"error": error}
+        else:
+            report["backends"][name] = json.loads(lines[-1])
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
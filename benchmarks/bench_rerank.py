@@ -0,0 +1,156 @@
+"""
+End-to-end re-ranking benchmark: prompt size, context recall and latency
+Compares answering from the first-stage top ``--baseline-k`` hits with
+over-fetching ``--candidates`` hits, re-ranking them with the cross-encoder
+(reranker.CrossEncoderReranker) and keeping the top ``--top-k``.
+
+The first stage is BM25 fused with exact cosine vector search when
+sentence-transformers is available (see bench_retrieval.py). Prompts are built
+with prompt_builder.PromptBuilder and measured with the GPT-2 tokenizer when
+transformers is installed (whitespace tokens otherwise). With --generate, GPT-2
+answers every prompt and generation time is reported as well.
+
+Context recall is the fraction of queries whose prompt still contains a
+relevant row - the answer-quality bound for the generator.
+
+Usage: python benchmarks/bench_rerank.py --rows 5000 --queries 100 --generate
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_retrieval import labeled_queries, load_encoder
+from bench_utils import percentile
+from create_example_excel import build_catalog
+from ingest import chunk_id, dataframe_to_chunks
+from prompt_builder import PromptBuilder
+from reranker import CrossEncoderReranker
+from search_index import BM25Index, reciprocal_rank_fusion
+import config
+
+
+def load_tokenizer():
+    """GPT-2 tokenizer, or None to count whitespace tokens"""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained("gpt2")
+    except Exception as e:
+        print(f"GPT-2 tokenizer unavailable ({e}); counting whitespace tokens")
+        return None
+
+
+def summarize(latencies):
+    return {
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "mean_ms": round(statistics.mean(latencies), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-encoder re-ranking end to end")
+    parser.add_argument("--rows", type=int, default=5_000, help="Synthetic catalog size")
+    parser.add_argument("--queries", type=int, default=100, help="Labeled queries")
+    parser.add_argument("--baseline-k", type=int, default=10, help="Hits per prompt without re-ranking")
+    parser.add_argument("--candidates", type=int, default=config.RERANK_CANDIDATES, help="Over-fetched hits")
+    parser.add_argument("--top-k", type=int, default=config.RERANK_TOP_K, help="Hits per prompt after re-ranking")
+    parser.add_argument("--generate", action="store_true", help="Also generate answers with GPT-2")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    df = build_catalog(args.rows)
+    chunks = dataframe_to_chunks(df, "uploads/benchmark_catalog.csv")
+    ids = [chunk_id(chunk["metadata"]["source"], chunk["text"]) for chunk in chunks]
+    by_id = {doc_id: chunk for doc_id, chunk in zip(ids, chunks)}
+    queries = labeled_queries(df, ids, args.queries, args.seed)
+
+    index = BM25Index()
+    index.add(ids, [chunk["text"] for chunk in chunks])
+    encoder = load_encoder()
+    if encoder is not None:
+        import numpy as np
+        matrix = np.asarray(
+            encoder.encode([chunk["text"] for chunk in chunks], batch_size=config.EMBED_BATCH_SIZE,
+                           normalize_embeddings=True),
+            dtype=np.float32
+        )
+
+    def first_stage(query, k):
+        rankings = [[doc_id for doc_id, _ in index.search(query, k)]]
+        if encoder is not None:
+            scores = matrix @ encoder.encode([query], normalize_embeddings=True)[0]
+            top = np.argsort(-scores)[:k]
+            rankings.insert(0, [ids[i] for i in top])
+        return [doc_id for doc_id, _ in reciprocal_rank_fusion(rankings, config.RRF_K)[:k]]
+
+    tokenizer = load_tokenizer()
+    if tokenizer is not None:
+        builder = PromptBuilder.for_tokenizer(tokenizer, config.CONTEXT_WINDOW_TOKENS, config.GENERATION_MAX_NEW_TOKENS)
+    else:
+        builder = PromptBuilder(lambda text: len(text.split()), config.CONTEXT_WINDOW_TOKENS,
+                                config.GENERATION_MAX_NEW_TOKENS)
+
+    reranker = CrossEncoderReranker()
+    if not reranker.load():
+        raise SystemExit("Cross-encoder unavailable - install sentence-transformers to run this benchmark")
+
+    generator = None
+    if args.generate:
+        from transformers import pipeline
+        generator = pipeline("text-generation", model="gpt2", tokenizer="gpt2")
+        generator.tokenizer.pad_token = generator.tokenizer.eos_token
+
+    def run(name, select):
+        prompt_tokens, recall, latencies, generate_ms = [], [], [], []
+        for _, query, relevant in queries:
+            start = time.perf_counter()
+            selected = select(query)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            prompt, tokens = builder.build(
+                query, [by_id[d]["text"] for d in selected], [by_id[d]["metadata"] for d in selected]
+            )
+            prompt_tokens.append(tokens)
+            recall.append(any(doc_id in relevant for doc_id in selected))
+            if generator is not None:
+                start = time.perf_counter()
+                generator(prompt, max_new_tokens=config.GENERATION_MAX_NEW_TOKENS, return_full_text=False,
+                          pad_token_id=generator.tokenizer.eos_token_id)
+                generate_ms.append((time.perf_counter() - start) * 1000.0)
+        result = {
+            "context_recall": round(sum(recall) / len(recall), 4),
+            "prompt_tokens_mean": round(statistics.mean(prompt_tokens), 1),
+            "prompt_tokens_p95": percentile(prompt_tokens, 95),
+            "retrieval": summarize(latencies)
+        }
+        if generate_ms:
+            result["generation"] = summarize(generate_ms)
+        return name, result
+
+    def reranked(query):
+        candidates = first_stage(query, args.candidates)
+        hits = [{"ids": candidates, "documents": [by_id[d]["text"] for d in candidates]}]
+        return reranker.rerank([query], hits, args.top_k)[0]["ids"]
+
+    report = {"rows": len(df), "queries": len(queries), "baseline_k": args.baseline_k,
+              "candidates": args.candidates, "top_k": args.top_k}
+    report.update([
+        run(f"baseline_top{args.baseline_k}", lambda query: first_stage(query, args.baseline_k)),
+        run(f"rerank_top{args.top_k}_cold", reranked),
+        # Same queries again: every (query, doc) score comes from the cache
+        run(f"rerank_top{args.top_k}_cached", reranked)
+    ])
+    report["score_cache"] = reranker.score_cache.stats()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
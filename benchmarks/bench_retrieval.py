@@ -0,0 +1,152 @@
+"""
+Retrieval benchmark: BM25, vector and hybrid (reciprocal rank fusion) search
+Builds a synthetic catalog, indexes it in search_index.BM25Index and, when
+sentence-transformers is installed, embeds it with the configured encoder
+(exact cosine top-k stands in for ChromaDB's ANN search). Reports index build
+time, per-query latency and recall@k on a labeled query set.
+
+Labeled queries:
+  part      - "What is the voltage rating of IRF540N-17?"  relevant: that row
+  id        - "Tell me about component SC-0000017"          relevant: that row
+  semantic  - "Texas Instruments voltage regulator"         relevant: every row of that component
+recall@k is the fraction of queries with a relevant row in the top k.
+(The API answers "part" queries from the part-number fast path before any of
+these rankings run; they are kept here to compare the rankers themselves.)
+
+Usage: python benchmarks/bench_retrieval.py --rows 20000 --queries 200 --k 5
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from bench_utils import percentile
+from create_example_excel import build_catalog
+from ingest import chunk_id, dataframe_to_chunks
+from search_index import BM25Index, reciprocal_rank_fusion
+import config
+
+
+def labeled_queries(df, ids, n_queries, seed):
+    """(kind, query, relevant IDs) triples drawn from the catalog"""
+    rng = random.Random(seed)
+    by_component = {}
+    for doc_id, name in zip(ids, df["Component_Name"]):
+        by_component.setdefault(name, set()).add(doc_id)
+
+    queries = []
+    for _ in range(n_queries):
+        row = rng.randrange(len(df))
+        record = df.iloc[row]
+        kind = rng.choice(["part", "id", "semantic"])
+        if kind == "part":
+            queries.append((kind, f"What is the voltage rating of {record['Part_Number']}?", {ids[row]}))
+        elif kind == "id":
+            queries.append((kind, f"Tell me about component {record['Component_ID']}", {ids[row]}))
+        else:
+            queries.append((
+                kind,
+                f"{record['Manufacturer']} {record['Component_Name'].lower()}",
+                by_component[record["Component_Name"]]
+            ))
+    return queries
+
+
+def load_encoder():
+    """The configured sentence-transformers encoder, or None if it is unavailable"""
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(config.HF_EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"Vector search skipped: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25, vector and hybrid retrieval")
+    parser.add_argument("--rows", type=int, default=20_000, help="Synthetic catalog size")
+    parser.add_argument("--queries", type=int, default=200, help="Labeled queries")
+    parser.add_argument("--k", type=int, default=5, help="Results per query (recall@k)")
+    parser.add_argument("--candidates", type=int, default=config.HYBRID_CANDIDATES,
+                        help="Candidates per ranker before fusion")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    df = build_catalog(args.rows)
+    chunks = dataframe_to_chunks(df, "uploads/benchmark_catalog.csv")
+    texts = [chunk["text"] for chunk in chunks]
+    ids = [chunk_id(chunk["metadata"]["source"], chunk["text"]) for chunk in chunks]
+    queries = labeled_queries(df, ids, args.queries, args.seed)
+
+    report = {"rows": len(df), "queries": len(queries), "k": args.k, "candidates": args.candidates}
+
+    start = time.perf_counter()
+    index = BM25Index()
+    for batch in range(0, len(ids), 1000):
+        index.add(ids[batch:batch + 1000], texts[batch:batch + 1000])
+    build_s = time.perf_counter() - start
+    report["bm25_index"] = {
+        **index.stats(),
+        "build_s": round(build_s, 3),
+        "docs_per_second": round(len(ids) / build_s, 1)
+    }
+
+    rankers = {"bm25": lambda query, k: [doc_id for doc_id, _ in index.search(query, k)]}
+
+    encoder = load_encoder()
+    if encoder is not None:
+        start = time.perf_counter()
+        matrix = np.asarray(encoder.encode(texts, batch_size=config.EMBED_BATCH_SIZE, normalize_embeddings=True),
+                            dtype=np.float32)
+        report["embed_s"] = round(time.perf_counter() - start, 3)
+
+        def vector(query, k):
+            query_vector = encoder.encode([query], normalize_embeddings=True)[0]
+            scores = matrix @ query_vector
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+            return [ids[i] for i in top[np.argsort(-scores[top])]]
+
+        def hybrid(query, k):
+            fused = reciprocal_rank_fusion(
+                [vector(query, args.candidates), rankers["bm25"](query, args.candidates)],
+                config.RRF_K
+            )
+            return [doc_id for doc_id, _ in fused[:k]]
+
+        rankers["vector"] = vector
+        rankers["hybrid"] = hybrid
+
+    results = {}
+    for name, rank in rankers.items():
+        latencies = []
+        hits = {}
+        for kind, query, relevant in queries:
+            start = time.perf_counter()
+            top = rank(query, args.k)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            hits.setdefault(kind, []).append(any(doc_id in relevant for doc_id in top))
+        all_hits = [hit for kind_hits in hits.values() for hit in kind_hits]
+        results[name] = {
+            f"recall@{args.k}": round(sum(all_hits) / len(all_hits), 4),
+            **{f"recall@{args.k}_{kind}": round(sum(h) / len(h), 4) for kind, h in sorted(hits.items())},
+            "latency_ms_p50": round(percentile(latencies, 50), 3),
+            "latency_ms_p95": round(percentile(latencies, 95), 3),
+            "latency_ms_mean": round(statistics.mean(latencies), 3)
+        }
+    report["rankers"] = results
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Helpers shared by the benchmark scripts (imported by name: each script runs
+with benchmarks/ as its first sys.path entry)
+"""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
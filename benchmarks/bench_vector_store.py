@@ -0,0 +1,166 @@
+"""
+Vector store benchmark: ChromaDB vs the in-memory store (vector_store.py)
+For each collection size, the same rows are loaded into a ChromaDB collection
+(in a temporary directory), an exact in-memory store and an IVF in-memory store.
+Each one then answers the same queries:
+
+  single    one query, HYBRID_CANDIDATES results (the /ask path)
+  batch     BATCH queries in one call (/ask/batch, MCP batch tool)
+  filtered  one query with a manufacturer filter (``where``)
+
+Embeddings are synthetic clustered unit vectors (no model download).
+Documents and metadata come from the synthetic catalog. recall@k is
+measured against the exact store's results.
+
+Usage: python benchmarks/bench_vector_store.py --sizes 1000 10000 100000 --queries 200
+"""
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from bench_utils import percentile
+from create_example_excel import build_catalog
+from ingest import chunk_id, dataframe_to_chunks
+from vector_store import InMemoryVectorStore
+import config
+
+BATCH = 8
+
+
+def clustered_vectors(n, dim, rng, spread=0.6):
+    """Unit vectors drawn around n/200 random centers, like real embeddings' topical clusters"""
+    centers = rng.standard_normal((max(8, n // 200), dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    labels = rng.integers(len(centers), size=n)
+    vectors = centers[labels] + spread * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_rows(n, dim, seed):
+    chunks = dataframe_to_chunks(build_catalog(n), "uploads/benchmark_catalog.csv")
+    ids = [chunk_id(chunk["metadata"]["source"], chunk["text"]) for chunk in chunks]
+    rng = np.random.default_rng(seed)
+    return ids, [c["text"] for c in chunks], [c["metadata"] for c in chunks], clustered_vectors(n, dim, rng)
+
+
+def load_chroma(workdir, ids, texts, metadatas, vectors):
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=workdir, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection(name="bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, len(ids), 5000):
+        end = start + 5000
+        collection.upsert(ids=ids[start:end], documents=texts[start:end], metadatas=metadatas[start:end],
+                          embeddings=vectors[start:end].tolist())
+    return collection
+
+
+def measure(store, queries, k, where):
+    """Latency per call (ms) for the three query shapes, plus the single-query results"""
+    latencies = {"single": [], "batch": [], "filtered": []}
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies["single"].append((time.perf_counter() - start) * 1000.0)
+        results.append(hits["ids"][0])
+
+        start = time.perf_counter()
+        store.query(query_embeddings=[query.tolist()], n_results=k, where=where)
+        latencies["filtered"].append((time.perf_counter() - start) * 1000.0)
+    for start_index in range(0, len(queries) - BATCH + 1, BATCH):
+        batch = [query.tolist() for query in queries[start_index:start_index + BATCH]]
+        start = time.perf_counter()
+        store.query(query_embeddings=batch, n_results=k)
+        latencies["batch"].append((time.perf_counter() - start) * 1000.0)
+
+    report = {
+        f"{shape}_ms_{stat}": round(fn(values), 3)
+        for shape, values in latencies.items() if values
+        for stat, fn in (("p50", lambda v: percentile(v, 50)), ("p95", lambda v: percentile(v, 95)),
+                         ("mean", statistics.mean))
+    }
+    return report, results
+
+
+def recall(results, reference, k):
+    return round(statistics.mean(len(set(a[:k]) & set(b[:k])) / k for a, b in zip(results, reference)), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChromaDB against the in-memory vector store")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=config.HYBRID_CANDIDATES, help="Results per query")
+    parser.add_argument("--recall-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=config.VECTOR_IVF_NPROBE)
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"dim": args.dim, "k": args.k, "queries": args.queries, "batch": BATCH, "sizes": {}}
+    for n in args.sizes:
+        print(f"Building {n} rows...", file=sys.stderr)
+        ids, texts, metadatas, vectors = build_rows(n, args.dim, args.seed)
+        rng = np.random.default_rng(args.seed + 1)
+        picks = rng.choice(n, size=args.queries, replace=n < args.queries)
+        queries = vectors[picks] + 0.5 * rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+        where = {"manufacturer": {"$eq": metadatas[0]["manufacturer"]}}
+
+        stores = {}
+        start = time.perf_counter()
+        exact = InMemoryVectorStore(None, ivf_min_rows=0)
+        exact.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        stores["memory-exact"] = (exact, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ivf = InMemoryVectorStore(None, ivf_min_rows=1, ivf_nprobe=args.nprobe)
+        ivf.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        ivf.query(query_embeddings=[queries[0].tolist()], n_results=1)  # trains the index
+        stores["memory-ivf"] = (ivf, time.perf_counter() - start)
+
+        workdir = tempfile.mkdtemp(prefix="bench-chroma-")
+        size_report = {}
+        try:
+            if not args.skip_chroma:
+                try:
+                    start = time.perf_counter()
+                    stores["chroma"] = (load_chroma(workdir, ids, texts, metadatas, vectors), time.perf_counter() - start)
+                except Exception as e:
+                    size_report["chroma"] = {"error": str(e)}
+
+            reference = None
+            for name, (store, load_s) in stores.items():
+                print(f"Querying {name} ({n} rows)...", file=sys.stderr)
+                latency, results = measure(store, queries, args.k, where)
+                if name == "memory-exact":
+                    reference = results
+                size_report[name] = {
+                    "load_s": round(load_s, 3),
+                    **latency,
+                    f"recall@{args.recall_k}": recall(results, reference, args.recall_k)
+                }
+            size_report["memory-ivf"]["ivf_lists"] = ivf.stats()["ivf_lists"]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        report["sizes"][str(n)] = size_report
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
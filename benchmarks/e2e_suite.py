@@ -0,0 +1,429 @@
+"""
+End-to-end benchmark suite: ingest, retrieval, generation, concurrent /ask and MCP
+Runs offline against synthetic catalogs (create_example_excel.build_catalog) of
+each --sizes row count, in a fresh ChromaDB directory per size:
+
+  ingest      RAGPipeline.ingest_file on a CSV of the catalog: rows/s
+  retrieval   retrieve_hits per labeled query (bench_retrieval.labeled_queries):
+              p50/p95/p99 latency and recall@k; one batched call: queries/s
+  generation  generate_answer on the retrieved context: p50/p95/p99 latency
+              (omitted when no generator is loaded)
+  api         uvicorn main:app under --concurrency parallel POST /ask clients:
+              requests/s, p50/p95/p99, status codes (answer cache disabled)
+  mcp         --mcp-sessions mcp_server.py stdio sessions (mcp_load_test.run_session):
+              call_tool p50/p95/p99
+
+By default the models are offline stand-ins: EMBEDDING_BACKEND=hash (hashed
+bag-of-words vectors) and a tiny randomly initialised GPT-2 (2 layers, 64 dims,
+byte-level BPE tokenizer trained on catalog text) built in a temporary
+directory and loaded as GENERATOR_BACKEND=distilled. The suite needs no network,
+and generation, /ask and the micro-batcher run a real model forward pass per
+token. --skip generation drops the generation stage and uses
+GENERATOR_BACKEND=none (answers extracted from the context, so /ask measures
+no model). --real-models keeps the configured models (use HF_HUB_OFFLINE=1
+with a populated cache to stay offline).
+
+Results are written as JSON (default benchmarks/results/e2e-<commit>.json);
+--baseline prints the relative change of every metric against an earlier run.
+
+Usage: python benchmarks/e2e_suite.py --sizes 1000 10000 100000
+       python benchmarks/e2e_suite.py --sizes 1000000 --skip api mcp
+       python benchmarks/e2e_suite.py --sizes 1000 --baseline benchmarks/results/e2e-1a2b3c4.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Stand-in models need no Hugging Face token; config refuses to import without one
+os.environ.setdefault("HF_API_KEY", "offline")
+
+from bench_retrieval import labeled_queries
+from bench_utils import percentile
+
+STAND_IN_ENV = {
+    "EMBEDDING_BACKEND": "hash",
+    "RERANK_ENABLED": "false",
+    "HF_HUB_OFFLINE": "1",
+    "TRANSFORMERS_OFFLINE": "1",
+}
+
+
+STAND_IN_EOS = "<|endoftext|>"
+
+
+def build_stand_in_generator(directory):
+    """
+    Save a tiny randomly initialised GPT-2 and its tokenizer to ``directory``:
+    its answers are noise, but every token costs a real forward pass, so
+    generation regressions (batching, backends, prompt size) show up offline
+    """
+    try:
+        import torch
+        from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+        from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+    except ImportError as e:
+        raise SystemExit(f"The stand-in generator needs torch, transformers and tokenizers ({e}); "
+                         "install them or pass --skip generation")
+    import config
+    from create_example_excel import build_catalog
+    from ingest import dataframe_to_chunks
+
+    texts = [chunk["text"] for chunk in dataframe_to_chunks(build_catalog(1000), "catalog.csv")]
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(texts, trainers.BpeTrainer(
+        vocab_size=2000, special_tokens=[STAND_IN_EOS], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    ))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token=STAND_IN_EOS, eos_token=STAND_IN_EOS, unk_token=STAND_IN_EOS,
+        model_max_length=config.CONTEXT_WINDOW_TOKENS
+    )
+    tokenizer.save_pretrained(directory)
+
+    torch.manual_seed(0)
+    eos_id = tokenizer.convert_tokens_to_ids(STAND_IN_EOS)
+    model = GPT2LMHeadModel(GPT2Config(
+        vocab_size=len(tokenizer), n_positions=config.CONTEXT_WINDOW_TOKENS, n_layer=2, n_head=2, n_embd=64,
+        bos_token_id=eos_id, eos_token_id=eos_id
+    ))
+    model.save_pretrained(directory)
+
+
+def latency_summary(latencies_ms):
+    if not latencies_ms:
+        return {}
+    return {
+        "p50": round(percentile(latencies_ms, 50), 3),
+        "p95": round(percentile(latencies_ms, 95), 3),
+        "p99": round(percentile(latencies_ms, 99), 3),
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 3),
+        "max": round(max(latencies_ms), 3)
+    }
+
+
+def run_worker(args):
+    """Ingest, retrieval and generation stages for one catalog size, in this process"""
+    import pandas as pd
+    import config
+    from create_example_excel import build_catalog
+    from ingest import chunk_id, dataframe_to_chunks, iter_row_blocks
+    from rag_pipeline import RAGPipeline
+
+    data_dir = Path(args.data_dir)
+    catalog = data_dir / "catalog.csv"
+    build_catalog(args.worker_size).to_csv(catalog, index=False)
+
+    # IDs exactly as ingest computes them: same file, same blocks
+    blocks = list(iter_row_blocks(str(catalog), config.INGEST_BLOCK_ROWS))
+    ids = [
+        chunk_id(chunk["metadata"]["source"], chunk["text"])
+        for block in blocks for chunk in dataframe_to_chunks(block, str(catalog))
+    ]
+    queries = labeled_queries(pd.concat(blocks), ids, args.queries, args.seed)
+    (data_dir / "queries.json").write_text(json.dumps([query for _, query, _ in queries]))
+
+    report = {}
+    start = time.perf_counter()
+    rag = RAGPipeline()
+    report["models"] = {
+        "load_s": round(time.perf_counter() - start, 3),
+        "embedding_backend": rag.embeddings.backend,
+        "generation_backend": rag.readiness()["generation_backend"]
+    }
+
+    start = time.perf_counter()
+    totals = rag.ingest_file(str(catalog))
+    ingest_s = time.perf_counter() - start
+    report["ingest"] = {
+        "rows": args.worker_size,
+        "chunks_added": totals["chunks_added"],
+        "seconds": round(ingest_s, 3),
+        "rows_per_second": round(args.worker_size / ingest_s, 1)
+    }
+
+    k = args.k
+    # The first query builds the BM25 index from the collection; time it separately
+    start = time.perf_counter()
+    rag.retrieve_hits([queries[0][1]], k)
+    first_query_ms = (time.perf_counter() - start) * 1000.0
+    latencies, found, hits_per_query = [], [], []
+    for _, query, relevant in queries:
+        start = time.perf_counter()
+        hits = rag.retrieve_hits([query], k)[0]
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        found.append(any(doc_id in relevant for doc_id in hits["ids"]))
+        hits_per_query.append(hits)
+    start = time.perf_counter()
+    rag.retrieve_hits([query for _, query, _ in queries], k)
+    batch_s = time.perf_counter() - start
+    report["retrieval"] = {
+        "k": k,
+        f"recall@{k}": round(sum(found) / len(found), 4),
+        "first_query_ms": round(first_query_ms, 3),
+        "latency_ms": latency_summary(latencies),
+        "batched_queries_per_second": round(len(queries) / batch_s, 1)
+    }
+
+    # Context-only answers (GENERATOR_BACKEND=none, or no model could be loaded) are
+    # string slicing, not generation: report no generation numbers for them
+    if "generation" not in args.skip and rag.backend is not None:
+        latencies = []
+        for (_, query, _), hits in zip(queries, hits_per_query):
+            start = time.perf_counter()
+            rag.generate_answer(query, hits["documents"], hits["metadatas"])
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        report["generation"] = {"latency_ms": latency_summary(latencies)}
+
+    print(json.dumps(report))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, timeout_s):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"API at {base_url} not ready after {timeout_s}s")
+
+
+def post_ask(base_url, question, n_results):
+    """(status, latency ms) of one POST /ask"""
+    request = urllib.request.Request(
+        f"{base_url}/ask",
+        data=json.dumps({"question": question, "n_results": n_results}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, (time.perf_counter() - start) * 1000.0
+
+
+def run_api_stage(args, env, questions):
+    """Concurrent /ask load against a uvicorn server on the ingested collection"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=str(ROOT), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(base_url, args.server_timeout)
+        for question in questions[:args.concurrency]:
+            post_ask(base_url, question, args.k)  # warm-up
+        jobs = [questions[i % len(questions)] for i in range(args.requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(lambda question: post_ask(base_url, question, args.k), jobs))
+        wall_s = time.perf_counter() - start
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "requests_per_second": round(len(results) / wall_s, 1),
+        "status_codes": statuses,
+        "latency_ms": latency_summary([latency for status, latency in results if status == 200])
+    }
+
+
+def run_mcp_stage(args, env):
+    """Concurrent MCP call_tool latency against the ingested collection"""
+    from mcp_load_test import run_session
+
+    async def sessions():
+        return await asyncio.gather(*(
+            run_session(i, args.mcp_calls, args.mcp_concurrency, "query_semiconductor_data", args.k, env)
+            for i in range(args.mcp_sessions)
+        ))
+
+    start = time.perf_counter()
+    results = asyncio.run(sessions())
+    wall_s = time.perf_counter() - start
+    latencies = [latency for session_latencies, _ in results for latency in session_latencies]
+    return {
+        "sessions": args.mcp_sessions,
+        "calls": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "calls_per_second": round(len(latencies) / wall_s, 1),
+        "latency_ms": latency_summary(latencies)
+    }
+
+
+def run_size(args, size, env):
+    data_dir = Path(tempfile.mkdtemp(prefix=f"e2e-{size}-"))
+    env = {**env, "CHROMA_PERSIST_DIR": str(data_dir / "chroma_db")}
+    try:
+        command = [
+            sys.executable, __file__, "--worker-size", str(size), "--data-dir", str(data_dir),
+            "--queries", str(args.queries), "--k", str(args.k), "--seed", str(args.seed),
+            "--skip", *args.skip
+        ]
+        print(f"[{size} rows] ingest, retrieval, generation...", file=sys.stderr)
+        completed = subprocess.run(command, cwd=str(ROOT), env=env, capture_output=True, text=True)
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            return {"error": (completed.stderr.strip().splitlines() or ["no output"])[-1]}
+        result = json.loads(lines[-1])
+
+        questions = json.loads((data_dir / "queries.json").read_text())
+        for stage, run in (("api", lambda: run_api_stage(args, env, questions)),
+                           ("mcp", lambda: run_mcp_stage(args, env))):
+            if stage in args.skip:
+                continue
+            print(f"[{size} rows] {stage}...", file=sys.stderr)
+            try:
+                result[stage] = run()
+            except Exception as e:
+                result[stage] = {"error": f"{type(e).__name__}: {e}"}
+        return result
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT),
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=str(ROOT),
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except Exception:
+        return "unknown", False
+
+
+def flatten(report, prefix=""):
+    """Numeric leaves as {"a.b.c": value}"""
+    values = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def compare(baseline, report):
+    """Relative change of every metric present in both reports"""
+    old, new = flatten(baseline.get("sizes", {})), flatten(report["sizes"])
+    return {
+        key: f"{old[key]} -> {new[key]} ({(new[key] - old[key]) / old[key] * 100:+.1f}%)"
+        for key in sorted(old.keys() & new.keys()) if old[key] and old[key] != new[key]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the RAG API and MCP server")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000], help="Catalog rows")
+    parser.add_argument("--queries", type=int, default=100, help="Labeled queries per size")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    parser.add_argument("--requests", type=int, default=400, help="/ask requests in the load test")
+    parser.add_argument("--concurrency", type=int, default=16, help="Parallel /ask clients")
+    parser.add_argument("--mcp-sessions", type=int, default=2)
+    parser.add_argument("--mcp-calls", type=int, default=50, help="Tool calls per MCP session")
+    parser.add_argument("--mcp-concurrency", type=int, default=8, help="In-flight calls per MCP session")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["generation", "api", "mcp"])
+    parser.add_argument("--real-models", action="store_true", help="Use the configured models instead of stand-ins")
+    parser.add_argument("--server-timeout", type=float, default=120.0, help="Seconds to wait for /ready")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON report path (default benchmarks/results/e2e-<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--worker-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_size:
+        run_worker(args)
+        return
+
+    env = dict(os.environ)
+    stand_in_dir = None
+    if not args.real_models:
+        env.update(STAND_IN_ENV)
+        if "generation" in args.skip:
+            env["GENERATOR_BACKEND"] = "none"
+        else:
+            stand_in_dir = tempfile.mkdtemp(prefix="e2e-generator-")
+            print("Building the stand-in generator...", file=sys.stderr)
+            build_stand_in_generator(stand_in_dir)
+            env.update(GENERATOR_BACKEND="distilled", GENERATOR_DISTILLED_MODEL=stand_in_dir)
+    # Measure uncached answers; every question would otherwise hit the cache after the warm-up
+    env["ANSWER_CACHE_SIZE"] = "0"
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "models": "configured" if args.real_models else "stand-in",
+        "settings": {key: getattr(args, key) for key in
+                     ("queries", "k", "requests", "concurrency", "mcp_sessions", "mcp_calls", "mcp_concurrency")},
+        "sizes": {}
+    }
+    try:
+        for size in args.sizes:
+            report["sizes"][str(size)] = run_size(args, size, env)
+    finally:
+        if stand_in_dir:
+            shutil.rmtree(stand_in_dir, ignore_errors=True)
+
+    output = Path(args.output) if args.output else ROOT / "benchmarks" / "results" / f"e2e-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        changes = compare(json.loads(Path(args.baseline).read_text()), report)
+        print(json.dumps({"baseline": args.baseline, "changes": changes}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
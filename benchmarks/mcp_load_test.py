@@ -0,0 +1,118 @@
+"""
+MCP load test: N concurrent stdio sessions against mcp_server.py
+Each session spawns its own server process (stdio is one client per process)
+and keeps several tool calls in flight at once, so both cross-process and
+in-process concurrency of call_tool are exercised
+
+Usage: python benchmarks/mcp_load_test.py --sessions 4 --calls 50 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+from bench_utils import percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+QUERIES = [
+    "MOSFET components",
+    "voltage regulator",
+    "temperature sensor with 1-wire interface",
+    "Texas Instruments parts",
+    "components rated for 5V",
+    "LED driver",
+    "flash memory",
+    "analog-to-digital converter with SPI",
+]
+
+
+async def run_session(session_id: int, calls: int, concurrency: int, tool: str, n_results: int,
+                      env: dict = None):
+    """
+    Open one MCP session and issue `calls` tool calls, `concurrency` at a time.
+    `env` is the server process environment (None = the MCP SDK's default).
+    """
+    server_params = StdioServerParameters(
+        command=sys.executable,
+        args=[str(ROOT / "mcp_server.py")],
+        cwd=str(ROOT),
+        env=env
+    )
+    latencies = []
+    errors = 0
+
+    async with stdio_client(server_params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one_call(i):
+                nonlocal errors
+                arguments = {}
+                if tool == "query_semiconductor_data":
+                    arguments = {"query": QUERIES[(session_id + i) % len(QUERIES)], "n_results": n_results}
+                async with semaphore:
+                    start = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool, arguments=arguments)
+                        if result.content and result.content[0].text.startswith("Error"):
+                            errors += 1
+                    except Exception:
+                        errors += 1
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+
+            await asyncio.gather(*(one_call(i) for i in range(calls)))
+
+    return latencies, errors
+
+
+async def main_async(args):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_session(i, args.calls, args.concurrency, args.tool, args.n_results)
+        for i in range(args.sessions)
+    ))
+    wall = time.perf_counter() - start
+
+    latencies = [latency for session_latencies, _ in results for latency in session_latencies]
+    errors = sum(session_errors for _, session_errors in results)
+    report = {
+        "tool": args.tool,
+        "sessions": args.sessions,
+        "calls_per_session": args.calls,
+        "concurrency_per_session": args.concurrency,
+        "total_calls": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "calls_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(statistics.mean(latencies), 2),
+            "max": round(max(latencies), 2),
+        } if latencies else {},
+    }
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent MCP stdio load test")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent MCP sessions (server processes)")
+    parser.add_argument("--calls", type=int, default=50, help="Tool calls per session")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight calls per session")
+    parser.add_argument("--tool", default="query_semiconductor_data",
+                        choices=["query_semiconductor_data", "get_collection_info"])
+    parser.add_argument("--n-results", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,128 @@ HF_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # Lightweight and
 HF_LLM_MODEL = "microsoft/DialoGPT-medium"  # Alternative: "meta-llama/Llama-2-7b-chat-hf"
 
 # ChromaDB Configuration
-CHROMA_PERSIST_DIR = "./chroma_db"
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
 CHROMA_COLLECTION_NAME = "semiconductor_components"
 
+# Vector Store Configuration
+# "chroma" queries ChromaDB directly; "memory" serves reads from an in-process NumPy
+# replica of the collection (writes still go to ChromaDB)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+VECTOR_IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "100000"))  # Exact top-k below, IVF from here (0 = never)
+VECTOR_IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "0"))  # 0 = sqrt(rows)
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))  # Lists scanned per query
+# The memory store's replica is published as a memory-mapped snapshot that other processes
+# map read-only (shared page cache, no rebuild); float16 halves its size
+EMBEDDING_STORE = os.getenv("EMBEDDING_STORE", "true").lower() == "true"
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", os.path.join(CHROMA_PERSIST_DIR, "embedding_store"))
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")  # "float32" or "float16"
+
 # API Configuration
 API_HOST = "0.0.0.0"
 API_PORT = 8001  # Changed to 8001 to avoid conflicts
 
+
+# Inference Worker Pool Configuration
+# Blocking RAG work runs on this pool instead of the FastAPI event loop
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")  # "thread" or "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))  # Waiting tasks before 429
+INFERENCE_TIMEOUT_S = float(os.getenv("INFERENCE_TIMEOUT_S", "60"))  # Per /ask request
+
+# Generation Micro-Batching Configuration
+# Concurrent /ask generations arriving within GENERATION_MAX_WAIT_MS are run as one batch.
+# Only effective when INFERENCE_WORKERS allows several generations in flight at once.
+GENERATION_BATCHING = os.getenv("GENERATION_BATCHING", "true").lower() == "true"
+GENERATION_MAX_BATCH_SIZE = int(os.getenv("GENERATION_MAX_BATCH_SIZE", "8"))
+GENERATION_MAX_WAIT_MS = float(os.getenv("GENERATION_MAX_WAIT_MS", "10"))
+
+# Generator Backend Configuration
+# "auto" = GENERATOR_MODEL in float32 (skipped with FAST_START), then GPT-2.
+# "llama" = GENERATOR_MODEL in float32 on CPU, "int8" = dynamic int8 quantization,
+# "onnx" = ONNX Runtime via optimum (exported once to ONNX_EXPORT_DIR),
+# "distilled" = GENERATOR_DISTILLED_MODEL, "gpt2" = GPT-2,
+# "none" = no LLM, answers are extracted from the context (offline benchmarks).
+# A backend that fails to load falls back to GPT-2, then to context-only answers.
+GENERATOR_BACKEND = os.getenv("GENERATOR_BACKEND", "auto")
+GENERATOR_MODEL = os.getenv("GENERATOR_MODEL", "meta-llama/Llama-2-7b-chat-hf")
+GENERATOR_DISTILLED_MODEL = os.getenv("GENERATOR_DISTILLED_MODEL", "distilgpt2")
+GENERATOR_THREADS = int(os.getenv("GENERATOR_THREADS", "0"))  # torch CPU threads; 0 = torch default
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", "./onnx_models")
+
+# Prompt Budget Configuration
+# Prompts are built to fit CONTEXT_WINDOW_TOKENS (capped at the model's limit) minus
+# the GENERATION_MAX_NEW_TOKENS reserved for the answer
+CONTEXT_WINDOW_TOKENS = int(os.getenv("CONTEXT_WINDOW_TOKENS", "1024"))
+GENERATION_MAX_NEW_TOKENS = int(os.getenv("GENERATION_MAX_NEW_TOKENS", "150"))
+
+# Upper bound on questions accepted by one /ask/batch request
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "32"))
+
+# Queries naming a stored part number skip the vector search
+PART_NUMBER_FAST_PATH = os.getenv("PART_NUMBER_FAST_PATH", "true").lower() == "true"
+
+# Hybrid Retrieval Configuration
+# Vector and BM25 keyword hits (HYBRID_CANDIDATES each) are fused with reciprocal rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Re-ranking Configuration
+# RERANK_CANDIDATES hits are re-scored by a cross-encoder; only the best RERANK_TOP_K
+# go into the answer prompt
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "16384"))  # (query, doc) scores; 0 disables
+RERANK_CACHE_TTL_S = float(os.getenv("RERANK_CACHE_TTL_S", "3600"))
+
+# Query Embedding Cache Configuration
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))  # Entries; 0 disables
+QUERY_EMBEDDING_CACHE_TTL_S = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_S", "3600"))
+
+# Answer Cache Configuration
+# Full answers keyed on (question, n_results, collection version); any upload invalidates them
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))  # Entries; 0 disables
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "64"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "86400"))
+
+# Ingestion Configuration
+INGEST_BLOCK_ROWS = int(os.getenv("INGEST_BLOCK_ROWS", "5000"))  # Rows parsed/embedded/written per block
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))  # Chunks encoded and written per batch
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "1"))  # Upload jobs ingested in parallel
+INGEST_MAX_PENDING_JOBS = int(os.getenv("INGEST_MAX_PENDING_JOBS", "8"))  # Queued + running before 429
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))  # Finished jobs kept for /jobs
+
+# Model Loading Configuration
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() == "true"  # Load models at app startup
+FAST_START = os.getenv("FAST_START", "false").lower() == "true"  # Skip the Llama attempt, load GPT-2 directly
+MODEL_LOAD_WAIT_S = float(os.getenv("MODEL_LOAD_WAIT_S", "30"))  # How long a request waits for a loading model
+
+# Shared Embedding Service Configuration
+# Base URL of the API (e.g. http://localhost:8001) whose /embed endpoint the MCP server uses
+# for query embeddings. Empty = the MCP server loads HF_EMBEDDING_MODEL itself.
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "")
+
+# Encoder Backend Configuration
+# "torch" = SentenceTransformer (reference), "int8" = dynamic int8 quantization of its Linear layers,
+# "onnx" = ONNX Runtime via optimum, "onnx-int8" = int8-quantized ONNX model (both exported once to
+# ONNX_EXPORT_DIR). Vectors stay compatible with a collection built by "torch": the
+# encoder benchmark checks them against EMBEDDING_MIN_COSINE.
+# "hash" = offline hashed bag-of-words stand-in for benchmarks (not compatible with "torch").
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # Sentences per encoder forward pass
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # CPU threads; 0 = library default
+EMBEDDING_MIN_COSINE = float(os.getenv("EMBEDDING_MIN_COSINE", "0.99"))
+
+# Logging Configuration
+# Records go through a bounded queue to one writer thread on stderr; when the queue is full
+# they are dropped rather than blocking request threads
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))  # Fraction of DEBUG records kept
+
+# MCP Server Configuration
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", "8"))  # Threads for blocking ChromaDB work in tool calls
+MCP_METRICS_PORT = int(os.getenv("MCP_METRICS_PORT", "0"))  # Serve Prometheus /metrics on this port; 0 = off
@@ -1,6 +1,7 @@
 """
 Create example Excel document with semiconductor component data
 """
+import argparse
 import pandas as pd
 from pathlib import Path
 
@@ -100,17 +101,47 @@ data = {
     ]
 }
 
-# Create DataFrame
-df = pd.DataFrame(data)
 
-# Save to Excel
-output_dir = Path("examples")
-output_dir.mkdir(exist_ok=True)
-output_file = output_dir / "semiconductor_components.xlsx"
-df.to_excel(output_file, index=False, sheet_name='Components')
+def build_catalog(n_rows: int = None) -> pd.DataFrame:
+    """
+    Build the example catalog. With n_rows larger than the 10 sample
+    components, the samples are repeated with unique IDs and part numbers
+    to produce a synthetic catalog of that size (for benchmarks).
+    """
+    df = pd.DataFrame(data)
+    if n_rows is None or n_rows == len(df):
+        return df
+    
+    repeats = -(-n_rows // len(df))  # Ceiling division
+    df = pd.concat([df] * repeats, ignore_index=True).iloc[:n_rows].copy()
+    serial = pd.Series(range(1, n_rows + 1), index=df.index)
+    df['Component_ID'] = 'SC-' + serial.map('{:07d}'.format)
+    df['Part_Number'] = df['Part_Number'] + '-' + serial.astype(str)
+    return df
 
-print(f"Example Excel file created: {output_file}")
-print(f"Total components: {len(df)}")
-print("\nSample data:")
-print(df.head().to_string())
 
+def main():
+    parser = argparse.ArgumentParser(description="Create example semiconductor component catalog")
+    parser.add_argument("--rows", type=int, default=None, help="Number of rows (default: the 10 samples)")
+    parser.add_argument("--output", default="examples/semiconductor_components.xlsx", help="Output .xlsx or .csv path")
+    args = parser.parse_args()
+    
+    # Create DataFrame
+    df = build_catalog(args.rows)
+    
+    # Save to Excel (or CSV for large synthetic catalogs)
+    output_file = Path(args.output)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if output_file.suffix.lower() == '.csv':
+        df.to_csv(output_file, index=False)
+    else:
+        df.to_excel(output_file, index=False, sheet_name='Components')
+    
+    print(f"Example Excel file created: {output_file}")
+    print(f"Total components: {len(df)}")
+    print("\nSample data:")
+    print(df.head().to_string())
+
+
+if __name__ == "__main__":
+    main()
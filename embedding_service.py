@@ -0,0 +1,302 @@
+"""
+Shared Embedding Service
+One encoder path for the API and the MCP server, so queries are embedded with
+the same model that produced the stored document vectors (config.HF_EMBEDDING_MODEL)
+instead of ChromaDB's default embedder. config.EMBEDDING_BACKEND runs that model
+with PyTorch, int8-quantized PyTorch or ONNX Runtime.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import urllib.request
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import config
+from cache import TTLCache, normalize_query
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except Exception as e:
+    logging.getLogger(__name__).warning("sentence-transformers import failed: %s", e)
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# Backends producing vectors compatible with the reference "torch" encoder
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime replacement for SentenceTransformer.encode.
+    The transformer is exported once with optimum to ONNX_EXPORT_DIR (and, with
+    ``quantize``, dynamically quantized to int8 there); token embeddings are then
+    mean-pooled and L2-normalized like all-MiniLM-L6-v2's own pipeline.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, max_seq_length: int = 256):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_seq_length = max_seq_length
+        self.tokenizer = None
+        self.model = None
+
+    @property
+    def export_dir(self) -> str:
+        return os.path.join(config.ONNX_EXPORT_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "--", self.model_name))
+
+    def load(self) -> "OnnxSentenceEncoder":
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        model_file = os.path.join(self.export_dir, "model.onnx")
+        if not os.path.exists(model_file):
+            logger.info("Exporting %s to ONNX (one-time)...", self.model_name)
+            exported = ORTModelForFeatureExtraction.from_pretrained(self.model_name, export=True)
+            exported.save_pretrained(self.export_dir)
+            AutoTokenizer.from_pretrained(self.model_name).save_pretrained(self.export_dir)
+
+        file_name = "model.onnx"
+        if self.quantize:
+            file_name = "model_quantized.onnx"
+            quantized_file = os.path.join(self.export_dir, file_name)
+            if not os.path.exists(quantized_file):
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(model_file, quantized_file, weight_type=QuantType.QInt8)
+
+        options = onnxruntime.SessionOptions()
+        if config.EMBEDDING_THREADS > 0:
+            options.intra_op_num_threads = config.EMBEDDING_THREADS
+        self.tokenizer = AutoTokenizer.from_pretrained(self.export_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            self.export_dir, file_name=file_name, session_options=options
+        )
+        return self
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = True,
+               **kwargs) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            tokens = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+
+class HashingEncoder:
+    """
+    Offline stand-in encoder for benchmarks: signed feature hashing of word
+    unigrams and bigrams into ``dim`` buckets, L2-normalized. Needs no model
+    download and is deterministic across processes, but its vectors are not
+    compatible with a collection built by a real encoder.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        return digest % self.dim, 1.0 if digest >> 63 else -1.0
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD_RE.findall(text.casefold())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                bucket, sign = self._bucket(feature)
+                vectors[row, bucket] += sign
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+
+def load_encoder(model_name: str, backend: str):
+    """Encoder exposing ``encode(texts, batch_size=...)`` for one EMBEDDING_BACKENDS entry (or "hash")"""
+    if backend == "hash":
+        return HashingEncoder()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)} or 'hash'"
+        )
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxSentenceEncoder(model_name, quantize=backend == "onnx-int8").load()
+
+    import torch
+    if config.EMBEDDING_THREADS > 0:
+        torch.set_num_threads(config.EMBEDDING_THREADS)
+    if backend == "int8":
+        encoder = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(model_name)
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """Row-wise cosine similarity between two encoders' vectors for the same texts"""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosine = (reference * candidate).sum(axis=1) / np.clip(
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1), 1e-12, None
+    )
+    return {"min": round(float(cosine.min()), 6), "mean": round(float(cosine.mean()), 6)}
+
+
+class EmbeddingService:
+    """Local encoder plus a query-embedding cache"""
+
+    def __init__(self, model_name: str = None, backend: str = None):
+        self.model_name = model_name or config.HF_EMBEDDING_MODEL
+        self.backend = backend or config.EMBEDDING_BACKEND
+        self.encoder = None
+        self._load_lock = threading.Lock()
+        self.query_cache = TTLCache(
+            maxsize=config.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl=config.QUERY_EMBEDDING_CACHE_TTL_S
+        )
+
+    @property
+    def available(self) -> bool:
+        return self.encoder is not None
+
+    def load(self) -> bool:
+        """Load the encoder once; returns False if it cannot be loaded"""
+        with self._load_lock:
+            if self.encoder is not None:
+                return True
+            # The ONNX backends need optimum + onnxruntime instead of sentence-transformers
+            if not SENTENCE_TRANSFORMERS_AVAILABLE and self.backend in ("torch", "int8"):
+                logger.warning("sentence-transformers not available.")
+                return False
+            try:
+                logger.info("Loading embedding model...")
+                self.encoder = load_encoder(self.model_name, self.backend)
+                logger.info("Loaded encoder: %s (%s backend)", self.model_name, self.backend)
+                return True
+            except Exception as e:
+                logger.warning("Could not load embedding model: %s", e)
+                return False
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents (no caching)"""
+        if not self.load():
+            raise RuntimeError(f"Embedding model {self.model_name} is not available")
+        return self.encoder.encode(texts, batch_size=config.EMBEDDING_BATCH_SIZE).tolist()
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, reusing cached vectors and encoding all misses in one forward pass"""
+        keys = [(self.model_name, normalize_query(query)) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.encode([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                self.query_cache.put(keys[i], embedding)
+        return embeddings
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "backend": self.backend, "query_cache": self.query_cache.stats()}
+
+
+class RemoteEmbeddingClient:
+    """
+    Embeds queries through the API's POST /embed endpoint, so a separate process
+    (the MCP server) shares the API's loaded encoder instead of holding its own.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.model_name = config.HF_EMBEDDING_MODEL
+        self.query_cache = TTLCache(
+            maxsize=config.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl=config.QUERY_EMBEDDING_CACHE_TTL_S
+        )
+
+    def _post(self, texts: List[str]) -> List[List[float]]:
+        request = urllib.request.Request(
+            f"{self.base_url}/embed",
+            data=json.dumps({"texts": texts, "is_query": True}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        if payload.get("model") != self.model_name:
+            raise RuntimeError(
+                f"Embedding service uses {payload.get('model')}, expected {self.model_name}"
+            )
+        return payload["embeddings"]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        keys = [(self.model_name, normalize_query(query)) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self._post([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                self.query_cache.put(keys[i], embedding)
+        return embeddings
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "remote": self.base_url, "query_cache": self.query_cache.stats()}
+
+
+class QueryEmbedder:
+    """
+    Query embedding for processes other than the API (the MCP server).
+    Uses the API's /embed endpoint when EMBEDDING_SERVICE_URL is set and falls
+    back to a local EmbeddingService if the API cannot be reached.
+    """
+
+    def __init__(self, service_url: Optional[str] = None):
+        self.remote = RemoteEmbeddingClient(service_url) if service_url else None
+        self.local = None
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        if self.remote is not None:
+            try:
+                return self.remote.embed_queries(queries)
+            except Exception as e:
+                logger.warning("Embedding service unavailable (%s), using local encoder", e)
+        if self.local is None:
+            self.local = get_embedding_service()
+        return self.local.embed_queries(queries)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_queries([query])[0]
+
+
+# Global instance
+embedding_service = None
+_embedding_service_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """Get or create this process's embedding service (the encoder loads on first use)"""
+    global embedding_service
+    if embedding_service is None:
+        with _embedding_service_lock:
+            if embedding_service is None:
+                embedding_service = EmbeddingService()
+    return embedding_service
@@ -0,0 +1,403 @@
+"""
+Memory-mapped embedding snapshots for the in-memory vector store
+A snapshot is a directory of .npy columns that every process maps read-only:
+
+  vectors.npy              rows x dim matrix (float32 or float16)
+  searchable.npy           per-row flag: the row has an embedding
+  ids / documents /        UTF-8 blobs (uint8) plus int64 offset tables with
+  metadatas[.offsets].npy  rows + 1 entries; metadata entries are JSON
+  ivf_centroids.npy,       the IVF index, when the store had one
+  ivf_assignments.npy
+  column-<i>.*.npy         typed filter columns (see write_snapshot), so
+                           ``where`` filters need no JSON decoding
+  manifest.json            collection version, shape, dtype and the filter
+                           columns' fields (written last)
+
+EMBEDDING_STORE_DIR/CURRENT names the newest complete snapshot, and writers
+take EMBEDDING_STORE_DIR/LOCK while they publish. Opening one
+maps the files and reads the manifest, so warm start costs the same at 1k or
+1M rows, and processes mapping the same snapshot share its pages in the OS page
+cache instead of each holding a private copy. Rows are decoded only when used.
+"""
+import bisect
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Sequence
+import numpy as np
+import config
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+SNAPSHOT_DTYPES = ("float32", "float16")
+_CURRENT = "CURRENT"
+_LOCK = "LOCK"
+_MANIFEST = "manifest.json"
+
+
+class StringColumn(Sequence):
+    """Read-only sequence of strings stored as one UTF-8 blob plus an offset table"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _decode(self, row: int) -> str:
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        return self._decode(row)
+
+
+class JsonColumn(StringColumn):
+    """StringColumn of JSON values (``None`` for an empty entry)"""
+
+    def _decode(self, row: int) -> Any:
+        text = super()._decode(row)
+        return json.loads(text) if text else None
+
+
+class IdIndex:
+    """
+    ID -> row lookup over a snapshot's ID column. The dict is built on the
+    first lookup, so opening a snapshot does not pay for it.
+    """
+
+    def __init__(self, ids: StringColumn):
+        self._ids = ids
+        self._index = None
+
+    def _lookup(self) -> Dict[str, int]:
+        if self._index is None:
+            self._index = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._lookup()
+
+    def __getitem__(self, doc_id: str) -> int:
+        return self._lookup()[doc_id]
+
+    def get(self, doc_id: str, default=None):
+        return self._lookup().get(doc_id, default)
+
+    def items(self):
+        return self._lookup().items()
+
+
+_ABSENT = object()
+
+
+class CodeLookup:
+    """
+    Value -> code of a mapped codes column: bisects the column's sorted
+    distinct strings and numbers; the few other values (booleans) are a dict
+    """
+
+    def __init__(self, strings: StringColumn, string_codes: np.ndarray, numbers: np.ndarray,
+                 number_codes: np.ndarray, others: Dict[Any, int]):
+        self._strings = strings
+        self._string_codes = string_codes
+        self._numbers = numbers
+        self._number_codes = number_codes
+        self._others = others
+
+    def get(self, value: Any, default=None):
+        if isinstance(value, str):
+            row = bisect.bisect_left(self._strings, value)
+            if row < len(self._strings) and self._strings[row] == value:
+                return int(self._string_codes[row])
+            return default
+        # Same equality as the dict this was saved from (True == 1)
+        code = self._others.get(value, _ABSENT)
+        if code is not _ABSENT:
+            return code
+        if isinstance(value, (int, float)):
+            row = int(np.searchsorted(self._numbers, value))
+            if row < len(self._numbers) and self._numbers[row] == value:
+                return int(self._number_codes[row])
+        return default
+
+    def __contains__(self, value: Any) -> bool:
+        return self.get(value, _ABSENT) is not _ABSENT
+
+    def __getitem__(self, value: Any) -> int:
+        code = self.get(value, _ABSENT)
+        if code is _ABSENT:
+            raise KeyError(value)
+        return code
+
+
+class EmbeddingSnapshot:
+    """One opened snapshot: read-only memory-mapped columns plus its manifest"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, _MANIFEST), "r") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported embedding snapshot format {self.manifest.get('format')!r}")
+        self.version = self.manifest["version"]
+        self.vectors = self._map("vectors")
+        self.searchable = self._map("searchable")
+        self.ids = StringColumn(self._map("ids"), self._map("ids.offsets"))
+        self.documents = StringColumn(self._map("documents"), self._map("documents.offsets"))
+        self.metadatas = JsonColumn(self._map("metadatas"), self._map("metadatas.offsets"))
+        self.index = IdIndex(self.ids)
+        self.ivf_centroids = None
+        self.ivf_assignments = None
+        if self.manifest.get("ivf"):
+            self.ivf_centroids = self._map("ivf_centroids")
+            self.ivf_assignments = self._map("ivf_assignments")
+        self.columns = {
+            entry["field"]: self._map_column(f"column-{position}", entry)
+            for position, entry in enumerate(self.manifest.get("columns", []))
+        }
+
+    def _map_column(self, name: str, entry: Dict[str, Any]) -> tuple:
+        """("numeric", values) or ("codes", codes, CodeLookup, sorted numbers, their codes)"""
+        if entry["kind"] == "numeric":
+            return ("numeric", self._map(f"{name}.values"))
+        numbers, number_codes = self._map(f"{name}.numbers"), self._map(f"{name}.number_codes")
+        lookup = CodeLookup(
+            StringColumn(self._map(f"{name}.strings"), self._map(f"{name}.strings.offsets")),
+            self._map(f"{name}.string_codes"), numbers, number_codes,
+            {value: code for value, code in entry["others"]}
+        )
+        return ("codes", self._map(f"{name}.codes"), lookup, numbers, number_codes)
+
+    def _map(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    @property
+    def rows(self) -> int:
+        return self.manifest["rows"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "dimension": self.manifest["dim"],
+            "dtype": self.manifest["dtype"],
+            "version": self.version,
+            "bytes": self.manifest["bytes"]
+        }
+
+
+def _write_strings(path: str, name: str, values: Iterable[Optional[str]]) -> int:
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(path, f"{name}.offsets.npy"), offsets)
+    np.save(os.path.join(path, f"{name}.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    return int(offsets[-1]) + offsets.nbytes
+
+
+def _write_column(path: str, name: str, column: tuple) -> Dict[str, Any]:
+    """Save one filter column; returns its manifest entry (without the field name)"""
+    if column[0] == "numeric":
+        np.save(os.path.join(path, f"{name}.values.npy"), np.asarray(column[1], dtype=np.float64))
+        return {"kind": "numeric"}
+    _, codes, lookup, numbers, number_codes = column
+    np.save(os.path.join(path, f"{name}.codes.npy"), np.asarray(codes, dtype=np.int32))
+    np.save(os.path.join(path, f"{name}.numbers.npy"), np.asarray(numbers, dtype=np.float64))
+    np.save(os.path.join(path, f"{name}.number_codes.npy"), np.asarray(number_codes, dtype=np.int32))
+    strings = sorted((value, code) for value, code in lookup.items() if isinstance(value, str))
+    _write_strings(path, f"{name}.strings", (value for value, _ in strings))
+    np.save(os.path.join(path, f"{name}.string_codes.npy"), np.array([code for _, code in strings], dtype=np.int32))
+    others = [
+        [value, code] for value, code in lookup.items()
+        if not isinstance(value, str) and (isinstance(value, bool) or not isinstance(value, (int, float)))
+    ]
+    return {"kind": "codes", "others": others}
+
+
+def write_snapshot(
+    directory: str,
+    version: str,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    documents: Sequence[Optional[str]],
+    metadatas: Sequence[Optional[Dict[str, Any]]],
+    searchable: Optional[np.ndarray] = None,
+    dtype: str = None,
+    ivf_centroids: Optional[np.ndarray] = None,
+    ivf_assignments: Optional[np.ndarray] = None,
+    columns: Optional[Dict[str, tuple]] = None
+) -> str:
+    """
+    Write a new snapshot and make it CURRENT. The files go to a fresh directory
+    and CURRENT is switched with an atomic rename, so readers only ever see
+    complete snapshots. Publishing holds the directory lock, so writers in
+    other processes take turns; finished snapshots older than the previous
+    one are removed.
+
+    ``columns`` maps metadata fields to the in-memory store's filter columns,
+    ("numeric", values) or ("codes", codes, value -> code dict, sorted numbers,
+    their codes), over the same rows. They are saved as arrays, with the
+    distinct strings sorted so a reader looks values up by bisection.
+
+    A snapshot is complete and immutable: every call writes all rows, even
+    when only a few changed since the previous one. Readers map one directory
+    and never merge deltas, at the cost of a full sequential write per publish.
+    """
+    dtype = dtype or config.EMBEDDING_STORE_DTYPE
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"Unknown snapshot dtype {dtype!r}; expected one of {', '.join(SNAPSHOT_DTYPES)}")
+    os.makedirs(directory, exist_ok=True)
+    with _directory_lock(directory):
+        return _write_snapshot(directory, version, ids, vectors, documents, metadatas, searchable, dtype,
+                               ivf_centroids, ivf_assignments, columns or {})
+
+
+def _write_snapshot(directory, version, ids, vectors, documents, metadatas, searchable, dtype,
+                    ivf_centroids, ivf_assignments, columns) -> str:
+    start = time.perf_counter()
+    name = f"snapshot-{time.time_ns()}-{os.getpid()}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    rows = len(ids)
+    matrix = np.lib.format.open_memmap(
+        os.path.join(path, "vectors.npy"), mode="w+", dtype=dtype, shape=(rows, vectors.shape[1])
+    )
+    for block in range(0, rows, 65536):
+        matrix[block:block + 65536] = vectors[block:block + 65536]
+    matrix.flush()
+    size = matrix.nbytes
+    del matrix
+    if searchable is None:
+        searchable = np.ones(rows, dtype=bool)
+    np.save(os.path.join(path, "searchable.npy"), np.asarray(searchable, dtype=bool))
+
+    size += _write_strings(path, "ids", ids)
+    size += _write_strings(path, "documents", documents)
+    size += _write_strings(path, "metadatas", (json.dumps(m) if m is not None else "" for m in metadatas))
+    has_ivf = ivf_centroids is not None and ivf_assignments is not None
+    if has_ivf:
+        np.save(os.path.join(path, "ivf_centroids.npy"), np.asarray(ivf_centroids, dtype=np.float32))
+        np.save(os.path.join(path, "ivf_assignments.npy"), np.asarray(ivf_assignments[:rows], dtype=np.int32))
+
+    column_entries = [
+        {"field": field, **_write_column(path, f"column-{position}", column)}
+        for position, (field, column) in enumerate(columns.items())
+    ]
+
+    manifest = {
+        "format": FORMAT_VERSION, "version": version, "rows": rows, "dim": int(vectors.shape[1]),
+        "dtype": dtype, "ivf": has_ivf, "columns": column_entries, "bytes": size, "created": time.time()
+    }
+    with open(os.path.join(path, _MANIFEST), "w") as f:
+        json.dump(manifest, f)
+
+    pointer = os.path.join(directory, f"{_CURRENT}.{os.getpid()}.tmp")
+    with open(pointer, "w") as f:
+        f.write(name)
+    previous = _current_name(directory)
+    os.replace(pointer, os.path.join(directory, _CURRENT))
+    _remove_old(directory, older_than=previous)
+    logger.info(
+        "Wrote embedding snapshot: %d rows (%s) in %.0f ms", rows, dtype, (time.perf_counter() - start) * 1000.0
+    )
+    return path
+
+
+def _current_name(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, _CURRENT), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _directory_lock(directory: str):
+    """Exclusive lock on ``directory`` across processes (held while publishing)"""
+    with open(os.path.join(directory, _LOCK), "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _created_ns(name: str) -> Optional[int]:
+    """Creation time encoded in a snapshot directory name (snapshot-<ns>-<pid>)"""
+    parts = name.split("-")
+    try:
+        return int(parts[1]) if len(parts) == 3 and parts[0] == "snapshot" else None
+    except ValueError:
+        return None
+
+
+def _remove_old(directory: str, older_than: Optional[str]):
+    """
+    Delete finished snapshots created before ``older_than`` (the previous
+    CURRENT, kept for readers that are still switching). Unfinished ones
+    (no manifest yet) are left alone. Already-mapped files stay readable
+    after unlinking on POSIX; on Windows a snapshot still in use is just
+    left for later.
+    """
+    cutoff = _created_ns(older_than) if older_than else None
+    if cutoff is None:
+        return
+    for entry in os.listdir(directory):
+        created = _created_ns(entry)
+        if created is not None and created < cutoff and os.path.exists(os.path.join(directory, entry, _MANIFEST)):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def open_snapshot(directory: str = None) -> Optional[EmbeddingSnapshot]:
+    """Map the CURRENT snapshot of ``directory`` (EMBEDDING_STORE_DIR); None if there is none"""
+    directory = directory or config.EMBEDDING_STORE_DIR
+    name = _current_name(directory)
+    if name is None:
+        return None
+    try:
+        return EmbeddingSnapshot(os.path.join(directory, name))
+    except Exception as e:
+        logger.warning("Could not open embedding snapshot %s: %s", name, e)
+        return None
+
+
+def snapshot_version(directory: str = None) -> Optional[str]:
+    """Collection version of the CURRENT snapshot, without mapping it"""
+    directory = directory or config.EMBEDDING_STORE_DIR
+    name = _current_name(directory)
+    if name is None:
+        return None
+    try:
+        with open(os.path.join(directory, name, _MANIFEST), "r") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
@@ -28,12 +28,16 @@ const upload = multer({
     fileFilter: (req, file, cb) => {
         const allowedTypes = [
             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', // .xlsx
-            'application/vnd.ms-excel' // .xls
+            'application/vnd.ms-excel', // .xls (some browsers also report .csv this way)
+            'text/csv' // .csv
         ];
-        if (allowedTypes.includes(file.mimetype)) {
+        // Parquet has no registered MIME type, so also accept by extension
+        const allowedExtensions = ['.xlsx', '.xls', '.csv', '.parquet'];
+        const extension = path.extname(file.originalname).toLowerCase();
+        if (allowedTypes.includes(file.mimetype) || allowedExtensions.includes(extension)) {
             cb(null, true);
         } else {
-            cb(new Error('Invalid file type. Please upload Excel files (.xlsx or .xls)'));
+            cb(new Error('Invalid file type. Please upload Excel, CSV or Parquet files (.xlsx, .xls, .csv or .parquet)'));
         }
     }
 });
@@ -117,10 +121,23 @@ app.post('/api/upload', upload.single('file'), async (req, res) => {
     }
 });
 
+// Ingestion job status - proxy to backend
+app.get('/api/jobs/:jobId', async (req, res) => {
+    try {
+        const response = await axios.get(`${BACKEND_URL}/jobs/${encodeURIComponent(req.params.jobId)}`);
+        res.json(response.data);
+    } catch (error) {
+        res.status(error.response?.status || 500).json({
+            error: 'Failed to get job status',
+            message: error.response?.data?.detail || error.message
+        });
+    }
+});
+
 // Ask question - proxy to backend
 app.post('/api/ask', async (req, res) => {
     try {
-        const { question, n_results = 5 } = req.body;
+        const { question, n_results = 5, where } = req.body;
 
         if (!question) {
             return res.status(400).json({ error: 'Question is required' });
@@ -128,7 +145,8 @@ app.post('/api/ask', async (req, res) => {
 
         const response = await axios.post(`${BACKEND_URL}/ask`, {
             question,
-            n_results
+            n_results,
+            where
         }, {
             headers: {
                 'Content-Type': 'application/json'
@@ -144,6 +162,39 @@ app.post('/api/ask', async (req, res) => {
     }
 });
 
+// Ask question with streamed answer - pipe NDJSON events from backend
+app.post('/api/ask/stream', async (req, res) => {
+    try {
+        const { question, n_results = 5, where } = req.body;
+
+        if (!question) {
+            return res.status(400).json({ error: 'Question is required' });
+        }
+
+        const response = await axios.post(`${BACKEND_URL}/ask/stream`, {
+            question,
+            n_results,
+            where
+        }, {
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            responseType: 'stream'
+        });
+
+        res.setHeader('Content-Type', 'application/x-ndjson');
+        res.setHeader('Cache-Control', 'no-cache');
+        res.flushHeaders();
+        response.data.pipe(res);
+        req.on('close', () => response.data.destroy());
+    } catch (error) {
+        res.status(error.response?.status || 500).json({
+            error: 'Failed to get answer',
+            message: error.message
+        });
+    }
+});
+
 // Start server
 app.listen(PORT, () => {
     console.log('\n' + '='.repeat(60));
@@ -0,0 +1,182 @@
+"""
+Generator backends for the RAG pipeline
+Every backend exposes the same tokenizer / model / generate interface, so
+RAGPipeline.generate_answer, batching and streaming work unchanged whichever
+one config.GENERATOR_BACKEND selects:
+
+  llama      GENERATOR_MODEL in float32 on CPU (float16 on GPU)
+  int8       GENERATOR_MODEL with dynamically int8-quantized Linear layers (CPU)
+  onnx       GENERATOR_MODEL exported to ONNX and run by ONNX Runtime (optimum)
+  distilled  a small distilled model (GENERATOR_DISTILLED_MODEL, distilgpt2 by default)
+  gpt2       GPT-2, the fallback when the selected backend cannot be loaded
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, List
+import config
+from metrics import stage_timer
+
+try:
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    import torch
+    TRANSFORMERS_AVAILABLE = True
+except Exception as e:
+    logging.getLogger(__name__).warning("transformers import failed: %s", e)
+    TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class CausalLMBackend:
+    """Hugging Face causal LM with a left-padding tokenizer for batched generation"""
+
+    name = "llama"
+    # Sampling matches the original Llama settings; GPT-2-sized models answer greedily
+    sample = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.tokenizer = None
+        self.model = None
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def _load_model(self):
+        on_gpu = torch.cuda.is_available()
+        return AutoModelForCausalLM.from_pretrained(
+            self.model_name,
+            token=config.HF_API_KEY,
+            trust_remote_code=True,
+            torch_dtype=torch.float16 if on_gpu else torch.float32,
+            device_map="auto" if on_gpu else None,
+            low_cpu_mem_usage=True
+        )
+
+    def load(self):
+        """Load tokenizer and model; raises if either cannot be loaded"""
+        if not TRANSFORMERS_AVAILABLE:
+            raise RuntimeError("transformers is not available")
+        if config.GENERATOR_THREADS > 0:
+            torch.set_num_threads(config.GENERATOR_THREADS)
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.model_name,
+            token=config.HF_API_KEY,
+            trust_remote_code=True
+        )
+        # Left padding so batched prompts end right where generation starts
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+        self.model = self._load_model()
+        return self
+
+    def generation_kwargs(self, max_new_tokens: int) -> Dict[str, Any]:
+        """Keyword arguments for ``model.generate``"""
+        kwargs = {"max_new_tokens": max_new_tokens, "pad_token_id": self.tokenizer.pad_token_id}
+        if self.sample:
+            kwargs.update(do_sample=True, temperature=0.7)
+        return kwargs
+
+    def generate(self, prompts: List[str], max_new_tokens: int, max_length: int) -> List[str]:
+        """Run one padded batched generate call and return the new text per prompt"""
+        with stage_timer("tokenize"):
+            inputs = self.tokenizer(
+                prompts, return_tensors="pt", padding=True, truncation=True, max_length=max_length
+            )
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+
+        with stage_timer("generate"), torch.no_grad():
+            outputs = self.model.generate(**inputs, **self.generation_kwargs(max_new_tokens))
+
+        # Prompts are left-padded to the same length, so new tokens start there
+        prompt_length = inputs["input_ids"].shape[1]
+        with stage_timer("decode"):
+            return [
+                self.tokenizer.decode(output[prompt_length:], skip_special_tokens=True).strip()
+                for output in outputs
+            ]
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model_name}
+
+
+class Int8Backend(CausalLMBackend):
+    """
+    Dynamic int8 quantization: Linear weights are stored as int8 and activations
+    quantized on the fly, about a quarter of the float32 weight memory and faster
+    CPU matmuls. GPT-2 style models use Conv1D instead of Linear and see no gain.
+    """
+
+    name = "int8"
+
+    def _load_model(self):
+        model = AutoModelForCausalLM.from_pretrained(
+            self.model_name,
+            token=config.HF_API_KEY,
+            trust_remote_code=True,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True
+        )
+        model.eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(CausalLMBackend):
+    """
+    ONNX Runtime through optimum. The first load exports the model to
+    ONNX_EXPORT_DIR; later loads (and other workers) reuse the export.
+    """
+
+    name = "onnx"
+
+    @property
+    def export_dir(self) -> str:
+        return os.path.join(config.ONNX_EXPORT_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "--", self.model_name))
+
+    def _load_model(self):
+        from optimum.onnxruntime import ORTModelForCausalLM
+
+        if os.path.isdir(self.export_dir) and os.listdir(self.export_dir):
+            return ORTModelForCausalLM.from_pretrained(self.export_dir, use_cache=True)
+
+        logger.info("Exporting %s to ONNX (one-time)...", self.model_name)
+        model = ORTModelForCausalLM.from_pretrained(
+            self.model_name, export=True, use_cache=True, token=config.HF_API_KEY
+        )
+        model.save_pretrained(self.export_dir)
+        return model
+
+
+class SmallModelBackend(CausalLMBackend):
+    """Small GPT-2-family model (GPT-2 itself or a distilled variant), greedy decoding"""
+
+    sample = False
+
+    def __init__(self, model_name: str, name: str):
+        super().__init__(model_name)
+        self.name = name
+
+    def _load_model(self):
+        model = AutoModelForCausalLM.from_pretrained(self.model_name, token=config.HF_API_KEY)
+        return model.to("cuda") if torch.cuda.is_available() else model
+
+
+BACKENDS = ("llama", "int8", "onnx", "distilled", "gpt2")
+
+
+def create_backend(name: str, model_name: str = None) -> CausalLMBackend:
+    """Unloaded backend by name; ``model_name`` overrides the configured model"""
+    if name == "llama":
+        return CausalLMBackend(model_name or config.GENERATOR_MODEL)
+    if name == "int8":
+        return Int8Backend(model_name or config.GENERATOR_MODEL)
+    if name == "onnx":
+        return OnnxBackend(model_name or config.GENERATOR_MODEL)
+    if name == "distilled":
+        return SmallModelBackend(model_name or config.GENERATOR_DISTILLED_MODEL, "distilled")
+    if name == "gpt2":
+        return SmallModelBackend(model_name or "gpt2", "gpt2")
+    raise ValueError(f"Unknown generator backend {name!r}; expected 'auto' or one of {', '.join(BACKENDS)}")
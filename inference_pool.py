@@ -0,0 +1,401 @@
+"""
+Inference Worker Pool for the RAG API
+Runs blocking RAG work (retrieval and generation) off the FastAPI
+event loop with a bounded admission queue and per-request timeouts
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+import config
+from log_config import get_request_id, run_with_request_id, setup_logging
+from metrics import registry
+
+
+class PoolFullError(Exception):
+    """Raised when the pool has no free worker and the admission queue is full"""
+
+
+class PoolTimeoutError(Exception):
+    """Raised when a task does not finish within its timeout"""
+
+
+class PoolUnavailableError(Exception):
+    """Raised when a task is submitted before start() or after shutdown()"""
+
+
+# Task functions - module level so they can be pickled for a process pool
+def _warm_worker():
+    """Load the RAG pipeline once per worker process"""
+    # A forked worker inherits the parent's log queue but not its listener thread
+    setup_logging(force=True)
+    # ... and a copy of its metrics, which the parent already has: start the deltas from here
+    registry.collect_delta()
+    from rag_pipeline import get_rag_pipeline
+    get_rag_pipeline()
+
+
+def run_in_worker(request_id: str, fn: Callable, *args) -> tuple:
+    """
+    Process-pool task wrapper: ``fn(*args)`` under the caller's request ID, plus
+    the metric changes this worker recorded since its last task (stage timings,
+    token and batching histograms) for the parent to merge into its registry
+    """
+    return run_with_request_id(request_id, fn, *args), registry.collect_delta()
+
+
+def wait_until_loaded_task() -> Dict[str, Any]:
+    """Block until this worker's models are loaded and return its readiness"""
+    from rag_pipeline import get_rag_pipeline
+    rag = get_rag_pipeline()
+    rag.encoder_ready.wait()
+    rag.generator_ready.wait()
+    return rag.readiness()
+
+
+def retrieve_context_task(question: str, n_results: int, where: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Retrieval only - needs just the encoder, not the LLM"""
+    from rag_pipeline import get_rag_pipeline
+    return get_rag_pipeline().retrieve_context(question, n_results, where)
+
+
+def retrieve_contexts_task(questions: List[str], n_results: int,
+                           where: Optional[Dict[str, Any]] = None) -> List[List[str]]:
+    """Batch retrieval: one encoder pass and one multi-query ChromaDB lookup"""
+    from rag_pipeline import get_rag_pipeline
+    return get_rag_pipeline().retrieve_contexts(questions, n_results, where)
+
+
+def answer_questions_task(questions: List[str], n_results: int,
+                          where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Batch RAG flow for several questions"""
+    from rag_pipeline import get_rag_pipeline
+    return get_rag_pipeline().answer_questions(questions, n_results, where)
+
+
+def embed_texts_task(texts: List[str], is_query: bool) -> List[List[float]]:
+    """Embed texts with the shared encoder (queries go through the query cache)"""
+    from embedding_service import get_embedding_service
+    service = get_embedding_service()
+    return service.embed_queries(texts) if is_query else service.encode(texts)
+
+
+def answer_question_task(question: str, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run the full RAG flow for one question"""
+    from rag_pipeline import get_rag_pipeline
+    return get_rag_pipeline().answer_question(question, n_results, where)
+
+
+def stream_answer_task(question: str, n_results: int,
+                       where: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streamed RAG flow as events: context, one token event per generated piece,
+    then done (see /ask/stream). Runs on one pool worker from start to finish.
+    """
+    from rag_pipeline import NO_CONTEXT_ANSWER, get_rag_pipeline
+    rag = get_rag_pipeline()
+    cached = rag.lookup_answer(question, n_results, where)
+    if cached is not None:
+        yield {"type": "context", "query": question, "context": cached["context"]}
+        yield {"type": "token", "text": cached["answer"]}
+        yield {"type": "done", "answer": cached["answer"], "usage": cached["usage"]}
+        return
+
+    hits = rag.retrieve_hits([question], rag.generation_results(n_results), where)[0]
+    context = hits["documents"]
+    yield {"type": "context", "query": question, "context": context}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    if not context:
+        answer = NO_CONTEXT_ANSWER
+        yield {"type": "token", "text": answer}
+    else:
+        pieces = []
+        for piece in rag.stream_answer(question, context, hits["metadatas"], usage=usage):
+            pieces.append(piece)
+            yield {"type": "token", "text": piece}
+        answer = "".join(pieces).strip()
+    yield {"type": "done", "answer": answer, "usage": usage}
+
+
+class _StreamError:
+    """Exception raised by a streaming task, passed to the consumer"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_STREAM_END = object()
+
+
+def _pump(fn: Callable, args: tuple, loop: asyncio.AbstractEventLoop, items: asyncio.Queue,
+          stop: threading.Event):
+    """Feed the items of ``fn(*args)`` to ``items`` on ``loop`` until exhausted or ``stop`` is set"""
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, item)
+        except RuntimeError:
+            stop.set()  # The event loop is gone
+
+    iterator = fn(*args)
+    try:
+        for item in iterator:
+            if stop.is_set():
+                break
+            put(item)
+    except Exception as e:
+        put(_StreamError(e))
+    else:
+        put(_STREAM_END)
+    finally:
+        iterator.close()
+
+
+def _future_readiness(future) -> Dict[str, Any]:
+    if not future.done():
+        return {"encoder": "loading", "generator": "loading"}
+    try:
+        return future.result()
+    except Exception as e:
+        return {"encoder": "failed", "generator": "failed", "error": str(e)}
+
+
+def _combine_readiness(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One readiness for several workers: a model is only "ready" when it is on all of them"""
+    combined = dict(next((state for state in states if state.get("generator") == "ready"), states[0]))
+    for model in ("encoder", "generator"):
+        values = {state.get(model) for state in states}
+        if len(values) == 1:
+            combined[model] = values.pop()
+        else:
+            combined[model] = next(
+                (value for value in ("failed", "loading", "not loaded") if value in values), "loading"
+            )
+    errors = [state["error"] for state in states if "error" in state]
+    if errors:
+        combined["error"] = errors[0]
+    combined["workers_ready"] = sum(
+        state.get("encoder") == "ready" and state.get("generator") == "ready" for state in states
+    )
+    combined["workers"] = len(states)
+    return combined
+
+
+class InferencePool:
+    """
+    Bounded executor for blocking inference work.
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` more
+    wait for a worker. Anything beyond that is rejected with PoolFullError so
+    the API can answer 429 instead of letting latency grow without bound.
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 2,
+        max_queue: int = 16,
+        timeout: Optional[float] = 60.0
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind!r} (expected 'thread' or 'process')")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self._warmers = []
+        self._probe = None
+        self._probe_state = {"encoder": "loading", "generator": "loading"}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._rejected_counter = registry.counter("inference_rejected_total", "Requests refused with 429")
+        self._timed_out_counter = registry.counter("inference_timed_out_total", "Inference tasks over the timeout")
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def start(self):
+        """Create the underlying executor"""
+        if self._executor is not None:
+            return
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_warm_worker
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+
+    def warm_up(self):
+        """
+        Start loading models now instead of on the first request.
+        Thread pools share this process's pipeline, which loads in the background;
+        process pools get one loading task per worker.
+        """
+        if self.kind == "process":
+            self._warmers = [
+                self._executor.submit(wait_until_loaded_task) for _ in range(self.max_workers)
+            ]
+        else:
+            from rag_pipeline import get_rag_pipeline
+            get_rag_pipeline()
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Model readiness of the workers (see RAGPipeline.readiness). Process pools
+        combine every preloading worker; without preloading they report "lazy"
+        until a request has started the workers, then the latest answer of a
+        readiness task run on one of them (a new one is sent on each call).
+        """
+        if self.kind != "process":
+            from rag_pipeline import get_readiness
+            return get_readiness()
+        if self._warmers:
+            return _combine_readiness([_future_readiness(warmer) for warmer in self._warmers])
+        if self._executor is None or self._in_flight + self._completed == 0:
+            return {"encoder": "lazy", "generator": "lazy"}
+        probe = self._probe
+        if probe is None or probe.done():
+            if probe is not None:
+                self._probe_state = _future_readiness(probe)
+            from rag_pipeline import get_readiness
+            self._probe = self._executor.submit(get_readiness)
+        return self._probe_state
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the executor"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _admit(self):
+        """Take an admission slot or raise PoolFullError"""
+        if self._executor is None:
+            raise PoolUnavailableError("Inference pool is not running")
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                self._rejected_counter.inc()
+                raise PoolFullError(
+                    f"Inference queue is full ({self._in_flight}/{self.capacity} in flight)"
+                )
+            self._in_flight += 1
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled():
+                self._completed += 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """
+        Run ``fn(*args)`` on a worker and await its result.
+
+        Raises PoolFullError when admission is refused and PoolTimeoutError when
+        the task takes longer than ``timeout`` (defaults to the pool timeout).
+        A task that is still queued when it times out is cancelled; one that is
+        already running keeps its slot until it finishes, so the pool never
+        admits more work than it can actually run.
+        """
+        self._admit()
+        try:
+            # Workers log under the caller's request ID (process workers cannot share the context);
+            # process workers also send back their metrics, which live in their own registry
+            wrapper = run_in_worker if self.kind == "process" else run_with_request_id
+            cf_future = self._executor.submit(wrapper, get_request_id(), fn, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        cf_future.add_done_callback(self._release)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(cf_future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            self._timed_out_counter.inc()
+            raise PoolTimeoutError(f"Inference task exceeded {timeout}s timeout")
+        if self.kind == "process":
+            result, delta = result
+            registry.merge(delta)
+        return result
+
+    async def stream(self, fn: Callable, *args, timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        """
+        Run the generator function ``fn(*args)`` on a worker and yield its items
+        as they are produced. The task keeps its worker and admission slot until
+        the generator is exhausted, so streams count against ``max_workers`` like
+        any other task. ``timeout`` bounds the wait for the first item; closing
+        the iterator early stops the task at its next item.
+        Thread pools only: the items are handed over through an asyncio queue.
+        """
+        if self.kind != "thread":
+            raise PoolUnavailableError("Streaming needs INFERENCE_EXECUTOR=thread")
+        self._admit()
+        items = asyncio.Queue()
+        stop = threading.Event()
+        try:
+            cf_future = self._executor.submit(
+                run_with_request_id, get_request_id(), _pump, fn, args, asyncio.get_running_loop(), items, stop
+            )
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        cf_future.add_done_callback(self._release)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            try:
+                item = await asyncio.wait_for(items.get(), timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._timed_out += 1
+                self._timed_out_counter.inc()
+                raise PoolTimeoutError(f"Inference task exceeded {timeout}s timeout")
+            while item is not _STREAM_END:
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+                item = await items.get()
+        finally:
+            stop.set()
+            cf_future.cancel()  # Only takes effect while the task is still queued
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool occupancy and counters"""
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.max_workers,
+                "queue_size": self.max_queue,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out
+            }
+
+
+# Global instance
+inference_pool = None
+
+def get_inference_pool() -> InferencePool:
+    """Get or create the inference pool configured in config.py"""
+    global inference_pool
+    if inference_pool is None:
+        inference_pool = InferencePool(
+            kind=config.INFERENCE_EXECUTOR,
+            max_workers=config.INFERENCE_WORKERS,
+            max_queue=config.INFERENCE_QUEUE_SIZE,
+            timeout=config.INFERENCE_TIMEOUT_S
+        )
+    return inference_pool
@@ -0,0 +1,317 @@
+"""
+Document ingestion helpers for the RAG pipeline
+Turns tabular component data into text chunks and metadata for ChromaDB,
+reading large files block by block so memory stays flat in file size
+"""
+import hashlib
+import math
+import os
+import re
+from typing import List, Dict, Any, Iterator, Optional
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv", ".parquet")
+
+# Cell strings pandas' readers treat as missing by default (keeps streamed .xlsx
+# blocks identical to pd.read_excel output)
+DEFAULT_NA_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
+
+
+_QUANTITY_RE = re.compile(r"^\s*([-+]?\d+(?:\.\d+)?)\s*([munpkMG\u00b5]?)[A-Za-z]*\s*$")
+_SI_PREFIXES = {"": 1.0, "G": 1e9, "M": 1e6, "k": 1e3, "m": 1e-3, "u": 1e-6, "\u00b5": 1e-6, "n": 1e-9, "p": 1e-12}
+
+
+def parse_quantity(value: Any) -> Optional[float]:
+    """
+    Parse a rating cell like ``"3.3V"``, ``"500 mA"`` or ``12`` into a float in
+    base units. Returns None for missing or non-numeric values (``"N/A"``, ranges).
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return None if math.isnan(value) else float(value)
+    match = _QUANTITY_RE.match(str(value))
+    if not match:
+        return None
+    return float(match.group(1)) * _SI_PREFIXES[match.group(2)]
+
+
+def normalize_keyword(value: Any) -> Optional[str]:
+    """Case- and whitespace-insensitive form of a categorical value"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    text = " ".join(str(value).casefold().split())
+    return text or None
+
+
+def normalize_part_number(value: Any) -> Optional[str]:
+    """Canonical part number: upper case, whitespace removed"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    text = "".join(str(value).split()).upper()
+    return text or None
+
+
+# Columns whose values are also stored as typed metadata for ``where`` filtering,
+# keyed by normalized column name (lower case, spaces/hyphens as underscores)
+TYPED_COLUMNS = {
+    "voltage_rating_v": ("voltage_v", parse_quantity),
+    "voltage_rating": ("voltage_v", parse_quantity),
+    "voltage": ("voltage_v", parse_quantity),
+    "current_rating_a": ("current_a", parse_quantity),
+    "current_rating": ("current_a", parse_quantity),
+    "current": ("current_a", parse_quantity),
+    "manufacturer": ("manufacturer", normalize_keyword),
+    "category": ("category", normalize_keyword),
+    "part_number": ("part_number", normalize_part_number),
+}
+
+
+TYPED_KEYS = frozenset(key for key, _ in TYPED_COLUMNS.values())
+
+
+def typed_fields(columns: List[Any]) -> List[tuple]:
+    """(column position, metadata key, parser) for each column with a typed counterpart"""
+    fields, seen = [], set()
+    for position, column in enumerate(columns):
+        normalized = re.sub(r"[\s\-]+", "_", str(column).strip().lower())
+        if normalized in TYPED_COLUMNS:
+            key, parser = TYPED_COLUMNS[normalized]
+            if key not in seen:
+                seen.add(key)
+                fields.append((position, key, parser))
+    return fields
+
+
+def dataframe_to_chunks(df: pd.DataFrame, source: str) -> List[Dict[str, Any]]:
+    """
+    Convert each DataFrame row into a chunk ``{"text": ..., "metadata": ...}``.
+
+    Builds all chunks in one columnar pass instead of ``df.iterrows()``: the
+    values are materialized once with ``DataFrame.values`` (the same row values
+    iterrows would yield), so texts and metadata match the per-row version
+    exactly without constructing a Series per row.
+
+    Besides the string copy of every column, recognized columns (see
+    TYPED_COLUMNS) add typed keys - ``voltage_v``/``current_a`` as floats,
+    ``manufacturer``/``category`` normalized, ``part_number`` canonical - that
+    ``where`` filters and the exact part-number lookup use. Missing values are
+    omitted rather than stored.
+    """
+    columns = list(df.columns)
+    meta_keys = ["row_index", "source"] + [str(column) for column in columns]
+    fields = typed_fields(columns)
+
+    chunks = []
+    for idx, values in zip(df.index.tolist(), df.values.tolist()):
+        metadata = dict(zip(meta_keys, [idx, source, *map(str, values)]))
+        for position, key, parser in fields:
+            typed = parser(values[position])
+            if typed is not None:
+                metadata[key] = typed
+        chunks.append({
+            "text": f"Component: {dict(zip(columns, values))}",
+            "metadata": metadata
+        })
+    return chunks
+
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Stable document ID from the source file and the row content.
+    Unchanged rows keep their ID across re-uploads; identical rows in one file share it.
+    """
+    digest = hashlib.blake2b(f"{source}\x00{text}".encode("utf-8"), digest_size=16).hexdigest()
+    return f"doc_{digest}"
+
+
+def _excel_cell(value: Any) -> Any:
+    """An openpyxl cell value as pd.read_excel converts it (integral numbers become ints)"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _rows_to_frame(rows: List[tuple], header: List[str], start: int) -> pd.DataFrame:
+    """Object-dtype block of converted cells; ``_cast_block`` types it like the whole file"""
+    block = pd.DataFrame([[_excel_cell(value) for value in row] for row in rows], columns=header, dtype=object)
+    block.index = pd.RangeIndex(start, start + len(block))
+    # Empty cells arrive as None and NA strings as text; read_excel reports both as NaN
+    block = block.replace(DEFAULT_NA_STRINGS, np.nan)
+    return block.where(block.notna(), np.nan)
+
+
+def _cell_kind(value: Any) -> Any:
+    """What pandas' type inference distinguishes about a cell: its type, and for text whether it is a number"""
+    if isinstance(value, str):
+        try:
+            float(value)
+            return "numeric text"
+        except ValueError:
+            return "text"
+    return type(value)
+
+
+def _column_dtype(exemplars: List[Any], has_missing: bool):
+    """The dtype pd.read_excel's parser gives a column with one cell of each of these kinds"""
+    rows = [["column"]] + [[value] for value in exemplars] + ([[np.nan]] if has_missing else [])
+    return TextParser(rows, header=0).read()["column"].dtype
+
+
+def _excel_dtypes(file_path: str, block_rows: int) -> list:
+    """
+    Per-column dtypes of the whole sheet, from one streaming pass. A block alone
+    can type a float column as int (no fractional value in it) or an int column
+    as float (a blank cell in it), which would change its chunk text.
+    """
+    exemplars, missing = [], []
+    for block in _iter_xlsx_blocks(file_path, block_rows):
+        if not exemplars:
+            exemplars, missing = [{} for _ in block.columns], [False] * block.shape[1]
+        for position in range(block.shape[1]):
+            values = block.iloc[:, position]
+            present = values[values.notna()]
+            missing[position] = missing[position] or len(present) < len(values)
+            kinds = present.map(_cell_kind)
+            for kind, value in zip(kinds[~kinds.duplicated()], present[~kinds.duplicated()]):
+                exemplars[position].setdefault(kind, value)
+    return [_column_dtype(list(kinds.values()), has_missing) for kinds, has_missing in zip(exemplars, missing)]
+
+
+def _cast_block(block: pd.DataFrame, dtypes: list) -> pd.DataFrame:
+    """Give a block of converted cells the whole sheet's column dtypes"""
+    for position, dtype in enumerate(dtypes):
+        values = block.iloc[:, position]
+        if dtype.kind == "M":
+            block.isetitem(position, pd.to_datetime(values).astype(dtype))
+        elif dtype != object:
+            block.isetitem(position, values.astype(dtype))
+    return block
+
+
+_TRUE_STRINGS = ("True", "TRUE", "true")
+_FALSE_STRINGS = ("False", "FALSE", "false")
+
+
+def _parse_number(text: str) -> Any:
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def _type_csv_block(block: pd.DataFrame) -> pd.DataFrame:
+    """
+    Type CSV cells one at a time (number, boolean or text) rather than per
+    column, so a cell's type does not depend on the other rows of its block
+    """
+    for column in block.columns:
+        values = block[column].astype(object)
+        numeric = pd.to_numeric(values, errors="coerce").notna() & values.notna()
+        values[numeric] = [_parse_number(text) for text in values[numeric]]
+        values[values.isin(_TRUE_STRINGS)] = True
+        values[values.isin(_FALSE_STRINGS)] = False
+        block[column] = values
+    return block
+
+
+def _iter_csv_blocks(file_path: str, block_rows: int) -> Iterator[pd.DataFrame]:
+    for block in pd.read_csv(file_path, chunksize=block_rows, dtype=str):
+        yield _type_csv_block(block)
+
+
+def _iter_xlsx_blocks(file_path: str, block_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream the first sheet of an .xlsx file with openpyxl's read-only mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        header = [
+            f"Unnamed: {i}" if name is None else name
+            for i, name in enumerate(header_row)
+        ]
+
+        block, start = [], 0
+        for row in rows:
+            if all(value is None for value in row):
+                continue  # read_excel skips blank rows
+            block.append(row[:len(header)])
+            if len(block) >= block_rows:
+                yield _rows_to_frame(block, header, start)
+                start += len(block)
+                block = []
+        if block:
+            yield _rows_to_frame(block, header, start)
+    finally:
+        workbook.close()
+
+
+def _iter_parquet_blocks(file_path: str, block_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream record batches from a Parquet file (requires pyarrow)"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet ingestion requires pyarrow. Install it with: pip install pyarrow")
+
+    parquet_file = pq.ParquetFile(file_path)
+    # A batch without nulls would keep int and bool columns that are float / object
+    # in batches with nulls; type them by the whole file's null counts instead
+    metadata = parquet_file.metadata
+    nullable = {
+        chunk.path_in_schema
+        for group in range(metadata.num_row_groups)
+        for chunk in map(metadata.row_group(group).column, range(metadata.num_columns))
+        if chunk.statistics is None or not chunk.statistics.has_null_count or chunk.statistics.null_count > 0
+    }
+    start = 0
+    for batch in parquet_file.iter_batches(batch_size=block_rows):
+        block = batch.to_pandas()
+        for position, column in enumerate(block.columns):
+            kind = block.dtypes.iloc[position].kind
+            if str(column) in nullable and kind in "iub":
+                block.isetitem(position, block.iloc[:, position].astype("float64" if kind != "b" else object))
+        block.index = pd.RangeIndex(start, start + len(block))
+        start += len(block)
+        yield block
+
+
+def iter_row_blocks(file_path: str, block_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    """
+    Yield a spreadsheet as DataFrames of at most ``block_rows`` rows.
+
+    Row index labels continue across blocks, so chunk ``row_index`` metadata
+    matches a whole-file read. Blocks carry the whole file's column types, so
+    chunks (and their IDs) do not depend on the block size: .xlsx columns are
+    typed from a first streaming pass over the sheet, Parquet columns from the
+    file's null counts, and CSV cells one by one. Legacy .xls has no streaming
+    reader and is loaded whole, then sliced.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".xlsx":
+        dtypes = _excel_dtypes(file_path, block_rows)
+        for block in _iter_xlsx_blocks(file_path, block_rows):
+            yield _cast_block(block, dtypes)
+    elif extension == ".csv":
+        yield from _iter_csv_blocks(file_path, block_rows)
+    elif extension == ".parquet":
+        yield from _iter_parquet_blocks(file_path, block_rows)
+    elif extension == ".xls":
+        df = pd.read_excel(file_path)
+        for start in range(0, len(df), block_rows):
+            yield df.iloc[start:start + block_rows]
+    else:
+        raise ValueError(
+            f"Unsupported file type {extension!r}. Supported: {', '.join(SUPPORTED_EXTENSIONS)}"
+        )
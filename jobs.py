@@ -0,0 +1,156 @@
+"""
+Background ingestion jobs
+Uploads are queued as jobs and ingested on a bounded worker pool while
+clients poll their progress
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many ingestion jobs are already queued or running"""
+
+
+class IngestJob:
+    """State and progress of one upload being ingested"""
+
+    def __init__(self, filename: str, staged_path: str, target_path: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.staged_path = staged_path
+        self.target_path = target_path
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.rows_parsed = 0
+        self.rows_embedded = 0
+        self.rows_stored = 0
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, rows: int):
+        """Progress callback from RAGPipeline.ingest_file"""
+        with self._lock:
+            if stage == "parsed":
+                self.rows_parsed += rows
+            elif stage == "embedded":
+                self.rows_embedded += rows
+            elif stage == "stored":
+                self.rows_stored += rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_s": round(elapsed, 3),
+                "rows_parsed": self.rows_parsed,
+                "rows_embedded": self.rows_embedded,
+                "rows_stored": self.rows_stored,
+                "rows_per_second": round(self.rows_stored / elapsed, 1) if elapsed > 0 else 0.0,
+                "result": self.result,
+                "error": self.error
+            }
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on ``max_workers`` threads. At most ``max_pending``
+    jobs may be queued or running; the most recent ``history`` finished jobs
+    are kept for status queries. Jobs for the same target file run one at a
+    time so incremental re-ingestion of a file never races with itself.
+    """
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 8, history: int = 100):
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._source_locks = {}
+
+    def _active_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+
+    def submit(self, filename: str, staged_path: str, target_path: str) -> IngestJob:
+        """Queue ingestion of a staged upload; it replaces ``target_path`` when it runs"""
+        with self._lock:
+            if self._active_count() >= self.max_pending:
+                raise JobQueueFullError(
+                    f"Too many ingestion jobs in progress ({self.max_pending}); retry later"
+                )
+            job = IngestJob(filename, staged_path, target_path)
+            self._jobs[job.id] = job
+            self._source_locks.setdefault(target_path, threading.Lock())
+            self._prune()
+        # The job logs under the request ID of the upload that queued it
+        self._executor.submit(contextvars.copy_context().run, self._run, job)
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("completed", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: IngestJob):
+        from rag_pipeline import get_rag_pipeline
+        with self._source_locks[job.target_path]:
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                os.replace(job.staged_path, job.target_path)
+                # Ingestion needs the encoder and the collection, not the LLM
+                rag = get_rag_pipeline(load_generator=False)
+                job.result = rag.ingest_file(job.target_path, progress=job.record)
+                job.status = "completed"
+            except Exception as e:
+                logger.exception("Ingestion job %s failed: %s", job.id, e)
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Global instance
+job_manager = None
+
+def get_job_manager() -> JobManager:
+    """Get or create the ingestion job manager configured in config.py"""
+    global job_manager
+    if job_manager is None:
+        job_manager = JobManager(
+            max_workers=config.INGEST_CONCURRENCY,
+            max_pending=config.INGEST_MAX_PENDING_JOBS,
+            history=config.INGEST_JOB_HISTORY
+        )
+    return job_manager
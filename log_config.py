@@ -0,0 +1,164 @@
+"""
+Structured, queue-based logging
+Callers only format a LogRecord and put it on a bounded in-memory queue; a
+single QueueListener thread writes it to stderr (stdout stays free for the MCP
+stdio transport). Records carry the current request ID, DEBUG records can be
+sampled, and LOG_FORMAT selects JSON lines or plain text.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from typing import Optional
+import config
+from metrics import registry
+
+# Request ID of the work running in this context ("-" outside a request)
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None)).keys()
+) | {"message", "asctime", "request_id"}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_request_id() -> str:
+    return request_id_var.get()
+
+
+def set_request_id(request_id: Optional[str] = None) -> contextvars.Token:
+    """Bind a request ID (a new one if not given) to the current context"""
+    return request_id_var.set(request_id or new_request_id())
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamps ``request_id`` on each record and samples DEBUG records.
+    Runs in the calling thread before the record is queued, so the ID is
+    the caller's and sampled-out debug records cost no formatting or I/O.
+    """
+
+    def __init__(self, debug_sample_rate: float = 1.0):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1.0:
+            if random.random() >= self.debug_sample_rate:
+                return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records instead of blocking when the queue is
+    full, counted as ``rag_log_records_dropped_total``
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = registry.counter(
+            "log_records_dropped_total", "Log records dropped because the log queue was full"
+        )
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request ID, message, extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the request ID and extra fields appended"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        line = super().format(record)
+        extra = {
+            key: value for key, value in record.__dict__.items()
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_")
+        }
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+def setup_logging(force: bool = False):
+    """
+    Route the root logger through a queue to one writer thread.
+    Idempotent; ``force`` rebuilds the handlers (needed in forked worker
+    processes, whose copy of the listener thread is not running).
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            try:
+                _listener.stop()
+            except Exception:
+                pass
+
+        formatter = JsonFormatter() if config.LOG_FORMAT == "json" else TextFormatter()
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(formatter)
+
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+        queue_handler.addFilter(RequestContextFilter(config.LOG_DEBUG_SAMPLE_RATE))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(config.LOG_LEVEL)
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def run_with_request_id(request_id: str, fn, *args):
+    """Run ``fn(*args)`` with ``request_id`` bound (module level so process pools can pickle it)"""
+    token = request_id_var.set(request_id)
+    try:
+        return fn(*args)
+    finally:
+        request_id_var.reset(token)
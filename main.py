@@ -2,22 +2,66 @@
 FastAPI Backend for Semiconductor Component Search
 Demonstrates MCP integration with ChromaDB and RAG
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
 import os
+import uuid
 import shutil
+from time import perf_counter_ns
 from pathlib import Path
-from rag_pipeline import get_rag_pipeline
+from inference_pool import (
+    get_inference_pool,
+    answer_question_task,
+    retrieve_context_task,
+    answer_questions_task,
+    retrieve_contexts_task,
+    embed_texts_task,
+    stream_answer_task,
+    PoolFullError,
+    PoolTimeoutError,
+    PoolUnavailableError
+)
+from rag_pipeline import get_pipeline_stats, ModelNotReadyError
+from ingest import SUPPORTED_EXTENSIONS
+from metrics import STAGE_BUCKETS, registry, stage_stats
+from search_index import build_where, InvalidFilterError
+from jobs import get_job_manager, JobQueueFullError
+from log_config import new_request_id, request_id_var, setup_logging
 import config
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the inference worker pool with the app and drain it on shutdown.
+    Models start loading (encoder and LLM in parallel) right away so the first
+    request does not pay the whole cold start; watch /ready for progress.
+    """
+    pool = get_inference_pool()
+    pool.start()
+    if config.PRELOAD_MODELS:
+        pool.warm_up()
+    yield
+    pool.shutdown(wait=False)
+    get_job_manager().shutdown(wait=False)
+
+
 app = FastAPI(
     title="Semiconductor Component Search API",
     description="RAG-based search using MCP, ChromaDB, and HuggingFace models",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -29,6 +73,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """
+    Tag the request with an ID (the client's X-Request-ID or a new one) that
+    every log record of its pipeline stages carries; echoed in the response
+    """
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and time them per route (streamed responses: until the headers are sent)"""
+    start = perf_counter_ns()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    registry.histogram(
+        "http_request_seconds", STAGE_BUCKETS, "API request latency (seconds)", {"path": path}
+    ).observe((perf_counter_ns() - start) / 1e9)
+    registry.counter(
+        "http_requests_total", "API requests",
+        {"method": request.method, "path": path, "status": str(response.status_code)}
+    ).inc()
+    return response
+
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -41,12 +118,56 @@ static_dir.mkdir(exist_ok=True)
 class QuestionRequest(BaseModel):
     question: str
     n_results: Optional[int] = 5
+    # Metadata filters, e.g. {"manufacturer": "Texas Instruments", "voltage_v": {"min": 5}}
+    where: Optional[Dict[str, Any]] = None
+
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    n_results: Optional[int] = 5
+    mode: Optional[str] = "answer"  # "answer" (full RAG) or "retrieve" (context only)
+    where: Optional[Dict[str, Any]] = None  # Applied to every question
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+    is_query: Optional[bool] = True
 
 
 class QuestionResponse(BaseModel):
     answer: str
     context: list
     query: str
+    usage: Optional[Dict[str, Any]] = None  # Prompt/completion tokens processed for this answer
+
+
+def validate_where(where: Optional[Dict[str, Any]]):
+    """Reject malformed metadata filters with 400 before any work is queued"""
+    try:
+        build_where(where)
+    except InvalidFilterError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid where filter: {e}")
+
+
+async def run_inference(fn, *args, timeout: Optional[float] = None):
+    """
+    Run blocking RAG work on the inference pool.
+    Maps pool backpressure to HTTP: 429 when the queue is full, 503 on timeout
+    """
+    try:
+        return await get_inference_pool().run(fn, *args, timeout=timeout)
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except (PoolTimeoutError, PoolUnavailableError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
+def _save_upload(upload: UploadFile, file_path: Path):
+    """Copy an uploaded file to disk"""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
 
 
 @app.get("/")
@@ -61,10 +182,17 @@ async def root():
             "description": "This API demonstrates MCP (Model Context Protocol) integration with ChromaDB and RAG",
             "ui": "Visit http://localhost:8001/docs for API documentation",
             "endpoints": {
-                "/upload": "POST - Upload Excel document",
+                "/upload": "POST - Upload Excel, CSV or Parquet document",
+                "/jobs/{job_id}": "GET - Ingestion job progress",
                 "/ask": "POST - Ask a question about uploaded documents",
+                "/ask/stream": "POST - Ask a question and stream the answer (NDJSON)",
+                "/ask/batch": "POST - Answer or retrieve context for several questions at once",
                 "/health": "GET - Health check",
-                "/info": "GET - Get collection information"
+                "/ready": "GET - Model readiness and cold start timings",
+                "/retrieve": "POST - Retrieve context for a question (no generation)",
+                "/embed": "POST - Embed texts with the shared encoder",
+                "/info": "GET - Get collection information",
+                "/metrics": "GET - Prometheus metrics (per-stage latency histograms)"
             }
         }
 
@@ -78,10 +206,17 @@ async def api_info():
         "message": "Semiconductor Component Search API",
         "description": "This API demonstrates MCP (Model Context Protocol) integration with ChromaDB and RAG",
         "endpoints": {
-            "/upload": "POST - Upload Excel document",
+            "/upload": "POST - Upload Excel, CSV or Parquet document",
+            "/jobs/{job_id}": "GET - Ingestion job progress",
             "/ask": "POST - Ask a question about uploaded documents",
+            "/ask/stream": "POST - Ask a question and stream the answer (NDJSON)",
+            "/ask/batch": "POST - Answer or retrieve context for several questions at once",
             "/health": "GET - Health check",
-            "/info": "GET - Get collection information"
+            "/ready": "GET - Model readiness and cold start timings",
+            "/retrieve": "POST - Retrieve context for a question (no generation)",
+            "/embed": "POST - Embed texts with the shared encoder",
+            "/info": "GET - Get collection information",
+            "/metrics": "GET - Prometheus metrics (per-stage latency histograms)"
         }
     }
 
@@ -92,43 +227,85 @@ async def health():
     return {"status": "healthy", "service": "semiconductor-search-api"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness check, separate from /health: 200 once both the encoder and the
+    LLM are loaded (or load lazily on the first request), 503 while loading.
+    Includes cold start timings.
+    """
+    readiness = get_inference_pool().readiness()
+    is_ready = all(readiness.get(model) in ("ready", "lazy") for model in ("encoder", "generator"))
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, **readiness}
+    )
+
+
 @app.post("/upload")
 async def upload_excel(file: UploadFile = File(...)):
     """
-    Upload an Excel document and process it for RAG
-    This stores the document in ChromaDB with embeddings
+    Upload an Excel/CSV/Parquet document and queue it for RAG ingestion
+    Returns a job ID right away; poll /jobs/{job_id} for progress.
+    The job streams the document into ChromaDB with embeddings, block by block
     """
-    if not file.filename.endswith(('.xlsx', '.xls')):
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
         raise HTTPException(
             status_code=400,
-            detail="Invalid file type. Please upload an Excel file (.xlsx or .xls)"
+            detail="Invalid file type. Please upload an Excel, CSV or Parquet file (.xlsx, .xls, .csv or .parquet)"
         )
     
     try:
-        # Save uploaded file
-        file_path = UPLOAD_DIR / file.filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Stage the upload under a unique name; the job moves it into place when it runs
+        filename = Path(file.filename).name
+        staged_path = UPLOAD_DIR / f".{uuid.uuid4().hex}_{filename}"
+        await asyncio.to_thread(_save_upload, file, staged_path)
         
-        # Process with RAG pipeline
-        rag = get_rag_pipeline()
-        chunks = rag.process_excel(str(file_path))
-        rag.store_documents(chunks)
+        try:
+            job = get_job_manager().submit(filename, str(staged_path), str(UPLOAD_DIR / filename))
+        except JobQueueFullError as e:
+            staged_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
         
-        return {
-            "message": "File uploaded and processed successfully",
-            "filename": file.filename,
-            "chunks_processed": len(chunks),
-            "status": "ready_for_queries"
-        }
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "File uploaded; ingestion started in the background",
+                "filename": filename,
+                "job_id": job.id,
+                "status_url": f"/jobs/{job.id}",
+                "status": job.status
+            }
+        )
     
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error processing file: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing file: {str(e)}"
         )
 
 
+@app.get("/jobs")
+async def list_jobs():
+    """List recent ingestion jobs, newest first"""
+    return {"jobs": get_job_manager().list_jobs()}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Progress of an ingestion job: status (queued, running, completed, failed),
+    rows parsed/embedded/stored, throughput and any error
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+
 @app.post("/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
     """
@@ -138,23 +315,172 @@ async def ask_question(request: QuestionRequest):
     2. Context is retrieved from ChromaDB (via embeddings)
     3. LLM generates answer based on retrieved context
     """
+    validate_where(request.where)
     try:
-        rag = get_rag_pipeline()
-        result = rag.answer_question(request.question, request.n_results)
+        result = await run_inference(
+            answer_question_task, request.question, request.n_results, request.where
+        )
         
         return QuestionResponse(
             answer=result["answer"],
             context=result["context"],
-            query=result["query"]
+            query=result["query"],
+            usage=result.get("usage")
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error processing question: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing question: {str(e)}"
         )
 
 
+@app.post("/ask/batch")
+async def ask_questions_batch(request: BatchQuestionRequest):
+    """
+    Batch RAG: all questions are embedded in one encoder pass and retrieved
+    with one multi-query ChromaDB lookup; in "answer" mode the answers are
+    generated in padded batches. Results are returned in request order.
+    """
+    if request.mode not in ("answer", "retrieve"):
+        raise HTTPException(status_code=400, detail="mode must be 'answer' or 'retrieve'")
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(request.questions) > config.MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.MAX_BATCH_QUESTIONS} questions per batch"
+        )
+    validate_where(request.where)
+    
+    try:
+        if request.mode == "retrieve":
+            contexts = await run_inference(
+                retrieve_contexts_task, request.questions, request.n_results, request.where
+            )
+            results = [
+                {"context": context, "query": question}
+                for question, context in zip(request.questions, contexts)
+            ]
+        else:
+            # Generation runs GENERATION_MAX_BATCH_SIZE prompts per model call
+            generation_rounds = -(-len(request.questions) // max(1, config.GENERATION_MAX_BATCH_SIZE))
+            results = await run_inference(
+                answer_questions_task, request.questions, request.n_results, request.where,
+                timeout=config.INFERENCE_TIMEOUT_S * generation_rounds
+            )
+        return {"mode": request.mode, "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error processing batch: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing batch: {str(e)}"
+        )
+
+
+@app.post("/retrieve")
+async def retrieve(request: QuestionRequest):
+    """
+    Retrieval only: return the context chunks for a question without LLM generation.
+    Served as soon as the encoder is loaded, even while the LLM is still loading.
+    """
+    validate_where(request.where)
+    try:
+        context = await run_inference(
+            retrieve_context_task, request.question, request.n_results, request.where
+        )
+        return {"context": context, "query": request.question}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error retrieving context: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving context: {str(e)}"
+        )
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    """
+    Shared embedding service: embed texts with the API's encoder
+    (config.HF_EMBEDDING_MODEL). The MCP server calls this when
+    EMBEDDING_SERVICE_URL is set so both processes use one model.
+    """
+    try:
+        embeddings = await run_inference(embed_texts_task, request.texts, request.is_query)
+        return {"model": config.HF_EMBEDDING_MODEL, "embeddings": embeddings}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error embedding texts: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error embedding texts: {str(e)}"
+        )
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Ask a question and stream the answer as NDJSON events:
+    {"type": "context", ...} as soon as retrieval finishes, then one
+    {"type": "token", "text": ...} per generated piece, then {"type": "done", ...}.
+    The whole stream runs on one inference pool worker, so streams and /ask
+    share the INFERENCE_WORKERS limit. Needs INFERENCE_EXECUTOR=thread.
+    """
+    validate_where(request.where)
+    pool = get_inference_pool()
+    if pool.kind != "thread":
+        raise HTTPException(
+            status_code=501,
+            detail="Streaming is not available with INFERENCE_EXECUTOR=process; use /ask"
+        )
+    events = pool.stream(stream_answer_task, request.question, request.n_results, request.where)
+    try:
+        # The first event (the context) arrives once retrieval is done; errors until then get a status code
+        first = await events.__anext__()
+    except PoolFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except (PoolTimeoutError, PoolUnavailableError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.exception("Error processing question: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing question: {str(e)}"
+        )
+    
+    async def ndjson():
+        try:
+            yield json.dumps(first) + "\n"
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.exception("Error generating streamed answer: %s", e)
+            yield json.dumps({"type": "error", "detail": f"Error generating answer: {str(e)}"}) + "\n"
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage timing histograms (rag_stage_seconds),
+    request latency and counts, batching and token histograms
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/info")
 async def get_info():
     """Get information about the ChromaDB collection"""
@@ -165,7 +491,11 @@ async def get_info():
         return {
             "collection_name": config.CHROMA_COLLECTION_NAME,
             "document_count": count,
-            "status": "active"
+            "status": "active",
+            "inference_pool": get_inference_pool().stats(),
+            # Includes stages timed in process-pool workers (merged after each task)
+            "stage_seconds": stage_stats(),
+            **get_pipeline_stats()
         }
     except Exception as e:
         return {"error": str(e)}
@@ -3,7 +3,13 @@ MCP Server for ChromaDB Integration
 This demonstrates how MCP works as a protocol for context retrieval
 """
 import asyncio
-from typing import List, Optional
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter_ns
+from typing import Any, Dict, List, Optional
 import chromadb
 from chromadb.config import Settings
 from mcp.server import Server
@@ -11,6 +17,20 @@ from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 import config
+from embedding_service import QueryEmbedder
+from log_config import request_id_var, new_request_id, setup_logging
+from metrics import STAGE_BUCKETS, registry, stage_timer
+from search_index import BM25Index, build_where, exact_part_matches, get_collection_version, hybrid_merge
+from vector_store import create_vector_store
+
+# Log records go to stderr through a background writer; stdout is the MCP transport
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Embed queries with the same model as the stored vectors (via the API's /embed
+# endpoint when EMBEDDING_SERVICE_URL is set, otherwise a local encoder) rather
+# than ChromaDB's default embedder
+query_embedder = QueryEmbedder(config.EMBEDDING_SERVICE_URL)
 
 # Initialize ChromaDB client
 chroma_client = chromadb.PersistentClient(
@@ -18,6 +38,17 @@ chroma_client = chromadb.PersistentClient(
     settings=Settings(anonymized_telemetry=False)
 )
 
+# Vector store over the collection (config.VECTOR_STORE) - resolved on first use,
+# then shared by all tool calls
+collection = None
+_collection_lock = threading.Lock()
+
+# BM25 keyword index, rebuilt from ChromaDB whenever the collection version changes
+keyword_index = BM25Index()
+
+# Blocking ChromaDB and encoder work runs here so concurrent tool calls overlap
+tool_executor = ThreadPoolExecutor(max_workers=config.MCP_WORKERS, thread_name_prefix="mcp-tool")
+
 # Initialize MCP Server
 app = Server("chromadb-mcp-server")
 
@@ -40,11 +71,39 @@ async def list_tools() -> List[Tool]:
                         "type": "integer",
                         "description": "Number of results to return",
                         "default": 5
+                    },
+                    "where": {
+                        "type": "object",
+                        "description": "Optional metadata filters: manufacturer, category, part_number or any column (exact match or list of values), voltage_v / current_a ranges such as {\"min\": 5, \"max\": 40}"
                     }
                 },
                 "required": ["query"]
             }
         ),
+        Tool(
+            name="query_semiconductor_data_batch",
+            description="Run several semantic queries against the semiconductor component data in one call. All queries are embedded together and sent to ChromaDB as a single multi-query request.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The semantic queries to search for in the database"
+                    },
+                    "n_results": {
+                        "type": "integer",
+                        "description": "Number of results to return per query",
+                        "default": 5
+                    },
+                    "where": {
+                        "type": "object",
+                        "description": "Optional metadata filters: manufacturer, category, part_number or any column (exact match or list of values), voltage_v / current_a ranges such as {\"min\": 5, \"max\": 40}"
+                    }
+                },
+                "required": ["queries"]
+            }
+        ),
         Tool(
             name="get_collection_info",
             description="Get information about the ChromaDB collection",
@@ -53,64 +112,232 @@ async def list_tools() -> List[Tool]:
                 "properties": {},
                 "required": []
             }
+        ),
+        Tool(
+            name="get_metrics",
+            description="Prometheus-format metrics of this MCP server: per-stage latency histograms and tool call counts",
+            inputSchema={
+                "type": "object",
+                "properties": {},
+                "required": []
+            }
         )
     ]
 
 
+def get_collection():
+    """Resolve the collection's vector store once and reuse it for every tool call"""
+    global collection
+    if collection is None:
+        with _collection_lock:
+            if collection is None:
+                collection = create_vector_store(chroma_client.get_or_create_collection(
+                    name=config.CHROMA_COLLECTION_NAME,
+                    metadata={"hnsw:space": "cosine"}
+                ))
+    return collection
+
+
+def _query_collection(queries: List[str], n_results: int, where: Optional[Dict[str, Any]]) -> dict:
+    """
+    Embed all queries in one pass and run them as one multi-query ChromaDB request.
+    There is no fallback to ChromaDB's default embedder: its vectors would not
+    match the stored ones, so an encoder failure is reported to the caller.
+    """
+    collection = get_collection()
+    
+    # Query ChromaDB with embeddings from the shared encoder
+    try:
+        with stage_timer("embed_query"):
+            query_embeddings = query_embedder.embed_queries(queries)
+    except Exception as e:
+        logger.warning("Query embedding failed: %s", e)
+        raise RuntimeError(f"Query embedding failed: {e}") from e
+    with stage_timer("vector_query"):
+        return collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
+        )
+
+
+def _format_results(documents: list, metadatas: Optional[list]) -> str:
+    """Format one query's hits as tool output"""
+    formatted_results = []
+    for i, doc in enumerate(documents or []):
+        metadata = metadatas[i] if metadatas else {}
+        formatted_results.append(
+            f"Document {i+1}:\n{doc}\nMetadata: {metadata}\n"
+        )
+    if formatted_results:
+        return "\n---\n".join(formatted_results)
+    return "No results found for the query."
+
+
+def query_semiconductor_data(query: str, n_results: int, where: Optional[Dict[str, Any]] = None) -> str:
+    """Blocking part of query_semiconductor_data: embed, query ChromaDB, format"""
+    return query_semiconductor_data_batch([query], n_results, where)[0]
+
+
+def query_semiconductor_data_batch(queries: List[str], n_results: int,
+                                   where: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Blocking part of query_semiconductor_data_batch: one formatted result per query.
+    Exact part-number matches come from the metadata index; the rest go through
+    one filtered vector search fused with BM25 keyword hits.
+    """
+    if not queries:
+        return []
+    where_clause = build_where(where)
+    # The in-memory store reloads when the API has changed the collection
+    with stage_timer("vector_store_sync"):
+        get_collection().sync(get_collection_version())
+    hits = {}
+    if config.PART_NUMBER_FAST_PATH:
+        with stage_timer("part_lookup"):
+            hits = exact_part_matches(get_collection(), queries, n_results, where_clause)
+    
+    remaining = [i for i in range(len(queries)) if i not in hits]
+    if remaining:
+        remaining_queries = [queries[i] for i in remaining]
+        if config.HYBRID_SEARCH:
+            candidates = max(n_results, config.HYBRID_CANDIDATES)
+            results = _query_collection(remaining_queries, candidates, where_clause)
+            with stage_timer("keyword_search"):
+                keyword_index.sync(get_collection(), get_collection_version())
+                keyword_rankings = [
+                    [doc_id for doc_id, _ in keyword_index.search(query, candidates)]
+                    for query in remaining_queries
+                ]
+            with stage_timer("fusion"):
+                merged = hybrid_merge(get_collection(), results, keyword_rankings, n_results, where_clause, config.RRF_K)
+            for i, merged_hits in zip(remaining, merged):
+                hits[i] = merged_hits
+        else:
+            results = _query_collection(remaining_queries, n_results, where_clause)
+            documents = results['documents'] or []
+            metadatas = results['metadatas'] or []
+            for position, i in enumerate(remaining):
+                hits[i] = {
+                    "documents": documents[position] if position < len(documents) else [],
+                    "metadatas": metadatas[position] if position < len(metadatas) else None
+                }
+    
+    return [_format_results(hits[i]["documents"], hits[i]["metadatas"]) for i in range(len(queries))]
+
+
+def get_collection_info() -> str:
+    """Blocking part of get_collection_info"""
+    count = get_collection().count()
+    return f"Collection '{config.CHROMA_COLLECTION_NAME}' contains {count} documents."
+
+
+async def run_blocking(fn, *args):
+    """Run blocking ChromaDB/encoder work on the tool executor so tool calls overlap"""
+    loop = asyncio.get_running_loop()
+    # In a copy of the caller's context so the work logs under the tool call's request ID
+    return await loop.run_in_executor(tool_executor, contextvars.copy_context().run, fn, *args)
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-    """Handle tool calls from MCP clients"""
+    """Handle tool calls from MCP clients, counting and timing them per tool"""
+    start = perf_counter_ns()
+    token = request_id_var.set(new_request_id())
+    try:
+        content = await _call_tool(name, arguments)
+    finally:
+        request_id_var.reset(token)
+    failed = bool(content) and content[0].text.startswith(("Error", "Unknown tool"))
+    registry.histogram(
+        "mcp_tool_seconds", STAGE_BUCKETS, "MCP tool call latency (seconds)", {"tool": name}
+    ).observe((perf_counter_ns() - start) / 1e9)
+    registry.counter(
+        "mcp_tool_calls_total", "MCP tool calls", {"tool": name, "status": "error" if failed else "ok"}
+    ).inc()
+    return content
+
+
+async def _call_tool(name: str, arguments: dict) -> List[TextContent]:
     if name == "query_semiconductor_data":
         query = arguments.get("query", "")
         n_results = arguments.get("n_results", 5)
+        where = arguments.get("where")
         
         try:
-            collection = chroma_client.get_or_create_collection(
-                name=config.CHROMA_COLLECTION_NAME
-            )
-            
-            # Query ChromaDB
-            results = collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
-            
-            # Format results
-            formatted_results = []
-            if results['documents'] and len(results['documents'][0]) > 0:
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {}
-                    formatted_results.append(
-                        f"Document {i+1}:\n{doc}\nMetadata: {metadata}\n"
-                    )
-                response = "\n---\n".join(formatted_results)
-            else:
-                response = "No results found for the query."
-            
+            response = await run_blocking(query_semiconductor_data, query, n_results, where)
             return [TextContent(type="text", text=response)]
         
         except Exception as e:
+            logger.exception("Error querying ChromaDB: %s", e)
+            return [TextContent(type="text", text=f"Error querying ChromaDB: {str(e)}")]
+    
+    elif name == "query_semiconductor_data_batch":
+        queries = arguments.get("queries", [])
+        n_results = arguments.get("n_results", 5)
+        where = arguments.get("where")
+        
+        try:
+            responses = await run_blocking(query_semiconductor_data_batch, queries, n_results, where)
+            sections = [
+                f"Query {i+1}: {query}\n\n{response}"
+                for i, (query, response) in enumerate(zip(queries, responses))
+            ]
+            return [TextContent(type="text", text="\n\n===\n\n".join(sections) or "No queries given.")]
+        
+        except Exception as e:
+            logger.exception("Error querying ChromaDB: %s", e)
             return [TextContent(type="text", text=f"Error querying ChromaDB: {str(e)}")]
     
     elif name == "get_collection_info":
         try:
-            collection = chroma_client.get_or_create_collection(
-                name=config.CHROMA_COLLECTION_NAME
-            )
-            count = collection.count()
-            return [TextContent(
-                type="text",
-                text=f"Collection '{config.CHROMA_COLLECTION_NAME}' contains {count} documents."
-            )]
+            response = await run_blocking(get_collection_info)
+            return [TextContent(type="text", text=response)]
         except Exception as e:
+            logger.exception("Error getting collection info: %s", e)
             return [TextContent(type="text", text=f"Error getting collection info: {str(e)}")]
     
+    elif name == "get_metrics":
+        return [TextContent(type="text", text=registry.render())]
+    
     else:
         return [TextContent(type="text", text=f"Unknown tool: {name}")]
 
 
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics for Prometheus scrapes of the MCP server (stdout stays the MCP transport)"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics on a daemon thread"""
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="mcp-metrics", daemon=True).start()
+    logger.info("MCP metrics at http://0.0.0.0:%d/metrics", port)
+    return server
+
+
 async def main():
     """Run the MCP server"""
+    if config.MCP_METRICS_PORT:
+        try:
+            start_metrics_server(config.MCP_METRICS_PORT)
+        except OSError as e:
+            # Another session's server process already holds the port
+            logger.warning("Metrics port %d unavailable: %s", config.MCP_METRICS_PORT, e)
     async with stdio_server() as (read_stream, write_stream):
         await app.run(
             read_stream,
@@ -0,0 +1,243 @@
+"""
+Lightweight in-process metrics
+Thread-safe histograms and counters used to tune batching and caching, plus
+per-stage timing spans, exported in the Prometheus text format by GET /metrics
+(API) and the get_metrics tool / MCP_METRICS_PORT (MCP server)
+"""
+import bisect
+import threading
+from time import perf_counter_ns
+from typing import Dict, Any, Optional, Sequence
+
+
+class Histogram:
+    """Fixed-bucket histogram (bucket bounds are inclusive upper limits)"""
+
+    def __init__(self, name: str, buckets: Sequence[float], description: str = "",
+                 labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._exported = ([0] * len(self._counts), 0.0, 0)  # State at the last collect_delta
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> "Timer":
+        """Context manager observing its elapsed seconds"""
+        return Timer(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counts per bucket (non-cumulative), total count, sum and mean"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        labels = [f"le_{b:g}" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else 0.0,
+            "buckets": dict(zip(labels, counts))
+        }
+
+    def _state(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def _add(self, counts: Sequence[int], total: float, count: int):
+        with self._lock:
+            for index, bucket_count in enumerate(counts):
+                self._counts[index] += bucket_count
+            self._sum += total
+            self._count += count
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._exported = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Timer:
+    """
+    Timing span: ``with timer:`` observes the elapsed seconds into a histogram
+    and keeps them in ``elapsed``. A span costs two perf_counter_ns calls and
+    one histogram observe, 1-2 microseconds.
+    """
+
+    __slots__ = ("histogram", "elapsed", "_start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "Timer":
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = (perf_counter_ns() - self._start) / 1e9
+        self.histogram.observe(self.elapsed)
+        return False
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text exposition format.
+    ``histogram`` and ``counter`` return the existing metric for a repeated
+    (name, labels) pair, so re-created components keep adding to the same series.
+    """
+
+    def __init__(self, namespace: str = "rag"):
+        self.namespace = namespace
+        self._metrics: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, labels: Optional[Dict[str, str]], **kwargs):
+        key = (cls.__name__, name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, labels=labels, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def histogram(self, name: str, buckets: Sequence[float], description: str = "",
+                  labels: Optional[Dict[str, str]] = None) -> Histogram:
+        return self._get_or_create(Histogram, name, labels, buckets=buckets, description=description)
+
+    def counter(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get_or_create(Counter, name, labels, description=description)
+
+    def collect_delta(self) -> list:
+        """
+        Changes since the previous call, as picklable tuples. Process-pool
+        workers return them with each task result and the parent process adds
+        them to its own registry (``merge``), so its /metrics covers the work
+        done in the workers.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        delta = []
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                counts, total, count = metric._state()
+                last_counts, last_total, last_count = metric._exported
+                if count != last_count:
+                    delta.append((
+                        "histogram", metric.name, metric.labels, metric.description, metric.buckets,
+                        [now - before for now, before in zip(counts, last_counts)],
+                        total - last_total, count - last_count
+                    ))
+                metric._exported = (counts, total, count)
+            else:
+                value = metric.value
+                if value != metric._exported:
+                    delta.append(("counter", metric.name, metric.labels, metric.description, value - metric._exported))
+                metric._exported = value
+        return delta
+
+    def merge(self, delta: list):
+        """Add changes from another process's ``collect_delta``"""
+        for entry in delta:
+            if entry[0] == "histogram":
+                _, name, labels, description, buckets, counts, total, count = entry
+                self.histogram(name, buckets, description, labels)._add(counts, total, count)
+            else:
+                _, name, labels, description, amount = entry
+                self.counter(name, description, labels).inc(amount)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families: Dict[str, list] = {}
+        for metric in metrics:
+            families.setdefault(f"{self.namespace}_{metric.name}", []).append(metric)
+
+        lines = []
+        for name in sorted(families):
+            series = families[name]
+            kind = "histogram" if isinstance(series[0], Histogram) else "counter"
+            if series[0].description:
+                lines.append(f"# HELP {name} {series[0].description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in series:
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(metric.labels)} {metric.value:g}")
+                    continue
+                counts, total, count = metric._state()
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric.buckets) + [float("inf")], counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_format_labels({**metric.labels, 'le': le})} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(metric.labels)} {total:g}")
+                lines.append(f"{name}_count{_format_labels(metric.labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry exported by /metrics
+registry = MetricsRegistry()
+
+# Seconds; spans range from cache lookups to multi-second generations
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_stage_histograms: Dict[str, Histogram] = {}
+
+
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every ``rag_stage_seconds`` series by stage (including stages merged from workers)"""
+    with registry._lock:
+        metrics = list(registry._metrics.values())
+    return {
+        metric.labels["stage"]: metric.snapshot()
+        for metric in metrics if isinstance(metric, Histogram) and metric.name == "stage_seconds"
+    }
+
+
+def stage_timer(stage: str) -> Timer:
+    """Timing span for one pipeline stage, exported as ``rag_stage_seconds{stage=...}``"""
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = registry.histogram(
+            "stage_seconds", STAGE_BUCKETS, "Time spent per pipeline stage (seconds)", {"stage": stage}
+        )
+        _stage_histograms[stage] = histogram
+    return Timer(histogram)
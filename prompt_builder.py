@@ -0,0 +1,153 @@
+"""
+Token-budgeted prompts for the RAG pipeline
+Fits the most relevant fields of the retrieved components into the model's
+context window, measured with the model's own tokenizer, and keeps room for
+the answer
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ingest import TYPED_KEYS, typed_fields
+from search_index import tokenize
+
+PROMPT_HEADER = "Based on the following context about semiconductor components, answer the question.\n\nContext:\n"
+PROMPT_FOOTER = "\n\nQuestion: {query}\n\nAnswer:"
+
+# Bookkeeping metadata that says nothing about the component
+HIDDEN_FIELDS = frozenset({"row_index", "source"})
+
+# Cell values that carry no information
+EMPTY_VALUES = frozenset({"", "nan", "none", "null", "n/a", "na", "<na>", "nat", "-"})
+
+# Fields that identify a component, kept ahead of other non-matching fields
+IDENTITY_HINTS = ("name", "part", "manufacturer")
+
+
+def _visible_fields(metadata: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(name, value) pairs worth showing: no bookkeeping, no typed duplicates, no empty cells"""
+    columns = [key for key in metadata if key not in HIDDEN_FIELDS and key not in TYPED_KEYS]
+    # Typed keys duplicate the column they were parsed from
+    duplicated = {key for _, key, _ in typed_fields(columns)}
+    fields = []
+    for key, value in metadata.items():
+        if key in HIDDEN_FIELDS or key in duplicated:
+            continue
+        text = " ".join(str(value).split())
+        if text.casefold() in EMPTY_VALUES:
+            continue
+        fields.append((str(key), text))
+    return fields
+
+
+class PromptBuilder:
+    """
+    Builds prompts that fit ``context_window - max_new_tokens`` tokens.
+
+    Each retrieved component is rendered as compact ``field: value`` pairs
+    instead of its raw dict text. Empty cells, bookkeeping and typed duplicate
+    fields are dropped, identical components are shown once, and fields with
+    the same value in every component are stated once up front. Fields that
+    mention query terms come first, then identifying fields, so when the
+    budget runs out the least relevant fields of the lowest-ranked components
+    are the ones left out.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], context_window: int, max_new_tokens: int):
+        # Field strings repeat across components and queries, so piece counts are memoized
+        self.count_tokens = lru_cache(maxsize=65536)(count_tokens)
+        self._count_prompt = count_tokens
+        self.context_window = context_window
+        self.max_new_tokens = max_new_tokens
+        self.prompt_budget = max(0, context_window - max_new_tokens)
+
+    @classmethod
+    def for_tokenizer(cls, tokenizer, context_window: int, max_new_tokens: int) -> "PromptBuilder":
+        """Builder measuring text with a Hugging Face tokenizer (window capped at the model's limit)"""
+        model_limit = getattr(tokenizer, "model_max_length", None)
+        if isinstance(model_limit, int) and 0 < model_limit < context_window:
+            context_window = model_limit
+        return cls(
+            lambda text: len(tokenizer.encode(text, add_special_tokens=False)),
+            context_window,
+            max_new_tokens
+        )
+
+    def _records(self, query: str, documents: List[str],
+                 metadatas: Optional[List[Dict[str, Any]]]) -> List[List[Tuple[str, str]]]:
+        """Prioritized fields per distinct component (raw text when there is no metadata)"""
+        query_terms = set(tokenize(query))
+        records, seen = [], set()
+        for i, document in enumerate(documents):
+            metadata = metadatas[i] if metadatas and i < len(metadatas) and metadatas[i] else None
+            fields = _visible_fields(metadata) if metadata else [("", " ".join(document.split()))]
+            key = tuple(fields)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            def priority(field):
+                name, value = field
+                if query_terms & set(tokenize(f"{name.replace('_', ' ')} {value}")):
+                    return 0
+                if any(hint in name.casefold() for hint in IDENTITY_HINTS):
+                    return 1
+                return 2
+
+            records.append(sorted(fields, key=priority))
+        return records
+
+    @staticmethod
+    def _render(field: Tuple[str, str]) -> str:
+        name, value = field
+        return f"{name}: {value}" if name else value
+
+    def _fit(self, pieces: List[str], prefix: str, available: int) -> Tuple[str, int]:
+        """Longest run of ``pieces`` that fits ``available`` tokens after ``prefix``"""
+        cost = self.count_tokens(prefix)
+        kept = []
+        for piece in pieces:
+            piece_cost = self.count_tokens(piece) + 1  # "; " separator
+            if cost + piece_cost > available:
+                break
+            kept.append(piece)
+            cost += piece_cost
+        if not kept:
+            return "", 0
+        return prefix + "; ".join(kept), cost
+
+    def build(self, query: str, documents: List[str],
+              metadatas: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, int]:
+        """Return the prompt and its length in tokens"""
+        footer = PROMPT_FOOTER.format(query=query)
+        records = self._records(query, documents, metadatas)
+
+        shared = []
+        if len(records) > 1:
+            common = set(records[0]).intersection(*records[1:])
+            shared = [field for field in records[0] if field in common and field[0]]
+            records = [[field for field in record if field not in common] for record in records]
+
+        budget = self.prompt_budget - self.count_tokens(PROMPT_HEADER) - self._count_prompt(footer)
+        while True:
+            blocks, used = [], 0
+            if shared:
+                block, cost = self._fit([self._render(f) for f in shared], "All components: ", budget)
+                if block:
+                    blocks.append(block)
+                    used += cost + 1
+            for i, record in enumerate(records):
+                if not record:
+                    continue  # Everything it says is in the shared line
+                block, cost = self._fit(
+                    [self._render(f) for f in record], f"Context {i+1}: ", budget - used
+                )
+                if not block:
+                    break
+                blocks.append(block)
+                used += cost + 1  # blank line between blocks
+
+            prompt = PROMPT_HEADER + "\n\n".join(blocks) + footer
+            tokens = self._count_prompt(prompt)
+            # Piecewise counts can differ slightly from the joint count; tighten and retry
+            if tokens <= self.prompt_budget or budget <= 0:
+                return prompt, tokens
+            budget -= tokens - self.prompt_budget
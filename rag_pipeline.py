@@ -2,10 +2,32 @@
 RAG Pipeline for Semiconductor Component Search
 Handles embedding generation and LLM inference
 """
-import os
-from typing import List, Dict, Any
+import contextvars
+import json
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import config
+from batching import MicroBatcher
+from generators import TRANSFORMERS_AVAILABLE, create_backend
+from metrics import registry, stage_timer
+from prompt_builder import PromptBuilder
+from reranker import CrossEncoderReranker
+from cache import TTLCache, normalize_query
+from embedding_service import get_embedding_service, SENTENCE_TRANSFORMERS_AVAILABLE
+from ingest import TYPED_KEYS, chunk_id, dataframe_to_chunks, iter_row_blocks
+from search_index import (
+    BM25Index,
+    build_where,
+    bump_collection_version,
+    exact_part_matches,
+    get_collection_version,
+    hybrid_merge
+)
+from vector_store import create_vector_store
 
 # Import dependencies with error handling
 try:
@@ -13,39 +35,25 @@ try:
     from chromadb.config import Settings
     CHROMADB_AVAILABLE = True
 except Exception as e:
-    print(f"Warning: ChromaDB import failed: {e}")
+    logging.getLogger(__name__).warning("ChromaDB import failed: %s", e)
     CHROMADB_AVAILABLE = False
     
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except Exception as e:
-    print(f"Warning: sentence-transformers import failed: {e}")
-    print("This might be due to DLL issues on Windows. Try installing Visual C++ Redistributables.")
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
-    
-try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+if TRANSFORMERS_AVAILABLE:
+    from transformers import TextIteratorStreamer
     import torch
-    TRANSFORMERS_AVAILABLE = True
-except Exception as e:
-    print(f"Warning: transformers import failed: {e}")
-    TRANSFORMERS_AVAILABLE = False
 
-from huggingface_hub import login
+logger = logging.getLogger(__name__)
 
-# Authenticate with Hugging Face
-try:
-    login(token=config.HF_API_KEY)
-except Exception as e:
-    print(f"Warning: HuggingFace login failed: {e}")
+# No Hugging Face login at import time - model downloads pass the token explicitly,
+# so importing this module never touches the network
 
 # Initialize ChromaDB - Lazy loading to avoid onnxruntime issues
 chroma_client = None
+# Vector store over the ChromaDB collection (config.VECTOR_STORE, see vector_store.py)
 collection = None
 
 def _init_chromadb():
-    """Initialize ChromaDB client and collection"""
+    """Initialize ChromaDB client and the vector store over its collection"""
     global chroma_client, collection
     if not CHROMADB_AVAILABLE:
         raise ImportError("ChromaDB is not available. Please check your installation.")
@@ -57,246 +65,684 @@ def _init_chromadb():
                 settings=Settings(anonymized_telemetry=False, allow_reset=True)
             )
             # Create collection - we'll provide our own embeddings
-            collection = chroma_client.get_or_create_collection(
+            collection = create_vector_store(chroma_client.get_or_create_collection(
                 name=config.CHROMA_COLLECTION_NAME,
                 metadata={"hnsw:space": "cosine"}
-            )
+            ))
         except Exception as e:
-            print(f"Error initializing ChromaDB: {e}")
+            logger.exception("Error initializing ChromaDB: %s", e)
             raise
     return chroma_client, collection
 
 
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the database. Please upload a document first."
+
+# Token usage reported for answers served from the answer cache
+CACHED_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "cached": True}
+
+# Metadata fields whose filter columns are saved in embedding snapshots
+SNAPSHOT_FILTER_FIELDS = ("source",) + tuple(sorted(TYPED_KEYS))
+
+
+class ModelNotReadyError(Exception):
+    """Raised when a request needs a model that is still loading"""
+
+
 class RAGPipeline:
     """RAG Pipeline for document processing and question answering"""
     
-    def __init__(self):
+    def __init__(self, background: bool = False, load_generator: bool = True):
+        """
+        Load the encoder and the generator concurrently on two threads.
+        With ``background=True`` the constructor returns immediately; methods
+        wait (up to MODEL_LOAD_WAIT_S) for the model they need, so retrieval
+        works as soon as the encoder is ready even while the LLM still loads.
+        With ``load_generator=False`` only the encoder loads (ingestion);
+        ``start_generator`` loads the LLM later.
+        """
+        self.created_at = time.monotonic()
+        self.embeddings = get_embedding_service()  # Shared with /embed and the MCP server
         self.encoder = None
         self.use_embeddings = False
+        # Generator backend (see generators.py); None = context-only answers
+        self.backend = None
+        self.batcher = None
+        self.encoder_ready = threading.Event()
+        self.generator_ready = threading.Event()
+        self.load_timings = {"encoder_ready_s": None, "generator_ready_s": None, "first_answer_s": None}
+        # Single writer thread so ChromaDB writes overlap with encoding of the next batch
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer")
+        self.answer_cache = TTLCache(
+            maxsize=config.ANSWER_CACHE_SIZE,
+            ttl=config.ANSWER_CACHE_TTL_S,
+            max_bytes=int(config.ANSWER_CACHE_MAX_MB * 1024 * 1024)
+        )
+        # BM25 over chunk texts; built from ChromaDB on first use, then kept current by
+        # store_documents and rebuilt when another process changes the collection
+        self.keyword_index = BM25Index()
+        # Optional second stage: re-rank over-fetched candidates with a cross-encoder
+        self.reranker = CrossEncoderReranker() if config.RERANK_ENABLED else None
+        # Token-budgeted prompts; created once the generator's tokenizer is loaded
+        self.prompt_builder = None
+        self.prompt_tokens_hist = registry.histogram(
+            "prompt_tokens",
+            buckets=[64, 128, 256, 384, 512, 768, 1024, 2048, 4096],
+            description="Prompt tokens per generated answer"
+        )
+        self.completion_tokens_hist = registry.histogram(
+            "completion_tokens",
+            buckets=[8, 16, 32, 64, 128, 256, 512],
+            description="Generated tokens per answer"
+        )
         
-        if SENTENCE_TRANSFORMERS_AVAILABLE:
-            try:
-                print("Loading embedding model...")
-                # Encoding model - for creating embeddings
-                self.encoder = SentenceTransformer(config.HF_EMBEDDING_MODEL)
-                print(f"Loaded encoder: {config.HF_EMBEDDING_MODEL}")
+        self._generator_loader = None
+        self._generator_loader_lock = threading.Lock()
+        
+        encoder_loader = threading.Thread(target=self._load_encoder, name="load-encoder", daemon=True)
+        encoder_loader.start()
+        if load_generator:
+            self.start_generator()
+        if not background:
+            encoder_loader.join()
+            if self._generator_loader is not None:
+                self._generator_loader.join()
+    
+    def start_generator(self):
+        """Start loading the generator on its own thread (once)"""
+        with self._generator_loader_lock:
+            if self._generator_loader is None:
+                self._generator_loader = threading.Thread(
+                    target=self._load_generator, name="load-generator", daemon=True
+                )
+                self._generator_loader.start()
+    
+    def _elapsed(self) -> float:
+        return round(time.monotonic() - self.created_at, 3)
+    
+    def _load_encoder(self):
+        """Load the embedding model (falls back to text search if it fails)"""
+        try:
+            # Encoding model - for creating embeddings
+            if self.embeddings.load():
+                self.encoder = self.embeddings.encoder
                 self.use_embeddings = True
-            except Exception as e:
-                print(f"Warning: Could not load embedding model: {e}")
-                print("Will use text-based search instead")
+                if self.reranker is not None:
+                    self.reranker.load()
+            else:
+                if not SENTENCE_TRANSFORMERS_AVAILABLE:
+                    logger.warning("This might be due to DLL issues on Windows. Try installing Visual C++ Redistributables.")
+                logger.warning("Will use text-based search instead")
                 self.use_embeddings = False
-        else:
-            print("Warning: sentence-transformers not available. Using text-based search.")
-            self.use_embeddings = False
-        
-        print("Loading LLM model...")
-        # Decoding model - for generating answers
-        # Try Llama first, then fallback to GPT-2
-        self.use_pipeline = None
-        self.generator = None
-        self.tokenizer = None
-        self.llm = None
-        
-        if TRANSFORMERS_AVAILABLE:
-            # Try to load Llama model
-            llama_model = "meta-llama/Llama-2-7b-chat-hf"
-            try:
-                print(f"Attempting to load {llama_model}...")
-                self.tokenizer = AutoTokenizer.from_pretrained(
-                    llama_model,
-                    token=config.HF_API_KEY,
-                    trust_remote_code=True
+        finally:
+            self.load_timings["encoder_ready_s"] = self._elapsed()
+            self.encoder_ready.set()
+            logger.info("Encoder ready after %ss", self.load_timings["encoder_ready_s"])
+    
+    def _load_generator(self):
+        """Load the GENERATOR_BACKEND generator, falling back to GPT-2, else context-only answers"""
+        try:
+            logger.info("Loading LLM model...")
+            if TRANSFORMERS_AVAILABLE:
+                self.backend = self._load_backend()
+            else:
+                logger.warning("Transformers not available. Will use simple context-based responses")
+            
+            if self.backend is not None:
+                self.prompt_builder = PromptBuilder.for_tokenizer(
+                    self.backend.tokenizer, config.CONTEXT_WINDOW_TOKENS, config.GENERATION_MAX_NEW_TOKENS
                 )
-                self.llm = AutoModelForCausalLM.from_pretrained(
-                    llama_model,
-                    token=config.HF_API_KEY,
-                    trust_remote_code=True,
-                    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                    device_map="auto" if torch.cuda.is_available() else None,
-                    low_cpu_mem_usage=True
+                logger.info(
+                    "Prompt budget: %d tokens (+%d reserved for the answer)",
+                    self.prompt_builder.prompt_budget, self.prompt_builder.max_new_tokens
                 )
-                self.use_pipeline = False
-                print(f"Successfully loaded {llama_model}")
-            except Exception as e:
-                print(f"Could not load Llama model: {e}")
-                print("Using GPT-2 as fallback...")
-                # Fallback to GPT-2 which is more accessible
-                try:
-                    self.generator = pipeline(
-                        "text-generation",
-                        model="gpt2",
-                        tokenizer="gpt2",
-                        token=config.HF_API_KEY,
-                        device=0 if torch.cuda.is_available() else -1
-                    )
-                    self.use_pipeline = True
-                    print("Using GPT-2 as generation model")
-                except Exception as e2:
-                    print(f"Error loading GPT-2: {e2}")
-                    print("Will use simple context-based responses")
-                    self.use_pipeline = None
+            
+            # Micro-batch concurrent generations into one generate call
+            if self.backend is not None and config.GENERATION_BATCHING:
+                self.batcher = MicroBatcher(
+                    self._generate_batch,
+                    max_batch_size=config.GENERATION_MAX_BATCH_SIZE,
+                    max_wait_ms=config.GENERATION_MAX_WAIT_MS,
+                    name="generation"
+                )
+        finally:
+            self.load_timings["generator_ready_s"] = self._elapsed()
+            self.generator_ready.set()
+            logger.info("Generator ready after %ss", self.load_timings["generator_ready_s"])
+            logger.info("RAG Pipeline initialized!")
+    
+    def _load_backend(self):
+        """First loadable backend: the configured one (auto = llama unless FAST_START), then GPT-2"""
+        if config.GENERATOR_BACKEND == "none":
+            logger.info("GENERATOR_BACKEND=none: answers are extracted from the context")
+            return None
+        if config.GENERATOR_BACKEND == "auto":
+            candidates = ["gpt2"] if config.FAST_START else ["llama", "gpt2"]
         else:
-            print("Transformers not available. Will use simple context-based responses")
-            self.use_pipeline = None
+            candidates = [config.GENERATOR_BACKEND] + (["gpt2"] if config.GENERATOR_BACKEND != "gpt2" else [])
         
-        print("RAG Pipeline initialized!")
+        for name in candidates:
+            backend = create_backend(name)
+            try:
+                logger.info("Attempting to load %s (%s backend)...", backend.model_name, name)
+                backend.load()
+                logger.info("Using %s as generation model (%s backend)", backend.model_name, name)
+                return backend
+            except Exception as e:
+                logger.warning("Could not load %s backend: %s", name, e)
+        logger.warning("Will use simple context-based responses")
+        return None
+    
+    def _wait_until_ready(self, event: threading.Event, what: str):
+        if not event.wait(config.MODEL_LOAD_WAIT_S):
+            raise ModelNotReadyError(f"The {what} model is still loading, please retry shortly")
     
-    def process_excel(self, file_path: str) -> List[Dict[str, Any]]:
-        """Process Excel file and extract text chunks"""
+    def readiness(self) -> Dict[str, Any]:
+        """Which models are loaded, plus cold start timings in seconds"""
+        return {
+            "encoder": "ready" if self.encoder_ready.is_set() else "loading",
+            "generator": "ready" if self.generator_ready.is_set()
+                else "loading" if self._generator_loader is not None else "not loaded",
+            "embedding_search": self.use_embeddings,
+            "generation_backend": (self.backend.name if self.backend else "context-only")
+                if self.generator_ready.is_set() else None,
+            "cold_start": dict(self.load_timings)
+        }
+    
+    @staticmethod
+    def process_excel(file_path: str) -> List[Dict[str, Any]]:
+        """Process Excel file and extract text chunks (same IDs as ingest_file at any block size)"""
         try:
-            df = pd.read_excel(file_path)
-            
-            # Convert DataFrame to text chunks
-            chunks = []
-            for idx, row in df.iterrows():
-                # Create a text representation of each row
-                row_text = f"Component: {row.to_dict()}"
-                chunks.append({
-                    "text": str(row_text),
-                    "metadata": {
-                        "row_index": idx,
-                        "source": file_path,
-                        **{str(k): str(v) for k, v in row.to_dict().items()}
-                    }
-                })
+            with stage_timer("read_excel"):
+                df = pd.read_excel(file_path)
             
-            return chunks
+            # Convert DataFrame to text chunks (one per row, built column-wise)
+            with stage_timer("chunk"):
+                return dataframe_to_chunks(df, file_path)
         except Exception as e:
             raise Exception(f"Error processing Excel file: {str(e)}")
     
-    def store_documents(self, chunks: List[Dict[str, Any]]):
-        """Store document chunks in ChromaDB with embeddings"""
-        global collection
+    def ingest_file(
+        self,
+        file_path: str,
+        block_rows: int = None,
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> Dict[str, int]:
+        """
+        Stream a spreadsheet (.xlsx, .xls, .csv, .parquet) into ChromaDB block by block.
+        Each block is parsed, embedded and written before the next is read, so peak
+        memory depends on the block size rather than the file size.
+        
+        Re-uploading a file is incremental: rows whose content is unchanged are not
+        re-embedded, and rows from a previous upload of the same file that are no
+        longer present are deleted once the whole file has been read.
+        ``progress(stage, rows)`` receives row counts as they are "parsed",
+        "embedded" and "stored".
+        """
+        block_rows = block_rows or config.INGEST_BLOCK_ROWS
+        totals = {"chunks_processed": 0, "chunks_added": 0, "chunks_updated": 0,
+                  "chunks_unchanged": 0, "chunks_deleted": 0}
+        seen_ids = set()
+        try:
+            for block in iter_row_blocks(file_path, block_rows):
+                with stage_timer("chunk"):
+                    chunks = dataframe_to_chunks(block, file_path)
+                if progress is not None:
+                    progress("parsed", len(chunks))
+                result = self.store_documents(chunks, progress=progress)
+                seen_ids.update(result.pop("ids"))
+                for key, value in result.items():
+                    totals[key] += value
+                totals["chunks_processed"] += len(chunks)
+                logger.info("Ingested %d rows from %s", totals["chunks_processed"], file_path)
+            
+            totals["chunks_deleted"] = self._delete_missing(file_path, seen_ids)
+        except Exception as e:
+            raise Exception(f"Error ingesting {file_path} after {totals['chunks_processed']} rows: {str(e)}")
+
+        # Publish the updated vectors (and the typed filter columns) so other
+        # processes map them instead of rebuilding
+        with stage_timer("vector_store_checkpoint"):
+            collection.checkpoint(get_collection_version(), SNAPSHOT_FILTER_FIELDS)
+
+        logger.info(
+            "Ingest of %s: %d added, %d updated, %d unchanged, %d deleted", file_path,
+            totals["chunks_added"], totals["chunks_updated"], totals["chunks_unchanged"], totals["chunks_deleted"]
+        )
+        return totals
+    
+    def _delete_missing(self, source: str, keep_ids: set) -> int:
+        """Delete documents of ``source`` whose IDs are not in ``keep_ids``"""
         _init_chromadb()
+        existing = collection.get(where={"source": source}, include=[])["ids"]
+        stale = [doc_id for doc_id in existing if doc_id not in keep_ids]
+        for start in range(0, len(stale), config.EMBED_BATCH_SIZE):
+            collection.delete(ids=stale[start:start + config.EMBED_BATCH_SIZE])
+        if stale:
+            self.keyword_index.remove(stale)
+            self._mark_collection_changed()
+        return len(stale)
+    
+    def _mark_collection_changed(self):
+        """Bump the collection version; the keyword index and vector store stay current if they were before"""
+        previous = get_collection_version()
+        version = bump_collection_version()
+        for index in (self.keyword_index, collection):
+            if index.version is not None and index.version == previous:
+                # Our incremental updates cover this change - no rebuild needed
+                index.version = version
+    
+    def _write_batch(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                     embeddings: Optional[List[List[float]]],
+                     moved_ids: List[str], moved_metadatas: List[Dict[str, Any]]) -> float:
+        """Upsert new rows and refresh metadata of moved rows, returning elapsed milliseconds"""
+        with stage_timer("chroma_write") as span:
+            if ids:
+                if embeddings is not None:
+                    collection.upsert(embeddings=embeddings, documents=texts, metadatas=metadatas, ids=ids)
+                else:
+                    # No embeddings - ChromaDB embeds the documents itself (text search mode)
+                    collection.upsert(documents=texts, metadatas=metadatas, ids=ids)
+            if moved_ids:
+                # Same content at a different row - metadata only, no re-embedding
+                collection.update(ids=moved_ids, metadatas=moved_metadatas)
+        if ids and self.keyword_index.version is not None:
+            with stage_timer("keyword_index_update"):
+                self.keyword_index.add(ids, texts)
+        return span.elapsed * 1000.0
+    
+    def store_documents(
+        self,
+        chunks: List[Dict[str, Any]],
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Store document chunks in ChromaDB with embeddings.
         
-        texts = [chunk["text"] for chunk in chunks]
-        metadatas = [chunk["metadata"] for chunk in chunks]
-        ids = [f"doc_{i}" for i in range(len(chunks))]
+        Document IDs are content hashes of (source, text), so only chunks not already
+        in the collection are embedded and upserted; chunks that exist with different
+        metadata (e.g. a moved row) get a metadata-only update. Work is done in
+        batches of EMBED_BATCH_SIZE; the write of batch N runs on a writer thread
+        while batch N+1 is being encoded. Batches written before a failure stay
+        stored. ``progress(stage, rows)`` is called with "embedded" once a batch is
+        encoded and "stored" once it is written (unchanged chunks count for both).
         
-        if self.use_embeddings and self.encoder is not None:
-            # Generate embeddings using the encoder model
-            print(f"Generating embeddings for {len(texts)} chunks...")
-            try:
-                embeddings = self.encoder.encode(texts).tolist()
-                # Store in ChromaDB with embeddings
-                collection.add(
-                    embeddings=embeddings,
-                    documents=texts,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-                print(f"Stored {len(chunks)} documents in ChromaDB with embeddings")
-            except Exception as e:
-                print(f"Error generating embeddings: {e}, falling back to text search")
-                self.use_embeddings = False
-                # Fallback to text search
-                collection.add(
-                    documents=texts,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-                print(f"Stored {len(chunks)} documents in ChromaDB (text search mode)")
-        else:
-            # Store without embeddings - use text search
-            print(f"Storing {len(texts)} chunks using text search...")
-            collection.add(
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
+        Returns the stored IDs and counts of added, updated and unchanged chunks.
+        """
+        self._wait_until_ready(self.encoder_ready, "embedding")
+        _init_chromadb()
+        
+        # Identical rows hash to the same ID - keep the first occurrence
+        unique = {}
+        for chunk in chunks:
+            doc_id = chunk_id(chunk["metadata"].get("source", ""), chunk["text"])
+            unique.setdefault(doc_id, chunk)
+        ids = list(unique)
+        texts = [chunk["text"] for chunk in unique.values()]
+        metadatas = [chunk["metadata"] for chunk in unique.values()]
+        total = len(ids)
+        batch_size = max(1, config.EMBED_BATCH_SIZE)
+        counts = {"chunks_added": 0, "chunks_updated": 0, "chunks_unchanged": 0}
+        
+        mode = "embeddings" if self.use_embeddings and self.encoder is not None else "text search"
+        logger.info("Storing %d chunks in batches of %d (%s mode)...", total, batch_size, mode)
+        
+        started = time.perf_counter()
+        done = 0
+        pending = None  # (future, batch_rows, embed_ms) of the write in flight
+        
+        def _finish(pending_write):
+            nonlocal done
+            future, batch_rows, embed_ms = pending_write
+            write_ms = future.result()
+            done += batch_rows
+            elapsed = time.perf_counter() - started
+            # One line per batch: DEBUG, so LOG_DEBUG_SAMPLE_RATE applies
+            logger.debug(
+                "Stored %d/%d chunks", done, total,
+                extra={"batch_rows": batch_rows, "embed_ms": round(embed_ms, 1),
+                       "write_ms": round(write_ms, 1), "rows_per_s": round(done / elapsed)}
             )
-            print(f"Stored {len(chunks)} documents in ChromaDB (text search mode)")
+            if progress is not None:
+                progress("stored", batch_rows)
+        
+        try:
+            for batch_start in range(0, total, batch_size):
+                batch = slice(batch_start, batch_start + batch_size)
+                batch_ids, batch_texts, batch_metadatas = ids[batch], texts[batch], metadatas[batch]
+                
+                # Skip content that is already stored
+                with stage_timer("dedupe_lookup"):
+                    existing = collection.get(ids=batch_ids, include=["metadatas"])
+                existing_metadata = dict(zip(existing["ids"], existing["metadatas"]))
+                new = [i for i, doc_id in enumerate(batch_ids) if doc_id not in existing_metadata]
+                moved = [
+                    i for i, doc_id in enumerate(batch_ids)
+                    if doc_id in existing_metadata and existing_metadata[doc_id] != batch_metadatas[i]
+                ]
+                counts["chunks_added"] += len(new)
+                counts["chunks_updated"] += len(moved)
+                counts["chunks_unchanged"] += len(batch_ids) - len(new) - len(moved)
+                new_texts = [batch_texts[i] for i in new]
+                
+                embeddings = None
+                embed_ms = 0.0
+                if new and self.use_embeddings and self.encoder is not None:
+                    with stage_timer("embed_documents") as span:
+                        try:
+                            embeddings = self.embeddings.encode(new_texts)
+                        except Exception as e:
+                            logger.warning("Error generating embeddings: %s, falling back to text search", e)
+                            self.use_embeddings = False
+                    embed_ms = span.elapsed * 1000.0
+                if progress is not None:
+                    progress("embedded", len(batch_ids))
+                
+                # Wait for the previous write before queueing this one (keeps one write in flight)
+                if pending is not None:
+                    _finish(pending)
+                    pending = None
+                future = self._writer.submit(
+                    self._write_batch,
+                    [batch_ids[i] for i in new], new_texts, [batch_metadatas[i] for i in new], embeddings,
+                    [batch_ids[i] for i in moved], [batch_metadatas[i] for i in moved]
+                )
+                pending = (future, len(batch_ids), embed_ms)
+            
+            if pending is not None:
+                _finish(pending)
+                pending = None
+        finally:
+            if pending is not None:
+                # A batch failed - let the write already in flight land before re-raising
+                try:
+                    _finish(pending)
+                except Exception:
+                    pass
+            if counts["chunks_added"] or counts["chunks_updated"]:
+                self._mark_collection_changed()
+        
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Stored %d documents in ChromaDB in %.2fs (%.0f rows/s): %d added, %d updated, %d unchanged",
+            done, elapsed, done / max(elapsed, 1e-9),
+            counts["chunks_added"], counts["chunks_updated"], counts["chunks_unchanged"]
+        )
+        return {"ids": ids, **counts}
     
-    def retrieve_context(self, query: str, n_results: int = 5) -> List[str]:
-        """Retrieve relevant context from ChromaDB"""
-        global collection
-        _init_chromadb()
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing cached vectors for repeated questions"""
+        return self.embeddings.embed_query(query)
+    
+    def _vector_search(self, queries: List[str], n_results: int,
+                       where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """ANN search for several queries in one ChromaDB request (``where`` pre-filters candidates)"""
+        self._wait_until_ready(self.encoder_ready, "embedding")
         
         if self.use_embeddings and self.encoder is not None:
             try:
-                # Generate query embedding
-                query_embedding = self.encoder.encode([query]).tolist()[0]
+                # Generate query embeddings (cached ones are reused)
+                with stage_timer("embed_query"):
+                    query_embeddings = self.embeddings.embed_queries(queries)
                 
                 # Query ChromaDB with embeddings
-                results = collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=n_results
-                )
+                with stage_timer("vector_query"):
+                    return collection.query(
+                        query_embeddings=query_embeddings,
+                        n_results=n_results,
+                        where=where
+                    )
             except Exception as e:
-                print(f"Error with embedding search: {e}, falling back to text search")
-                # Fallback to text search
-                results = collection.query(
-                    query_texts=[query],
-                    n_results=n_results
-                )
-        else:
-            # Use text-based search
-            results = collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
+                logger.warning("Error with embedding search: %s, falling back to text search", e)
         
-        if results['documents'] and len(results['documents'][0]) > 0:
-            return results['documents'][0]
-        return []
+        # Use text-based search
+        with stage_timer("vector_query"):
+            return collection.query(
+                query_texts=queries,
+                n_results=n_results,
+                where=where
+            )
+    
+    def _hybrid_search(self, queries: List[str], n_results: int,
+                       where: Optional[Dict[str, Any]]) -> List[Dict[str, list]]:
+        """
+        Vector search and BM25 over HYBRID_CANDIDATES candidates each, fused with
+        reciprocal rank fusion into the top ``n_results`` per query
+        """
+        candidates = max(n_results, config.HYBRID_CANDIDATES)
+        results = self._vector_search(queries, candidates, where)
+        with stage_timer("keyword_search"):
+            self.keyword_index.sync(collection, get_collection_version())
+            keyword_rankings = [
+                [doc_id for doc_id, _ in self.keyword_index.search(query, candidates)]
+                for query in queries
+            ]
+        with stage_timer("fusion"):
+            return hybrid_merge(collection, results, keyword_rankings, n_results, where, config.RRF_K)
     
-    def generate_answer(self, query: str, context: List[str]) -> str:
-        """Generate answer using LLM with retrieved context"""
-        # Format context
-        context_text = "\n\n".join([f"Context {i+1}: {ctx}" for i, ctx in enumerate(context)])
+    def retrieve_hits(self, queries: List[str], n_results: int = 5,
+                      where: Optional[Dict[str, Any]] = None) -> List[Dict[str, list]]:
+        """
+        Retrieve documents and their metadata for several queries at once.
+        Queries naming a stored part number are answered from the part-number
+        metadata index without the encoder; the rest are embedded in one pass and
+        sent to ChromaDB as a single multi-query request, and (with HYBRID_SEARCH)
+        fused with BM25 keyword hits. ``where`` filters (see
+        search_index.build_where) restrict the candidates before the ANN search.
+        With RERANK_ENABLED, max(n_results, RERANK_CANDIDATES) candidates are
+        fetched and the cross-encoder keeps the best ``n_results`` (hits then
+        also carry ``scores``).
+        Returns ``{"ids": [...], "documents": [...], "metadatas": [...]}`` per query.
+        """
+        _init_chromadb()
         
-        # Create prompt
-        prompt = f"""Based on the following context about semiconductor components, answer the question.
-
-Context:
-{context_text}
-
-Question: {query}
-
-Answer:"""
+        if not queries:
+            return []
+        
+        # The in-memory store reloads if another process changed the collection
+        with stage_timer("vector_store_sync"):
+            collection.sync(get_collection_version())
+        
+        top_k = n_results
+        if self.reranker is not None:
+            n_results = max(n_results, config.RERANK_CANDIDATES)
+        
+        where_clause = build_where(where)
+        hits = {}
+        if config.PART_NUMBER_FAST_PATH:
+            with stage_timer("part_lookup"):
+                hits.update(exact_part_matches(collection, queries, n_results, where_clause))
+        
+        remaining = [i for i in range(len(queries)) if i not in hits]
+        if remaining:
+            remaining_queries = [queries[i] for i in remaining]
+            if config.HYBRID_SEARCH:
+                for i, merged in zip(remaining, self._hybrid_search(remaining_queries, n_results, where_clause)):
+                    hits[i] = merged
+            else:
+                results = self._vector_search(remaining_queries, n_results, where_clause)
+                ids = results['ids'] or []
+                documents = results['documents'] or []
+                metadatas = results['metadatas'] or []
+                for position, i in enumerate(remaining):
+                    hits[i] = {
+                        "ids": list(ids[position]) if position < len(ids) and ids[position] else [],
+                        "documents": list(documents[position]) if position < len(documents) and documents[position] else [],
+                        "metadatas": list(metadatas[position]) if position < len(metadatas) and metadatas[position] else []
+                    }
+        
+        hits = [hits[i] for i in range(len(queries))]
+        if self.reranker is not None:
+            with stage_timer("rerank"):
+                hits = self.reranker.rerank(queries, hits, top_k)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Retrieved hits", extra={"queries": len(queries), "fast_path": len(queries) - len(remaining),
+                                         "hits": [len(h["ids"]) for h in hits]}
+            )
+        return hits
+    
+    def retrieve_contexts(self, queries: List[str], n_results: int = 5,
+                          where: Optional[Dict[str, Any]] = None) -> List[List[str]]:
+        """Retrieve context documents for several queries at once (see retrieve_hits)"""
+        return [hits["documents"] for hits in self.retrieve_hits(queries, n_results, where)]
+    
+    def retrieve_context(self, query: str, n_results: int = 5,
+                         where: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Retrieve relevant context from ChromaDB"""
+        return self.retrieve_contexts([query], n_results, where)[0]
+    
+    def _build_prompt(self, query: str, context: List[str],
+                      metadatas: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, int]:
+        """Fit the question and the most relevant context fields into the prompt token budget"""
+        with stage_timer("prompt_build"):
+            return self.prompt_builder.build(query, context, metadatas)
+    
+    def _count_tokens(self, text: str) -> int:
+        return len(self.backend.tokenizer.encode(text, add_special_tokens=False)) if text else 0
+    
+    def _record_usage(self, prompt_tokens: int, answer: str) -> Dict[str, int]:
+        """Token counts for one generated answer, also added to the usage histograms"""
+        completion_tokens = self._count_tokens(answer)
+        self.prompt_tokens_hist.observe(prompt_tokens)
+        self.completion_tokens_hist.observe(completion_tokens)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+    
+    def _generate_batch(self, prompts: List[str]) -> List[str]:
+        """Run one (padded) batched generate call and return the answer text per prompt"""
+        return self.backend.generate(
+            prompts, config.GENERATION_MAX_NEW_TOKENS, self.prompt_builder.prompt_budget
+        )
+    
+    def generate_answer(self, query: str, context: List[str],
+                        metadatas: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Dict[str, int]]:
+        """
+        Generate answer using LLM with retrieved context.
+        Returns the answer and its token usage (prompt and completion tokens;
+        zero for answers extracted from the context without the LLM).
+        """
+        self._wait_until_ready(self.generator_ready, "language")
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
         
         try:
-            if self.use_pipeline and hasattr(self, 'generator'):
-                # Use pipeline for generation (GPT-2)
-                response = self.generator(
-                    prompt,
-                    max_length=min(len(prompt.split()) + 100, 512),
-                    num_return_sequences=1,
-                    temperature=0.7,
-                    truncation=True,
-                    pad_token_id=self.generator.tokenizer.eos_token_id
-                )
-                answer = response[0]['generated_text'].replace(prompt, "").strip()
+            if self.backend is None:
+                # Fallback to context-based answer
+                answer = self._extract_from_context(context, query)
+            else:
+                prompt, prompt_tokens = self._build_prompt(query, context, metadatas)
+                # Includes the wait for a micro-batch slot
+                with stage_timer("answer_generation"):
+                    if self.batcher is not None:
+                        answer = self.batcher.submit(prompt)
+                    else:
+                        answer = self._generate_batch([prompt])[0]
+                usage = self._record_usage(prompt_tokens, answer)
+                logger.debug("Generated answer", extra=usage)
                 if not answer:
                     answer = self._extract_from_context(context, query)
-            
-            elif hasattr(self, 'llm') and not self.use_pipeline:
-                # Use LLM directly (Llama)
-                inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
-                if torch.cuda.is_available() and hasattr(self.llm, 'cuda'):
-                    inputs = {k: v.cuda() for k, v in inputs.items()}
-                
+        
+        except Exception as e:
+            logger.exception("Error in generation: %s", e)
+            answer = self._extract_from_context(context, query)
+        
+        return answer, usage
+    
+    def generate_answers(self, queries: List[str], contexts: List[List[str]],
+                         metadatas: Optional[List[List[Dict[str, Any]]]] = None) -> List[Tuple[str, Dict[str, int]]]:
+        """
+        Generate answers for a known set of questions, running them through the
+        model in padded batches of GENERATION_MAX_BATCH_SIZE prompts.
+        Returns (answer, usage) per question.
+        """
+        self._wait_until_ready(self.generator_ready, "language")
+        no_usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        if self.backend is None:
+            return [(self._extract_from_context(context, query), dict(no_usage))
+                    for query, context in zip(queries, contexts)]
+        
+        metadatas = metadatas or [None] * len(queries)
+        built = [
+            self._build_prompt(query, context, metas)
+            for query, context, metas in zip(queries, contexts, metadatas)
+        ]
+        batch_size = max(1, config.GENERATION_MAX_BATCH_SIZE)
+        answers = []
+        for start in range(0, len(built), batch_size):
+            batch = built[start:start + batch_size]
+            try:
+                texts = self._generate_batch([prompt for prompt, _ in batch])
+                answers.extend(
+                    (text, self._record_usage(prompt_tokens, text))
+                    for text, (_, prompt_tokens) in zip(texts, batch)
+                )
+            except Exception as e:
+                logger.exception("Error in batch generation: %s", e)
+                answers.extend(("", dict(no_usage)) for _ in batch)
+        
+        return [
+            (answer or self._extract_from_context(context, query), usage)
+            for query, context, (answer, usage) in zip(queries, contexts, answers)
+        ]
+    
+    def stream_answer(self, query: str, context: List[str],
+                      metadatas: Optional[List[Dict[str, Any]]] = None,
+                      usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        """
+        Generate an answer token by token.
+        Yields decoded text pieces as the model produces them; streamed requests
+        bypass the micro-batcher because each one needs its own streamer.
+        If a ``usage`` dict is given it receives the token counts once the
+        stream is exhausted.
+        """
+        self._wait_until_ready(self.generator_ready, "language")
+        if self.backend is None:
+            yield self._extract_from_context(context, query)
+            return
+        
+        model, tokenizer = self.backend.model, self.backend.tokenizer
+        prompt, prompt_tokens = self._build_prompt(query, context, metadatas)
+        inputs = tokenizer(
+            prompt, return_tensors="pt", truncation=True, max_length=self.prompt_builder.prompt_budget
+        )
+        inputs = {k: v.to(model.device) for k, v in inputs.items()}
+        streamer = TextIteratorStreamer(
+            tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            timeout=config.INFERENCE_TIMEOUT_S
+        )
+        
+        def _generate():
+            try:
                 with torch.no_grad():
-                    outputs = self.llm.generate(
+                    model.generate(
                         **inputs,
-                        max_new_tokens=150,
-                        temperature=0.7,
-                        do_sample=True,
-                        pad_token_id=self.tokenizer.eos_token_id if hasattr(self.tokenizer, 'eos_token_id') else self.tokenizer.pad_token_id
+                        streamer=streamer,
+                        **self.backend.generation_kwargs(config.GENERATION_MAX_NEW_TOKENS)
                     )
-                
-                answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                answer = answer.replace(prompt, "").strip()
-                if not answer:
-                    answer = self._extract_from_context(context, query)
-            else:
-                # Fallback to context-based answer
-                answer = self._extract_from_context(context, query)
+            except Exception as e:
+                logger.exception("Error in streamed generation: %s", e)
+                streamer.end()
         
-        except Exception as e:
-            print(f"Error in generation: {e}")
-            answer = self._extract_from_context(context, query)
+        # Run in a copy of this context so the generation thread logs under the request ID
+        worker = threading.Thread(
+            target=contextvars.copy_context().run, args=(_generate,), name="stream-generate", daemon=True
+        )
+        worker.start()
         
-        return answer
+        pieces = []
+        try:
+            for text in streamer:
+                if text:
+                    pieces.append(text)
+                    yield text
+        finally:
+            worker.join()
+        
+        recorded = self._record_usage(prompt_tokens, "".join(pieces))
+        if usage is not None:
+            usage.update(recorded)
+        if not pieces:
+            yield self._extract_from_context(context, query)
     
     def _extract_from_context(self, context: List[str], query: str) -> str:
         """Extract relevant information from context as fallback"""
@@ -309,39 +755,154 @@ Answer:"""
                 relevant_parts.append(ctx[:300])  # Limit length
         
         if relevant_parts:
-            return f"Based on the retrieved information:\n\n" + "\n\n".join(relevant_parts[:3])
+            return "Based on the retrieved information:\n\n" + "\n\n".join(relevant_parts[:3])
         else:
             return "\n\n".join([f"- {ctx[:200]}" for ctx in context[:3]])
     
-    def answer_question(self, query: str, n_results: int = 5) -> Dict[str, Any]:
-        """Complete RAG pipeline: retrieve context and generate answer"""
+    def generation_results(self, n_results: int) -> int:
+        """How many hits go into the prompt: with re-ranking only the best RERANK_TOP_K"""
+        if self.reranker is not None:
+            return min(n_results, config.RERANK_TOP_K)
+        return n_results
+    
+    def _answer_cache_key(self, query: str, n_results: int,
+                          where: Optional[Dict[str, Any]] = None) -> tuple:
+        filters = json.dumps(where, sort_keys=True) if where else None
+        return (normalize_query(query), n_results, filters, get_collection_version())
+    
+    def lookup_answer(self, query: str, n_results: int = 5,
+                      where: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return a cached answer for this question and collection version, if any"""
+        cached = self.answer_cache.get(self._answer_cache_key(query, n_results, where))
+        if cached is None:
+            return None
+        return {**cached, "query": query, "usage": dict(CACHED_USAGE)}
+    
+    def _record_first_answer(self):
+        if self.load_timings["first_answer_s"] is None:
+            self.load_timings["first_answer_s"] = self._elapsed()
+            logger.info("Cold start to first answer: %ss", self.load_timings["first_answer_s"])
+    
+    def answer_question(self, query: str, n_results: int = 5,
+                        where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Complete RAG pipeline: retrieve context and generate answer.
+        ``usage`` reports the prompt and completion tokens processed for this
+        answer (zero when it came from the answer cache).
+        """
+        cache_key = self._answer_cache_key(query, n_results, where)
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "query": query, "usage": dict(CACHED_USAGE)}
+        
         # Retrieve relevant context
-        context = self.retrieve_context(query, n_results)
+        hits = self.retrieve_hits([query], self.generation_results(n_results), where)[0]
+        context = hits["documents"]
         
         if not context:
             return {
-                "answer": "I couldn't find any relevant information in the database. Please upload a document first.",
+                "answer": NO_CONTEXT_ANSWER,
                 "context": [],
-                "query": query
+                "query": query,
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0}
             }
         
         # Generate answer
-        answer = self.generate_answer(query, context)
+        answer, usage = self.generate_answer(query, context, hits["metadatas"])
+        self.answer_cache.put(cache_key, {"answer": answer, "context": context})
+        self._record_first_answer()
         
         return {
             "answer": answer,
             "context": context,
-            "query": query
+            "query": query,
+            "usage": usage
         }
+    
+    def answer_questions(self, queries: List[str], n_results: int = 5,
+                         where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Batch RAG: answers come from the answer cache where possible; the rest are
+        retrieved with one multi-query lookup and generated in padded batches
+        """
+        cache_keys = [self._answer_cache_key(query, n_results, where) for query in queries]
+        results = [None] * len(queries)
+        for i, (query, cache_key) in enumerate(zip(queries, cache_keys)):
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                results[i] = {**cached, "query": query, "usage": dict(CACHED_USAGE)}
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        all_hits = self.retrieve_hits([queries[i] for i in missing], self.generation_results(n_results), where)
+        
+        to_generate = []
+        for i, hits in zip(missing, all_hits):
+            if hits["documents"]:
+                to_generate.append((i, hits))
+            else:
+                results[i] = {
+                    "answer": NO_CONTEXT_ANSWER, "context": [], "query": queries[i],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0}
+                }
+        
+        if to_generate:
+            answers = self.generate_answers(
+                [queries[i] for i, _ in to_generate],
+                [hits["documents"] for _, hits in to_generate],
+                [hits["metadatas"] for _, hits in to_generate]
+            )
+            for (i, hits), (answer, usage) in zip(to_generate, answers):
+                context = hits["documents"]
+                self.answer_cache.put(cache_keys[i], {"answer": answer, "context": context})
+                results[i] = {"answer": answer, "context": context, "query": queries[i], "usage": usage}
+            self._record_first_answer()
+        
+        return results
 
 
 # Global instance
 rag_pipeline = None
+_rag_pipeline_lock = threading.Lock()
 
-def get_rag_pipeline() -> RAGPipeline:
-    """Get or create RAG pipeline instance"""
+def get_rag_pipeline(load_generator: bool = True) -> RAGPipeline:
+    """
+    Get or create RAG pipeline instance.
+    Creation only starts background model loading; methods wait for the models they need.
+    ``load_generator=False`` is for callers that only need the encoder and the
+    collection (ingestion); the LLM starts loading once any caller needs it.
+    """
     global rag_pipeline
     if rag_pipeline is None:
-        rag_pipeline = RAGPipeline()
+        with _rag_pipeline_lock:
+            if rag_pipeline is None:
+                rag_pipeline = RAGPipeline(background=True, load_generator=load_generator)
+    if load_generator:
+        rag_pipeline.start_generator()
     return rag_pipeline
 
+
+def get_readiness() -> Dict[str, Any]:
+    """Model readiness of the pipeline in this process (starts loading if needed)"""
+    return get_rag_pipeline().readiness()
+
+
+def get_pipeline_stats() -> Dict[str, Any]:
+    """Runtime stats of the pipeline in this process (empty until it is created)"""
+    if rag_pipeline is None:
+        return {}
+    stats = {
+        "query_embedding_cache": rag_pipeline.embeddings.query_cache.stats(),
+        "answer_cache": rag_pipeline.answer_cache.stats(),
+        "keyword_index": rag_pipeline.keyword_index.stats(),
+        "vector_store": collection.stats() if collection is not None else None,
+        "prompt_tokens": rag_pipeline.prompt_tokens_hist.snapshot(),
+        "completion_tokens": rag_pipeline.completion_tokens_hist.snapshot()
+    }
+    if rag_pipeline.backend is not None:
+        stats["generator"] = rag_pipeline.backend.describe()
+    if rag_pipeline.reranker is not None:
+        stats["reranker"] = rag_pipeline.reranker.stats()
+    if rag_pipeline.batcher is not None:
+        stats["generation_batching"] = rag_pipeline.batcher.stats()
+    return stats
+
@@ -0,0 +1,97 @@
+"""
+Cross-encoder re-ranking for retrieved candidates
+Scores (query, document) pairs with a small cross-encoder in one batch and
+caches scores per (query, document ID) so repeated questions skip the model
+"""
+import logging
+import threading
+from typing import Any, Dict, List
+import config
+from cache import TTLCache, normalize_query
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except Exception as e:
+    logging.getLogger(__name__).warning("sentence-transformers CrossEncoder import failed: %s", e)
+    CROSS_ENCODER_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Re-orders retrieval hits by cross-encoder relevance.
+
+    ``rerank`` takes hits shaped like RAGPipeline.retrieve_hits output
+    (``{"ids", "documents", "metadatas"}`` per query), scores every uncached
+    pair of all queries in one ``predict`` call and keeps the best ``top_k``
+    per query. If the model cannot be loaded the hits pass through unchanged.
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = 64):
+        self.model_name = model_name or config.RERANK_MODEL
+        self.batch_size = batch_size
+        self.model = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        self.score_cache = TTLCache(
+            maxsize=config.RERANK_CACHE_SIZE,
+            ttl=config.RERANK_CACHE_TTL_S
+        )
+
+    def load(self) -> bool:
+        """Load the cross-encoder once; returns False if it cannot be loaded"""
+        with self._load_lock:
+            if self.model is not None:
+                return True
+            if self._load_failed or not CROSS_ENCODER_AVAILABLE:
+                return False
+            try:
+                logger.info("Loading re-ranker %s...", self.model_name)
+                self.model = CrossEncoder(self.model_name, max_length=512)
+                logger.info("Loaded re-ranker: %s", self.model_name)
+                return True
+            except Exception as e:
+                logger.warning("Could not load re-ranker: %s. Hits will not be re-ranked", e)
+                self._load_failed = True
+                return False
+
+    def _cache_key(self, query: str, doc_id: str, document: str) -> tuple:
+        return (self.model_name, normalize_query(query), doc_id or document)
+
+    def rerank(self, queries: List[str], hits: List[Dict[str, list]], top_k: int) -> List[Dict[str, list]]:
+        """Best ``top_k`` hits per query by cross-encoder score (adds a ``scores`` list)"""
+        if not self.load():
+            return [{key: values[:top_k] for key, values in query_hits.items()} for query_hits in hits]
+
+        scores = []
+        pending_pairs, pending_slots = [], []
+        for q, (query, query_hits) in enumerate(zip(queries, hits)):
+            ids = query_hits.get("ids") or [None] * len(query_hits["documents"])
+            query_scores = []
+            for d, (doc_id, document) in enumerate(zip(ids, query_hits["documents"])):
+                cached = self.score_cache.get(self._cache_key(query, doc_id, document))
+                query_scores.append(cached)
+                if cached is None:
+                    pending_pairs.append((query, document))
+                    pending_slots.append((q, d, doc_id))
+            scores.append(query_scores)
+
+        if pending_pairs:
+            predicted = self.model.predict(pending_pairs, batch_size=self.batch_size, show_progress_bar=False)
+            for (q, d, doc_id), score in zip(pending_slots, predicted):
+                score = float(score)
+                scores[q][d] = score
+                self.score_cache.put(self._cache_key(queries[q], doc_id, hits[q]["documents"][d]), score)
+
+        reranked = []
+        for query_hits, query_scores in zip(hits, scores):
+            order = sorted(range(len(query_scores)), key=lambda d: query_scores[d], reverse=True)[:top_k]
+            result = {key: [values[d] for d in order] if values else [] for key, values in query_hits.items()}
+            result["scores"] = [round(query_scores[d], 4) for d in order]
+            reranked.append(result)
+        return reranked
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "loaded": self.model is not None, "score_cache": self.score_cache.stats()}
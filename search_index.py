@@ -0,0 +1,395 @@
+"""
+Search helpers shared by the RAG pipeline and the MCP server
+Translates request filters into ChromaDB ``where`` clauses, answers exact
+part-number queries from the metadata index without running the encoder, and
+keeps an in-memory BM25 index whose hits are fused with vector hits
+"""
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from ingest import normalize_keyword, normalize_part_number
+
+# Typed metadata written by ingest.dataframe_to_chunks
+KEYWORD_FIELDS = ("manufacturer", "category")
+NUMERIC_FIELDS = ("voltage_v", "current_a")
+
+# Friendly range keys accepted in filters -> ChromaDB operators
+RANGE_OPERATORS = {"min": "$gte", "max": "$lte", "gt": "$gt", "lt": "$lt"}
+CHROMA_OPERATORS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin"}
+
+# Tokens that could be part numbers: letters and digits mixed, at least 4 characters
+_PART_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9\-/.#+]*[A-Za-z0-9]")
+
+
+# Collection version - changes on every ingest so cached answers and keyword indexes
+# never outlive the data. Kept in a file next to the ChromaDB data so every process
+# (API workers, MCP server) sees the same value.
+COLLECTION_VERSION_FILE = os.path.join(config.CHROMA_PERSIST_DIR, "collection_version")
+
+def get_collection_version() -> str:
+    """Current collection version (empty string before the first ingest)"""
+    try:
+        with open(COLLECTION_VERSION_FILE, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_collection_version() -> str:
+    """Mark the collection as changed, invalidating cached answers"""
+    version = str(time.time_ns())
+    os.makedirs(config.CHROMA_PERSIST_DIR, exist_ok=True)
+    tmp_path = f"{COLLECTION_VERSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, COLLECTION_VERSION_FILE)
+    return version
+
+
+class InvalidFilterError(ValueError):
+    """Raised when a ``where`` filter cannot be translated for ChromaDB"""
+
+
+def _normalize_value(field: str, value: Any) -> Any:
+    if field in KEYWORD_FIELDS and isinstance(value, str):
+        return normalize_keyword(value)
+    if field == "part_number" and isinstance(value, str):
+        return normalize_part_number(value)
+    if field in NUMERIC_FIELDS:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise InvalidFilterError(f"Filter on {field!r} needs a number, got {value!r}")
+        return float(value)
+    return value
+
+
+def _field_clause(field: str, condition: Any) -> Dict[str, Any]:
+    if isinstance(condition, dict):
+        clauses = []
+        for op, value in condition.items():
+            chroma_op = RANGE_OPERATORS.get(op, op)
+            if chroma_op not in CHROMA_OPERATORS:
+                raise InvalidFilterError(f"Unknown operator {op!r} for {field!r}")
+            if chroma_op in ("$in", "$nin"):
+                if not isinstance(value, list):
+                    raise InvalidFilterError(f"{op!r} on {field!r} needs a list")
+                value = [_normalize_value(field, v) for v in value]
+            else:
+                value = _normalize_value(field, value)
+            clauses.append({field: {chroma_op: value}})
+        if not clauses:
+            raise InvalidFilterError(f"Empty condition for {field!r}")
+        return combine_where(*clauses)
+    if isinstance(condition, list):
+        return {field: {"$in": [_normalize_value(field, v) for v in condition]}}
+    return {field: {"$eq": _normalize_value(field, condition)}}
+
+
+def combine_where(*clauses: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """AND together the non-empty clauses (ChromaDB's $and needs two or more)"""
+    clauses = [clause for clause in clauses if clause]
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Translate request filters into a ChromaDB ``where`` clause.
+
+    ``{"manufacturer": "Texas Instruments", "voltage_v": {"min": 5}, "category": ["diode", "transistor"]}``
+    A scalar means equality, a list means any of, and a dict holds a range
+    (``min``/``max``/``gt``/``lt``) or raw ChromaDB operators (``$gte``, ``$ne``, ...).
+    Values for typed fields are normalized the way ingestion stored them.
+    Top-level ``$and``/``$or`` clauses are passed through unchanged.
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise InvalidFilterError("where must be an object")
+    clauses = []
+    for field, condition in filters.items():
+        if field in ("$and", "$or"):
+            clauses.append({field: condition})
+        elif field.startswith("$"):
+            raise InvalidFilterError(f"Unsupported top-level operator {field!r}")
+        else:
+            clauses.append(_field_clause(field, condition))
+    return combine_where(*clauses)
+
+
+def extract_part_numbers(query: str) -> List[str]:
+    """Canonical part-number candidates mentioned in a query"""
+    candidates = []
+    for token in _PART_TOKEN_RE.findall(query):
+        if len(token) >= 4 and any(c.isdigit() for c in token) and any(c.isalpha() for c in token):
+            part_number = normalize_part_number(token)
+            if part_number not in candidates:
+                candidates.append(part_number)
+    return candidates
+
+
+def exact_part_matches(
+    collection,
+    queries: List[str],
+    n_results: int,
+    where: Optional[Dict[str, Any]] = None
+) -> Dict[int, Dict[str, list]]:
+    """
+    Look up part numbers mentioned in the queries with one metadata ``get``
+    (no embedding, no ANN search). Returns ``{query index: {"ids": [...],
+    "documents": [...], "metadatas": [...]}}`` for queries with at least one exact match.
+    """
+    candidates = [extract_part_numbers(query) for query in queries]
+    all_part_numbers = sorted({pn for pns in candidates for pn in pns})
+    if not all_part_numbers:
+        return {}
+
+    results = collection.get(
+        where=combine_where(where, {"part_number": {"$in": all_part_numbers}}),
+        limit=n_results * len(all_part_numbers),
+        include=["documents", "metadatas"]
+    )
+    by_part_number = {}
+    for doc_id, doc, metadata in zip(results["ids"], results["documents"] or [], results["metadatas"] or []):
+        by_part_number.setdefault(metadata.get("part_number"), []).append((doc_id, doc, metadata))
+
+    matches = {}
+    for i, part_numbers in enumerate(candidates):
+        hits = [hit for pn in part_numbers for hit in by_part_number.get(pn, [])][:n_results]
+        if hits:
+            matches[i] = {
+                "ids": [doc_id for doc_id, _, _ in hits],
+                "documents": [doc for _, doc, _ in hits],
+                "metadatas": [metadata for _, _, metadata in hits]
+            }
+    return matches
+
+
+# Keyword search ---------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+_TOKEN_SPLIT_RE = re.compile(r"[-./]")
+STOPWORDS = frozenset(
+    "a about all an and any are as at be by can do does for from give has have how i in is it "
+    "list me of on or show tell that the their there these this to what which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case word tokens for BM25. Tokens joined by ``-``, ``.`` or ``/``
+    (part numbers, packages, ratings like ``TO-220`` or ``3.3V``) are kept
+    whole and also split into their pieces.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.casefold()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if len(token) > 1 and _TOKEN_SPLIT_RE.search(token):
+            tokens.extend(piece for piece in _TOKEN_SPLIT_RE.split(token) if piece)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory inverted index over chunk texts with Okapi BM25 scoring.
+
+    Documents are added and removed incrementally by ID. Terms that occur in
+    more than ``max_df_ratio`` of all documents (field names, "component")
+    carry almost no BM25 weight and are skipped at query time, so a query
+    only walks the postings of its selective terms.
+    ``version`` is the collection version the index reflects (None until built).
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.version = None
+        self.build_ms = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}   # term -> {slot: term frequency}
+        self._ids = []        # slot -> document ID (None for a free slot)
+        self._slots = {}      # document ID -> slot
+        self._lengths = []    # slot -> token count
+        self._terms = []      # slot -> distinct terms (for removal)
+        self._free = []
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, ids: List[str], texts: List[str]):
+        """Index documents; an ID that is already indexed is replaced"""
+        tokenized = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            for doc_id, counts in zip(ids, tokenized):
+                if doc_id in self._slots:
+                    self._remove(doc_id)
+                if self._free:
+                    slot = self._free.pop()
+                    self._ids[slot] = doc_id
+                    self._lengths[slot] = 0
+                    self._terms[slot] = ()
+                else:
+                    slot = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._lengths.append(0)
+                    self._terms.append(())
+                length = sum(counts.values())
+                self._slots[doc_id] = slot
+                self._lengths[slot] = length
+                self._terms[slot] = tuple(counts)
+                self._total_length += length
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[slot] = tf
+
+    def _remove(self, doc_id: str):
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return
+        for term in self._terms[slot]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths[slot]
+        self._ids[slot] = None
+        self._lengths[slot] = 0
+        self._terms[slot] = ()
+        self._free.append(slot)
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top ``k`` (document ID, BM25 score) pairs for a query"""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._slots)
+            if not n_docs or not terms:
+                return []
+            avg_length = self._total_length / n_docs
+            k1, b = self.k1, self.b
+            lengths = self._lengths
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                if n_docs > 2 and df > self.max_df_ratio * n_docs:
+                    continue
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                for slot, tf in postings.items():
+                    norm = k1 * (1.0 - b + b * lengths[slot] / avg_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self._ids[slot], score) for slot, score in top]
+
+    def rebuild(self, collection, version: Optional[str], page_size: int = 10000):
+        """
+        Replace the index with every document currently in ``collection``.
+        Pages by ID: one get() lists the IDs, then each batch of ``page_size``
+        texts is fetched by ID. Offset paging would rescan the skipped rows on
+        every page (in the in-memory store and in ChromaDB alike), and a single
+        get() of all documents would hold the whole corpus at once.
+        """
+        start = time.perf_counter()
+        fresh = BM25Index(self.k1, self.b, self.max_df_ratio)
+        ids = collection.get(include=[])["ids"]
+        for begin in range(0, len(ids), page_size):
+            page = collection.get(ids=ids[begin:begin + page_size], include=["documents"])
+            fresh.add(page["ids"], [doc or "" for doc in page["documents"]])
+        with self._lock:
+            (self._postings, self._ids, self._slots, self._lengths, self._terms,
+             self._free, self._total_length) = (
+                fresh._postings, fresh._ids, fresh._slots, fresh._lengths, fresh._terms,
+                fresh._free, fresh._total_length
+            )
+            self.version = version
+            self.build_ms = round((time.perf_counter() - start) * 1000.0, 1)
+
+    def sync(self, collection, version: str):
+        """Rebuild from ``collection`` if the index does not reflect ``version``"""
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version != version:
+                self.rebuild(collection, version)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._slots),
+                "terms": len(self._postings),
+                "version": self.version,
+                "build_ms": self.build_ms
+            }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: each ID scores the sum of 1 / (k + rank) over the lists it is in"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_merge(
+    collection,
+    vector_results: Dict[str, Any],
+    keyword_rankings: List[List[str]],
+    n_results: int,
+    where: Optional[Dict[str, Any]] = None,
+    rrf_k: int = 60
+) -> List[Dict[str, list]]:
+    """
+    Fuse per-query vector hits (a ChromaDB query result) with BM25 rankings.
+    Documents found only by BM25 are fetched in one ``get`` that also applies
+    ``where``, so keyword hits obey the same filters as the vector search.
+    Returns ``{"ids": [...], "documents": [...], "metadatas": [...]}`` per query.
+    """
+    found = {}  # document ID -> (document, metadata)
+    vector_rankings = []
+    documents = vector_results.get("documents") or []
+    metadatas = vector_results.get("metadatas") or []
+    for i, ids in enumerate(vector_results.get("ids") or []):
+        vector_rankings.append(list(ids))
+        for j, doc_id in enumerate(ids):
+            metadata = metadatas[i][j] if i < len(metadatas) and metadatas[i] else {}
+            found[doc_id] = (documents[i][j], metadata)
+
+    missing = sorted({doc_id for ranking in keyword_rankings for doc_id in ranking if doc_id not in found})
+    if missing:
+        fetched = collection.get(ids=missing, where=where, include=["documents", "metadatas"])
+        for doc_id, doc, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            found[doc_id] = (doc, metadata)
+
+    merged = []
+    for i, keyword_ranking in enumerate(keyword_rankings):
+        vector_ranking = vector_rankings[i] if i < len(vector_rankings) else []
+        # Keyword hits missing from ``found`` were filtered out by ``where`` (or deleted)
+        keyword_ranking = [doc_id for doc_id in keyword_ranking if doc_id in found]
+        fused = reciprocal_rank_fusion([vector_ranking, keyword_ranking], rrf_k)[:n_results]
+        merged.append({
+            "ids": [doc_id for doc_id, _ in fused],
+            "documents": [found[doc_id][0] for doc_id, _ in fused],
+            "metadatas": [found[doc_id][1] for doc_id, _ in fused]
+        })
+    return merged
@@ -112,8 +112,8 @@ function handleFileSelect(e) {
 }
 
 async function handleFileUpload(file) {
-    if (!file.name.match(/\.(xlsx|xls)$/i)) {
-        showToast('Please upload an Excel file (.xlsx or .xls)', 'error');
+    if (!file.name.match(/\.(xlsx|xls|csv|parquet)$/i)) {
+        showToast('Please upload an Excel, CSV or Parquet file', 'error');
         return;
     }
 
@@ -131,15 +131,25 @@ async function handleFileUpload(file) {
             body: formData
         });
 
-        progressFill.style.width = '100%';
+        progressFill.style.width = '50%';
 
         if (response.ok) {
             const data = await response.json();
+
+            // Ingestion runs in the background - follow the job until it finishes
+            const job = await waitForJob(data.job_id);
+            if (job.status !== 'completed') {
+                throw new Error(job.error || 'Ingestion failed');
+            }
+            const result = job.result || {};
+            progressFill.style.width = '100%';
             uploadResult.className = 'upload-result success';
             uploadResult.innerHTML = `
                 <i class="fas fa-check-circle"></i>
-                <strong>Success!</strong> ${data.message}
-                <br><small>Processed ${data.chunks_processed} chunks</small>
+                <strong>Success!</strong> File uploaded and processed successfully
+                <br><small>Processed ${result.chunks_processed || 0} chunks
+                (${result.chunks_added || 0} added, ${result.chunks_updated || 0} updated,
+                ${result.chunks_deleted || 0} deleted) in ${job.elapsed_s}s</small>
             `;
             uploadResult.style.display = 'block';
             uploadStatus.textContent = 'Upload complete!';
@@ -175,6 +185,24 @@ async function handleFileUpload(file) {
     }
 }
 
+// Poll an ingestion job until it completes or fails
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`${API_BASE}/jobs/${jobId}`);
+        if (!response.ok) {
+            throw new Error(`Could not get ingestion status (${response.status})`);
+        }
+        const job = await response.json();
+        if (job.status === 'completed' || job.status === 'failed') {
+            return job;
+        }
+        uploadStatus.textContent = job.status === 'queued'
+            ? 'Waiting for ingestion to start...'
+            : `Ingesting... ${job.rows_stored} rows stored (${job.rows_per_second} rows/s)`;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Ask Question
 async function askQuestion() {
     const question = questionInput.value.trim();
@@ -190,7 +218,7 @@ async function askQuestion() {
     showLoading();
 
     try {
-        const response = await fetch(`${API_BASE}/ask`, {
+        const response = await fetch(`${API_BASE}/ask/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -202,25 +230,25 @@ async function askQuestion() {
         });
 
         if (response.ok) {
-            const data = await response.json();
-            
-            // Display answer
-            answerContent.innerHTML = formatAnswer(data.answer);
+            let answer = '';
+            await readEventStream(response, (event) => {
+                if (event.type === 'context') {
+                    // Context arrives before generation starts - show it right away
+                    renderContext(event.context);
+                    answerContent.innerHTML = '<p><i class="fas fa-spinner fa-spin"></i> Generating answer...</p>';
+                    answerSection.style.display = 'block';
+                    answerSection.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
+                    hideLoading();
+                } else if (event.type === 'token') {
+                    answer += event.text;
+                    answerContent.innerHTML = formatAnswer(answer);
+                } else if (event.type === 'done') {
+                    answerContent.innerHTML = formatAnswer(event.answer || answer);
+                } else if (event.type === 'error') {
+                    throw new Error(event.detail);
+                }
+            });
             
-            // Display context
-            if (data.context && data.context.length > 0) {
-                contextItems.innerHTML = data.context.map((ctx, index) => `
-                    <div class="context-item">
-                        <strong>Context ${index + 1}:</strong>
-                        <p>${escapeHtml(ctx.substring(0, 500))}${ctx.length > 500 ? '...' : ''}</p>
-                    </div>
-                `).join('');
-            } else {
-                contextItems.innerHTML = '<p class="context-item">No context retrieved.</p>';
-            }
-            
-            answerSection.style.display = 'block';
-            answerSection.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
             showToast('Answer retrieved successfully!', 'success');
         } else {
             const error = await response.text();
@@ -239,6 +267,44 @@ async function askQuestion() {
     }
 }
 
+// Read an NDJSON response body, calling onEvent for each parsed line
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (line.trim()) {
+                onEvent(JSON.parse(line));
+            }
+        }
+    }
+    if (buffer.trim()) {
+        onEvent(JSON.parse(buffer));
+    }
+}
+
+// Display retrieved context
+function renderContext(context) {
+    if (context && context.length > 0) {
+        contextItems.innerHTML = context.map((ctx, index) => `
+            <div class="context-item">
+                <strong>Context ${index + 1}:</strong>
+                <p>${escapeHtml(ctx.substring(0, 500))}${ctx.length > 500 ? '...' : ''}</p>
+            </div>
+        `).join('');
+    } else {
+        contextItems.innerHTML = '<p class="context-item">No context retrieved.</p>';
+    }
+}
+
 // Format Answer
 function formatAnswer(answer) {
     // Split by newlines and format
@@ -34,7 +34,18 @@ def test_upload():
     
     print(f"   Status: {response.status_code}")
     print(f"   Response: {response.json()}")
-    return response.status_code == 200
+    if response.status_code != 202:
+        return False
+    
+    # Ingestion runs in the background - poll the job until it finishes
+    job_id = response.json()["job_id"]
+    while True:
+        job = requests.get(f"{API_BASE}/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.5)
+    print(f"   Job: {job['status']} - {job['rows_stored']} rows stored in {job['elapsed_s']}s")
+    return job["status"] == "completed"
 
 
 def test_info():
@@ -76,8 +87,6 @@ def main():
         
         # Test upload
         if test_upload():
-            time.sleep(2)  # Wait for processing
-            
             # Test info
             test_info()
             
@@ -0,0 +1,729 @@
+"""
+Vector stores for the RAG pipeline and the MCP server
+Both stores expose the subset of ChromaDB's Collection API the code uses
+(get / query / upsert / update / delete / count), so search_index helpers and
+callers work with either one. config.VECTOR_STORE selects:
+
+  chroma  every call goes to the ChromaDB collection
+  memory  reads are served from an in-process replica: a contiguous float32
+          matrix searched with one matmul (exact top-k), or an IVF index once
+          the collection has VECTOR_IVF_MIN_ROWS vectors. Writes go to ChromaDB
+          first, which stays the source of truth, and then to the replica.
+          With EMBEDDING_STORE the replica is published as a memory-mapped
+          snapshot (embedding_store.py) that other processes map instead of
+          rebuilding it from ChromaDB.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import config
+from embedding_store import open_snapshot, snapshot_version, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORES = ("chroma", "memory")
+
+# Rows converted to float32 at a time when scoring a float16 snapshot
+_SCORE_BLOCK = 65536
+
+_NUMERIC_OPERATORS = {
+    "$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal
+}
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a ChromaDB ``where`` clause against one metadata dict"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            if key not in metadata:
+                return False
+            value = metadata[key]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq":
+                    ok = value == operand
+                elif op == "$ne":
+                    ok = value != operand
+                elif op == "$in":
+                    ok = value in operand
+                elif op == "$nin":
+                    ok = value not in operand
+                elif op in _NUMERIC_OPERATORS:
+                    try:
+                        ok = bool(_NUMERIC_OPERATORS[op](value, operand))
+                    except TypeError:
+                        ok = False
+                else:
+                    raise ValueError(f"Unsupported where operator {op!r}")
+                if not ok:
+                    return False
+    return True
+
+
+class ChromaVectorStore:
+    """Pass-through to a ChromaDB collection"""
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.version = None
+
+    def get(self, **kwargs) -> Dict[str, Any]:
+        return self.collection.get(**kwargs)
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return self.collection.query(**kwargs)
+
+    def upsert(self, **kwargs):
+        self.collection.upsert(**kwargs)
+
+    def update(self, **kwargs):
+        self.collection.update(**kwargs)
+
+    def delete(self, **kwargs):
+        self.collection.delete(**kwargs)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def sync(self, version: str):
+        """ChromaDB is always current"""
+        self.version = version
+
+    def checkpoint(self, version: str, fields: Sequence[str] = ()):
+        """Nothing to publish: every process reads ChromaDB directly"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a unit-norm matrix: spherical k-means
+    centroids, one list per centroid, and a query scans only the ``nprobe``
+    lists closest to it. Rows added after training are assigned to their
+    nearest centroid; the owner retrains when the matrix has doubled.
+    """
+
+    def __init__(self, n_lists: int, nprobe: int, iterations: int = 10, seed: int = 0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0
+
+    def train(self, vectors: np.ndarray, rows: np.ndarray, sample_per_list: int = 64):
+        """
+        Cluster a sample of ``vectors[rows]`` (``sample_per_list`` rows per list)
+        and assign every one of those rows; ``assignments`` is indexed by row
+        """
+        rng = np.random.default_rng(self.seed)
+        n_lists = min(self.n_lists, len(rows))
+        sample_size = n_lists * sample_per_list
+        sample_rows = rows if len(rows) <= sample_size else np.sort(rng.choice(rows, sample_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self.n_lists = n_lists
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = np.zeros(len(vectors), dtype=np.int32)
+        for start in range(0, len(rows), _SCORE_BLOCK):
+            block = rows[start:start + _SCORE_BLOCK]
+            self.assignments[block] = self.assign(vectors[block])
+        self.trained_rows = len(rows)
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors, dtype=np.float32) @ self.centroids.T, axis=1).astype(np.int32)
+
+    def grow(self, capacity: int):
+        if len(self.assignments) < capacity:
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+
+    def probe(self, query: np.ndarray, n_rows: int) -> np.ndarray:
+        """Mask of the first ``n_rows`` rows that fall in the lists nearest to ``query``"""
+        nprobe = min(self.nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.isin(self.assignments[:n_rows], lists)
+
+
+class InMemoryVectorStore:
+    """
+    In-process replica of a ChromaDB collection for low-latency reads.
+
+    Rows live in slot order: ``_vectors`` holds unit-norm float32 embeddings
+    (cosine distance is one minus a dot product, matching the collection's
+    ``hnsw:space: cosine``) and deleted slots are masked out until the next
+    compaction. Until ``sync`` builds the replica (``version`` is None), reads
+    and writes go straight to ChromaDB. With ``collection=None`` the store is
+    standalone (benchmarks): it starts empty and writes only update memory.
+
+    When the replica comes from a snapshot, its columns are the snapshot's
+    read-only memory maps (float16 vectors are scored block by block in
+    float32); the first write copies them into private memory, and the next
+    ``checkpoint`` publishes a new snapshot and maps that instead.
+    """
+
+    name = "memory"
+
+    def __init__(self, collection=None, ivf_min_rows: int = None, ivf_lists: int = None,
+                 ivf_nprobe: int = None):
+        self.collection = collection
+        self.ivf_min_rows = config.VECTOR_IVF_MIN_ROWS if ivf_min_rows is None else ivf_min_rows
+        self.ivf_lists = config.VECTOR_IVF_LISTS if ivf_lists is None else ivf_lists
+        self.ivf_nprobe = config.VECTOR_IVF_NPROBE if ivf_nprobe is None else ivf_nprobe
+        self.version = None if collection is not None else ""
+        self.build_ms = None
+        self._writes = 0  # Local writes applied, to detect writes during a checkpoint
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self, dim: int = 0):
+        self._ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)       # slot holds a document
+        self._searchable = np.zeros(0, dtype=bool)  # ... that has an embedding
+        self._columns: Dict[str, tuple] = {}        # metadata field -> cached column for filters
+        self._ivf = None
+        self._snapshot = None                       # mapped snapshot backing the columns, if any
+
+    # Local state ---------------------------------------------------------------
+
+    @property
+    def _size(self) -> int:
+        return len(self._ids)
+
+    def _reserve(self, rows: int, dim: int):
+        capacity = len(self._live)
+        if self._vectors.shape[1] != dim:
+            if self._searchable.any():
+                raise ValueError(f"Embedding dimension {dim} does not match the store ({self._vectors.shape[1]})")
+            self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity, 1024)
+        vectors = np.zeros((capacity, dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        for name in ("_live", "_searchable"):
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, grown)
+        if self._ivf is not None:
+            self._ivf.grow(capacity)
+
+    def _materialize(self):
+        """Copy snapshot-backed (read-only, mapped) columns into private memory before a write"""
+        if self._snapshot is None:
+            return
+        n = self._size
+        self._ids = list(self._ids)
+        self._slots = dict(self._slots.items())
+        self._documents = list(self._documents)
+        self._metadatas = list(self._metadatas)
+        self._vectors = np.array(self._vectors[:n], dtype=np.float32)
+        if self._ivf is not None:
+            self._ivf.centroids = np.array(self._ivf.centroids, dtype=np.float32)
+            self._ivf.assignments = np.array(self._ivf.assignments[:n], dtype=np.int32)
+        self._snapshot = None
+
+    def _apply_upsert(self, ids, embeddings, documents, metadatas):
+        self._materialize()
+        self._writes += 1
+        dim = self._vectors.shape[1]
+        matrix = None
+        if embeddings is not None:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            dim = matrix.shape[1]
+        new = sum(1 for doc_id in ids if doc_id not in self._slots)
+        self._reserve(self._size + new, dim)
+        slots = []
+        for i, doc_id in enumerate(ids):
+            slot = self._slots.get(doc_id)
+            if slot is None:
+                slot = self._size
+                self._slots[doc_id] = slot
+                self._ids.append(doc_id)
+                self._documents.append(None)
+                self._metadatas.append(None)
+            if documents is not None:
+                self._documents[slot] = documents[i]
+            if metadatas is not None:
+                self._metadatas[slot] = dict(metadatas[i] or {})
+            self._live[slot] = True
+            slots.append(slot)
+        slots = np.asarray(slots, dtype=np.int64)
+        if matrix is not None:
+            self._vectors[slots] = matrix
+            self._searchable[slots] = True
+            if self._ivf is not None:
+                self._ivf.assignments[slots] = self._ivf.assign(matrix)
+        self._columns.clear()
+
+    def _apply_update(self, ids, metadatas):
+        self._materialize()
+        self._writes += 1
+        for doc_id, metadata in zip(ids, metadatas):
+            slot = self._slots.get(doc_id)
+            if slot is not None:
+                self._metadatas[slot] = dict(metadata or {})
+        self._columns.clear()
+
+    def _apply_delete(self, ids):
+        self._materialize()
+        self._writes += 1
+        for doc_id in ids:
+            slot = self._slots.pop(doc_id, None)
+            if slot is not None:
+                self._live[slot] = False
+                self._searchable[slot] = False
+                self._documents[slot] = None
+                self._metadatas[slot] = None
+        self._columns.clear()
+        if self._size > 1024 and len(self._slots) < self._size // 2:
+            self._compact()
+
+    def _compact(self):
+        """Drop deleted slots (keeps slot order)"""
+        keep = np.flatnonzero(self._live[:self._size])
+        ids = [self._ids[slot] for slot in keep]
+        documents = [self._documents[slot] for slot in keep]
+        metadatas = [self._metadatas[slot] for slot in keep]
+        vectors = self._vectors[keep]
+        searchable = self._searchable[keep]
+        self._reset(vectors.shape[1])
+        self._reserve(len(ids), vectors.shape[1])
+        self._ids, self._documents, self._metadatas = ids, documents, metadatas
+        self._slots = {doc_id: slot for slot, doc_id in enumerate(ids)}
+        self._vectors[:len(ids)] = vectors
+        self._live[:len(ids)] = True
+        self._searchable[:len(ids)] = searchable
+
+    def _metadata(self, slot: int) -> Optional[Dict[str, Any]]:
+        metadata = self._metadatas[slot]
+        return dict(metadata) if metadata is not None else None
+
+    # Filters -------------------------------------------------------------------
+
+    def _column(self, field: str):
+        """
+        Cached column of one metadata field over all slots (dropped on every write):
+        ("numeric", float64 values, NaN if absent) when every value is a number,
+        else a codes column (see ``_codes_column``) with code -1 for absent
+        """
+        cached = self._columns.get(field)
+        if cached is None:
+            values = [metadata.get(field, _MISSING) if metadata else _MISSING for metadata in self._metadatas]
+            present = [v for v in values if v is not _MISSING]
+            if present and all(_is_number(v) for v in present):
+                cached = ("numeric", np.array([np.nan if v is _MISSING else v for v in values], dtype=np.float64))
+            else:
+                index = {}
+                codes = np.fromiter(
+                    (-1 if v is _MISSING else index.setdefault(v, len(index)) for v in values),
+                    dtype=np.int32, count=len(values)
+                )
+                cached = _codes_column(codes, index)
+            self._columns[field] = cached
+        return cached
+
+    def _where_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Vectorized ``where`` over all slots (numeric ranges and equality run columnar)"""
+        n = self._size
+        mask = self._live[:n].copy()
+        if not where:
+            return mask
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(n, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+            else:
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                column = self._column(key)
+                for op, operand in condition.items():
+                    mask &= self._leaf_mask(column, op, operand)
+        return mask
+
+    @staticmethod
+    def _leaf_mask(column: tuple, op: str, operand: Any) -> np.ndarray:
+        if op not in _NUMERIC_OPERATORS and op not in ("$eq", "$ne", "$in", "$nin"):
+            raise ValueError(f"Unsupported where operator {op!r}")
+        if column[0] == "numeric":
+            values = column[1]
+            present = ~np.isnan(values)
+            if op in ("$in", "$nin"):
+                hit = np.isin(values, [v for v in operand if _is_number(v)])
+                return hit if op == "$in" else present & ~hit
+            if not _is_number(operand):
+                return present if op == "$ne" else np.zeros(len(values), dtype=bool)
+            if op == "$eq":
+                return values == operand
+            if op == "$ne":
+                return present & (values != operand)
+            return present & _NUMERIC_OPERATORS[op](np.where(present, values, 0.0), operand)
+        _, codes, lookup, numbers, number_codes = column
+        if op in _NUMERIC_OPERATORS:
+            if not _is_number(operand):
+                return np.zeros(len(codes), dtype=bool)
+            # The numeric distinct values are sorted, so a range selects a contiguous run of them
+            if op in ("$gt", "$gte"):
+                matching = number_codes[np.searchsorted(numbers, operand, side="right" if op == "$gt" else "left"):]
+            else:
+                matching = number_codes[:np.searchsorted(numbers, operand, side="left" if op == "$lt" else "right")]
+        else:
+            operands = operand if op in ("$in", "$nin") else [operand]
+            matching = [lookup[value] for value in operands if _hashable(value) and value in lookup]
+        hit = np.isin(codes, matching)
+        return hit if op in ("$eq", "$in", "$gt", "$gte", "$lt", "$lte") else (codes >= 0) & ~hit
+
+    # Search --------------------------------------------------------------------
+
+    def _maybe_train_ivf(self, searchable: int):
+        if self.ivf_min_rows <= 0 or searchable < self.ivf_min_rows:
+            self._ivf = None
+            return
+        if self._ivf is not None and searchable < 2 * self._ivf.trained_rows:
+            return
+        start = time.perf_counter()
+        n_lists = self.ivf_lists or max(1, int(np.sqrt(searchable)))
+        ivf = IVFIndex(n_lists, self.ivf_nprobe)
+        ivf.train(self._vectors, np.flatnonzero(self._searchable[:self._size]))
+        ivf.grow(len(self._live))
+        self._ivf = ivf
+        logger.info(
+            "Trained IVF index: %d lists over %d vectors in %.0f ms",
+            ivf.n_lists, searchable, (time.perf_counter() - start) * 1000.0
+        )
+
+    def _scores(self, queries: np.ndarray, slots: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of ``queries`` with the given slots (all when None)"""
+        vectors = self._vectors
+        if vectors.dtype == np.float32:
+            return queries @ (vectors[:self._size] if slots is None else vectors[slots]).T
+        total = self._size if slots is None else len(slots)
+        scores = np.empty((len(queries), total), dtype=np.float32)
+        for start in range(0, total, _SCORE_BLOCK):
+            end = min(start + _SCORE_BLOCK, total)
+            block = vectors[start:end] if slots is None else vectors[slots[start:end]]
+            scores[:, start:end] = queries @ block.astype(np.float32).T
+        return scores
+
+    def _top_k(self, scores: np.ndarray, candidates: np.ndarray, k: int):
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top], scores[top]
+
+    def _search(self, queries: np.ndarray, n_results: int, mask: np.ndarray) -> List[tuple]:
+        n = self._size
+        candidates = np.flatnonzero(mask)
+        if not len(candidates) or n_results <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+
+        if self._ivf is None:
+            # Exact: one matmul for the whole batch over the matching rows
+            scores = self._scores(queries, None if len(candidates) == n else candidates)
+            return [self._top_k(row, candidates, n_results) for row in scores]
+
+        results = []
+        for query in queries:
+            probed = np.flatnonzero(mask & self._ivf.probe(query, n))
+            if len(probed) < n_results:
+                # The nearest lists hold too few matching rows (selective filter) - scan them all
+                probed = candidates
+            results.append(self._top_k(self._scores(query[None, :], probed)[0], probed, n_results))
+        return results
+
+    # Collection API ------------------------------------------------------------
+
+    def query(self, query_embeddings=None, query_texts=None, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None, include=("documents", "metadatas", "distances"),
+              **kwargs) -> Dict[str, Any]:
+        """Nearest neighbours per query embedding; text queries are embedded by ChromaDB"""
+        if query_embeddings is None:
+            if self.collection is None:
+                raise ValueError("The in-memory vector store needs query embeddings")
+            return self.collection.query(query_texts=query_texts, n_results=n_results, where=where, **kwargs)
+        if self.version is None:
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            mask = self._where_mask(where) & self._searchable[:self._size]
+            self._maybe_train_ivf(int(self._searchable[:self._size].sum()))
+            hits = self._search(queries, n_results, mask)
+            result = {"ids": [[self._ids[slot] for slot in slots] for slots, _ in hits]}
+            if "documents" in include:
+                result["documents"] = [[self._documents[slot] for slot in slots] for slots, _ in hits]
+            if "metadatas" in include:
+                result["metadatas"] = [[self._metadata(slot) for slot in slots] for slots, _ in hits]
+            if "distances" in include:
+                result["distances"] = [(1.0 - scores).tolist() for _, scores in hits]
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include=("documents", "metadatas"), **kwargs) -> Dict[str, Any]:
+        """Documents by ID and/or ``where`` filter, in insertion order"""
+        if self.version is None:
+            return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+        with self._lock:
+            if ids is not None:
+                slots = [self._slots[doc_id] for doc_id in ids if doc_id in self._slots]
+                if where:
+                    slots = [slot for slot in slots if matches_where(self._metadatas[slot], where)]
+            else:
+                slots = np.flatnonzero(self._where_mask(where)).tolist()
+            slots = slots[offset or 0:]
+            if limit is not None:
+                slots = slots[:limit]
+            result = {"ids": [self._ids[slot] for slot in slots]}
+            if "documents" in include:
+                result["documents"] = [self._documents[slot] for slot in slots]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadata(slot) for slot in slots]
+            if "embeddings" in include:
+                result["embeddings"] = [self._vectors[slot].tolist() for slot in slots]
+        return result
+
+    def upsert(self, ids: List[str], embeddings=None, documents=None, metadatas=None):
+        if self.collection is not None:
+            kwargs = {"embeddings": embeddings} if embeddings is not None else {}
+            self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, **kwargs)
+        if self.version is not None:
+            with self._lock:
+                self._apply_upsert(ids, embeddings, documents, metadatas)
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        if self.collection is not None:
+            self.collection.update(ids=ids, metadatas=metadatas)
+        if self.version is not None:
+            with self._lock:
+                self._apply_update(ids, metadatas)
+
+    def delete(self, ids: List[str]):
+        if self.collection is not None:
+            self.collection.delete(ids=ids)
+        if self.version is not None:
+            with self._lock:
+                self._apply_delete(ids)
+
+    def count(self) -> int:
+        if self.version is None:
+            return self.collection.count()
+        return len(self._slots)
+
+    # Replica maintenance -------------------------------------------------------
+
+    def rebuild(self, version: Optional[str], page_size: int = 5000):
+        """
+        Replace the replica with every row (and embedding) currently in ChromaDB.
+        Rows are fetched by ID, ``page_size`` at a time: offset paging makes
+        ChromaDB rescan the skipped rows for every page.
+        """
+        start = time.perf_counter()
+        fresh = InMemoryVectorStore(None, self.ivf_min_rows, self.ivf_lists, self.ivf_nprobe)
+        ids = self.collection.get(include=[])["ids"]
+        for begin in range(0, len(ids), page_size):
+            page = self.collection.get(
+                ids=ids[begin:begin + page_size], include=["embeddings", "documents", "metadatas"]
+            )
+            fresh._apply_upsert(page["ids"], page.get("embeddings"), page["documents"], page["metadatas"])
+        with self._lock:
+            self._adopt(fresh)
+            self.version = version
+            self.build_ms = round((time.perf_counter() - start) * 1000.0, 1)
+        logger.info("Loaded %d vectors into the in-memory store in %s ms", len(self._slots), self.build_ms)
+
+    def _adopt(self, other: "InMemoryVectorStore"):
+        (self._ids, self._slots, self._documents, self._metadatas, self._vectors,
+         self._live, self._searchable, self._columns, self._ivf, self._snapshot) = (
+            other._ids, other._slots, other._documents, other._metadatas, other._vectors,
+            other._live, other._searchable, other._columns, other._ivf, other._snapshot
+        )
+
+    def _map_snapshot(self, snapshot):
+        """Serve reads straight from a snapshot's memory maps (no copy, no per-row work)"""
+        self._reset()
+        self._ids, self._slots = snapshot.ids, snapshot.index
+        self._documents, self._metadatas = snapshot.documents, snapshot.metadatas
+        self._vectors = snapshot.vectors
+        self._live = np.ones(snapshot.rows, dtype=bool)
+        self._searchable = np.array(snapshot.searchable, dtype=bool)
+        self._columns = dict(snapshot.columns)
+        if snapshot.ivf_centroids is not None:
+            ivf = IVFIndex(len(snapshot.ivf_centroids), self.ivf_nprobe)
+            ivf.centroids, ivf.assignments = snapshot.ivf_centroids, snapshot.ivf_assignments
+            ivf.trained_rows = snapshot.rows
+            self._ivf = ivf
+        self._snapshot = snapshot
+
+    def _load_snapshot(self, version: str) -> bool:
+        """Map the published snapshot if it reflects ``version``"""
+        if not config.EMBEDDING_STORE or snapshot_version() != version:
+            return False
+        start = time.perf_counter()
+        snapshot = open_snapshot()
+        if snapshot is None or snapshot.version != version:
+            return False
+        self._map_snapshot(snapshot)
+        self.version = version
+        self.build_ms = round((time.perf_counter() - start) * 1000.0, 1)
+        logger.info("Mapped %d vectors from %s in %s ms", snapshot.rows, snapshot.path, self.build_ms)
+        return True
+
+    def sync(self, version: str):
+        """
+        Map the snapshot for ``version``, else rebuild from ChromaDB in memory.
+        Read-only: only the ingest path publishes snapshots (``checkpoint``).
+        """
+        if self.collection is None or self.version == version:
+            return
+        with self._lock:
+            if self.version != version and not self._load_snapshot(version):
+                self.rebuild(version)
+
+    def checkpoint(self, version: str, fields: Sequence[str] = ()):
+        """
+        Publish the replica for ``version`` as a memory-mapped snapshot and map it,
+        releasing the private copy. Only the ingest path calls this, after a
+        file is stored, so other processes (MCP server, process-pool workers)
+        map the result instead of each rebuilding it from ChromaDB.
+
+        The filter columns of ``fields`` (and of any field already filtered on)
+        are saved with it, so readers filter without decoding metadata JSON.
+        Every checkpoint rewrites the whole collection, even after a small
+        upload: snapshots stay immutable and self-contained, so readers map
+        one directory instead of merging deltas.
+        """
+        if not config.EMBEDDING_STORE or self.collection is None:
+            return
+        self.sync(version)
+        with self._lock:
+            if self.version != version or self._snapshot is not None:
+                return
+            # Train the IVF index now so it ships with the snapshot
+            self._maybe_train_ivf(int(self._searchable[:self._size].sum()))
+            keep = np.flatnonzero(self._live[:self._size])
+            ids = [self._ids[slot] for slot in keep]
+            documents = [self._documents[slot] for slot in keep]
+            metadatas = [self._metadatas[slot] for slot in keep]
+            vectors = self._vectors[keep]
+            searchable = self._searchable[keep]
+            ivf = self._ivf
+            ivf_centroids = ivf.centroids if ivf is not None else None
+            ivf_assignments = ivf.assignments[keep] if ivf is not None else None
+            columns = {}
+            for field in dict.fromkeys([*fields, *self._columns]):
+                column = self._column(field)
+                if column[0] == "numeric":
+                    columns[field] = ("numeric", column[1][keep])
+                else:
+                    columns[field] = ("codes", column[1][keep], *column[2:])
+            writes = self._writes
+
+        # Written outside the lock so queries keep running meanwhile
+        try:
+            write_snapshot(config.EMBEDDING_STORE_DIR, version, ids, vectors, documents, metadatas,
+                           searchable, ivf_centroids=ivf_centroids, ivf_assignments=ivf_assignments,
+                           columns=columns)
+        except Exception as e:
+            logger.warning("Could not write embedding snapshot: %s", e)
+            return
+        with self._lock:
+            # Only switch if no write happened while the snapshot was being written
+            if self.version == version and self._snapshot is None and self._writes == writes:
+                self._load_snapshot(version)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "documents": len(self._slots),
+                "dimension": int(self._vectors.shape[1]),
+                "index": "ivf" if self._ivf is not None else "exact",
+                "ivf_lists": self._ivf.n_lists if self._ivf is not None else None,
+                "version": self.version,
+                "build_ms": self.build_ms,
+                "snapshot": self._snapshot.stats() if self._snapshot is not None else None
+            }
+
+
+class _Missing:
+    def __repr__(self):
+        return "<missing>"
+
+
+# Placeholder for metadata fields a row does not have
+_MISSING = _Missing()
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+def _codes_column(codes: np.ndarray, lookup: Dict[Any, int]) -> tuple:
+    """
+    ("codes", codes, value -> code, sorted numeric values, their codes):
+    equality filters look operands up in the dict, ranges bisect the numeric values
+    """
+    numeric = sorted((value, code) for value, code in lookup.items() if _is_number(value))
+    numbers = np.array([value for value, _ in numeric], dtype=np.float64)
+    number_codes = np.array([code for _, code in numeric], dtype=np.int32)
+    return ("codes", codes, lookup, numbers, number_codes)
+
+
+def create_vector_store(collection, backend: str = None):
+    """Wrap a ChromaDB collection in the configured VECTOR_STORE backend"""
+    backend = backend or config.VECTOR_STORE
+    if backend == "chroma":
+        return ChromaVectorStore(collection)
+    if backend == "memory":
+        return InMemoryVectorStore(collection)
+    raise ValueError(f"Unknown vector store {backend!r}; expected one of {', '.join(VECTOR_STORES)}")